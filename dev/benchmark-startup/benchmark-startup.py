@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+"""
+Measure the startup time of the correct-markdown commands.
+
+Each command line is run several times with --help and the median time, minus the
+median startup time of the python interpreter, is compared to the budget of the
+command. The exit code is 1 if a command exceeds its budget.
+
+    python dev/benchmark-startup/benchmark-startup.py --runs 10
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+# Seconds on top of the startup of the interpreter. Commands that only need the
+# standard library must stay within the default budget.
+DEFAULT_BUDGET = 0.15
+BUDGETS = {
+    # The diff and the markdown view.
+    "corrected-view": 0.2,
+    "run-prompts": 0.2,
+    "word-diff": 0.2,
+    # Also jinja2 and asyncio.
+    "batch": 0.35,
+    "pipeline": 0.35,
+    "render-enhanced-md": 0.35,
+    "serve": 0.35,
+}
+
+COMMANDS = [
+    "batch",
+    "collect-bold-segments",
+    "corrected-view",
+    "markdown-view",
+    "pipeline",
+    "render-enhanced-md",
+    "run-prompts",
+    "serve",
+    "word-diff",
+]
+
+
+def median_time(args: List[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split(".")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply the budgets by this factor"
+    )
+    args = parser.parse_args()
+
+    interpreter = median_time([sys.executable, "-c", "pass"], args.runs)
+    print(f"{'python':<24}{interpreter * 1000:8.1f} ms")
+
+    cli = [sys.executable, "-m", "danoan.correct_markdown.cli.cli"]
+    failures = 0
+    for command in [None, *COMMANDS]:
+        command_line = (
+            [*cli, "--help"] if command is None else [*cli, command, "--help"]
+        )
+        elapsed = median_time(command_line, args.runs) - interpreter
+        budget = BUDGETS.get(command or "", DEFAULT_BUDGET) * args.scale
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        if elapsed > budget:
+            failures += 1
+        print(
+            f"{command or '(no command)':<24}{elapsed * 1000:8.1f} ms"
+            f"  budget {budget * 1000:.0f} ms  {status}"
+        )
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
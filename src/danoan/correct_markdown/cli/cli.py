@@ -1,15 +1,12 @@
-from danoan.correct_markdown.cli.commands import (
-    collect_bold,
-    corrected_view,
-    markdown_view,
-    render_enhanced_md,
-    word_diff,
-)
+from danoan.correct_markdown.core import cache
 
 import argparse
+import importlib
 import logging
+import os
 from pathlib import Path
 import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -20,21 +17,110 @@ logger.addHandler(handler)
 SCRIPT_FOLDER = Path(__file__).parent
 
 
-def main():
+class Command(NamedTuple):
+    # Module of the command in danoan.correct_markdown.cli.commands.
+    module: str
+    help: str
+
+
+# The module of a command, and its dependencies, is only imported when the command
+# runs, see build_parser. The help is the first sentence of the command docstring.
+COMMANDS: Dict[str, Command] = {
+    "batch": Command(
+        "batch", "Run a command over many documents in a pool of processes"
+    ),
+    "collect-bold-segments": Command(
+        "collect_bold",
+        "Collect all segments in between double asterisks or double underscores",
+    ),
+    "corrected-view": Command(
+        "corrected_view",
+        "Render plain text correction using the original markdown as template",
+    ),
+    "markdown-view": Command(
+        "markdown_view", "Print pure markdown string without html tags"
+    ),
+    "pipeline": Command(
+        "pipeline",
+        "Correct a markdown file and render its enhanced markdown in a single process",
+    ),
+    "render-enhanced-md": Command(
+        "render_enhanced_md",
+        "Add strikethrough marks to identify modifications made among two files",
+    ),
+    "run-prompts": Command(
+        "run_prompts",
+        "Run a prompt over each element of a json list and print the list of outputs",
+    ),
+    "serve": Command(
+        "serve", "Serve the commands over http, on localhost or on a unix socket"
+    ),
+    "word-diff": Command(
+        "word_diff", "Compare two files and return a list of diff items"
+    ),
+}
+
+
+def add_cache_argument(parser):
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        help="Folder of the cache of diff items and markdown segments. It can also "
+        f"be set with the {cache.CACHE_DIR_VARIABLE} environment variable",
+    )
+
+
+def set_cache_dir(cache_dir: Optional[Path]):
+    """
+    Enable the default cache, also in the processes started by this one.
+    """
+    if cache_dir is not None:
+        os.environ[cache.CACHE_DIR_VARIABLE] = str(cache_dir)
+
+
+def build_parser(commands: Optional[Iterable[str]] = None) -> argparse.ArgumentParser:
+    """
+    Create the parser of the command line.
+
+    Only the modules of the given commands are imported and their arguments
+    declared; the other commands are listed with their help. All commands are
+    loaded by default.
+    """
+    loaded = set(COMMANDS if commands is None else commands)
+
     parser = argparse.ArgumentParser("correct-markdown")
+    add_cache_argument(parser)
     subparser = parser.add_subparsers()
 
-    commands = [
-        collect_bold,
-        corrected_view,
-        markdown_view,
-        render_enhanced_md,
-        word_diff,
-    ]
-    for cmd in commands:
-        cmd.extend_parser(subparser)
+    for name, command in COMMANDS.items():
+        if name in loaded:
+            module = importlib.import_module(
+                f"danoan.correct_markdown.cli.commands.{command.module}"
+            )
+            module.extend_parser(subparser)
+        else:
+            subparser.add_parser(name, help=command.help)
+    return parser
+
 
+def __command_name__(args: List[str]) -> Optional[str]:
+    """
+    Return the command of a command line, i.e. its first positional argument.
+    """
+    it = iter(args)
+    for arg in it:
+        if arg == "--cache-dir":
+            next(it, None)
+        elif not arg.startswith("-"):
+            return arg
+    return None
+
+
+def main():
+    command = __command_name__(sys.argv[1:])
+    parser = build_parser([] if command is None else [command])
     args = parser.parse_args()
+    set_cache_dir(args.cache_dir)
     if "func" in args:
         args.func(**vars(args))
     elif "help" in args:
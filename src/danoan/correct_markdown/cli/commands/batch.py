@@ -0,0 +1,220 @@
+from danoan.correct_markdown.cli import utils
+from danoan.correct_markdown.cli.commands import (
+    corrected_view,
+    render_enhanced_md,
+    word_diff,
+)
+from danoan.correct_markdown.core import model
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from dataclasses import dataclass
+import json
+import logging
+from pathlib import Path
+import sys
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+
+@dataclass
+class BatchCommand:
+    func: Callable
+    # Input file of each argument of func in a document folder (directory mode).
+    layout: Dict[str, str]
+    output_name: str
+
+
+BATCH_COMMANDS = {
+    "corrected-view": BatchCommand(
+        corrected_view.__corrected_view__,
+        {"original_markdown": "original.md", "plain_text_correction": "correction.md"},
+        "corrected-view.md",
+    ),
+    "render-enhanced-md": BatchCommand(
+        render_enhanced_md.__render_enhanced_md__,
+        {"metadata": "render-data.json"},
+        "enhanced-md.md",
+    ),
+    "word-diff": BatchCommand(
+        word_diff.__word_diff__,
+        {"text_a": "pin_original.json", "text_b": "pin_correct.json"},
+        "diff-items.json",
+    ),
+}
+
+
+@dataclass
+class Document:
+    name: str
+    args: Dict[str, str]
+    output: Optional[str]
+
+
+def __documents_from_directory__(
+    command: str, input_dir: Path, output_dir: Optional[Path]
+) -> List[Document]:
+    """
+    Every sub-folder of the input directory is a document.
+    """
+    batch_command = BATCH_COMMANDS[command]
+
+    documents = []
+    for folder in sorted(p for p in input_dir.iterdir() if p.is_dir()):
+        args = {k: str(folder / v) for k, v in batch_command.layout.items()}
+        output = (output_dir / folder.name if output_dir else folder) / (
+            batch_command.output_name
+        )
+        documents.append(Document(folder.name, args, str(output)))
+    return documents
+
+
+def __documents_from_manifest__(
+    command: str, manifest: Path, output_dir: Optional[Path]
+) -> List[Document]:
+    """
+    Every line of the manifest is a json object describing a document.
+
+    The object maps the arguments of the command to their files, e.g.
+    {"text_a": "a.json", "text_b": "b.json"}. The optional keys name and output
+    set the name of the document and its output file.
+    """
+    batch_command = BATCH_COMMANDS[command]
+
+    documents = []
+    with open(manifest) as f:
+        for index, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            args = {k: entry.get(k, "") for k in batch_command.layout.keys()}
+            name = entry.get("name", f"{index}-{Path(next(iter(args.values()))).stem}")
+
+            output = entry.get("output")
+            if output is None and output_dir:
+                output = str(output_dir / name / batch_command.output_name)
+            documents.append(Document(name, args, output))
+    return documents
+
+
+def __init_worker__():
+    # Parse the template once per worker, such that the workers are warm.
+    render_enhanced_md.get_env().get_template("enhanced_md.md.tpl")
+
+
+def __run_document__(
+    command: str, document: Document, options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Run the command over a document and return its status.
+    """
+    status = {"name": document.name, "status": "ok", "output": document.output}
+
+    missing = [v for v in document.args.values() if not Path(v).is_file()]
+    if missing:
+        status.update(status="error", error=f"File not found: {', '.join(missing)}")
+        return status
+    if document.output is None:
+        status.update(status="error", error="No output file")
+        return status
+
+    output = Path(document.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(output, "w") as f, contextlib.redirect_stdout(f):
+            args = {k: Path(v) for k, v in document.args.items()}
+            BATCH_COMMANDS[command].func(**args, **options)
+    except SystemExit as ex:
+        status.update(status="error", error=f"Exited with code {ex.code}")
+    except Exception as ex:
+        status.update(status="error", error=f"{type(ex).__name__}: {ex}")
+
+    if status["status"] == "error":
+        output.unlink(missing_ok=True)
+    return status
+
+
+def __batch__(
+    command: str,
+    manifest: Optional[Path] = None,
+    input_dir: Optional[Path] = None,
+    output_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    **kwargs,
+):
+    """
+    Run a command over many documents in a pool of processes.
+
+    The documents are listed in a manifest of json lines or are the sub-folders of
+    an input directory. A json status line is printed for each document, in the
+    input order.
+    """
+    if manifest is not None:
+        if not manifest.exists():
+            logger.error(f"File {manifest} does not exist")
+            exit(1)
+        documents = __documents_from_manifest__(command, manifest, output_dir)
+    elif input_dir is not None:
+        if not input_dir.is_dir():
+            logger.error(f"Directory {input_dir} does not exist")
+            exit(1)
+        documents = __documents_from_directory__(command, input_dir, output_dir)
+    else:
+        logger.error("One of --manifest or --input-dir is required")
+        exit(1)
+
+    options = {"engine": engine}
+    failures = 0
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=__init_worker__
+    ) as executor:
+        futures = [
+            executor.submit(__run_document__, command, document, options)
+            for document in documents
+        ]
+        for future in futures:
+            status = future.result()
+            if status["status"] != "ok":
+                failures += 1
+            sys.stdout.write(json.dumps(status, ensure_ascii=False))
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+    if failures:
+        logger.error(f"{failures} of {len(documents)} documents failed")
+        exit(1)
+
+
+def extend_parser(subparser_action):
+    command = "batch"
+    description = __batch__.__doc__
+    help = description.split(".")[0] if description else ""
+
+    parser = subparser_action.add_parser(command, help=help, description=description)
+    parser.add_argument("command", choices=list(BATCH_COMMANDS.keys()))
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--manifest",
+        type=Path,
+        help="Json lines file mapping the arguments of the command to files",
+    )
+    source.add_argument(
+        "--input-dir",
+        type=Path,
+        help="Directory with one sub-folder of input files per document",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help="Directory where the outputs are written, one sub-folder per document",
+    )
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    utils.add_engine_argument(parser)
+
+    parser.set_defaults(func=__batch__, help=parser.print_help)
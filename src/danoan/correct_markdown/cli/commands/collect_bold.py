@@ -3,7 +3,7 @@ import logging
 from pathlib import Path
 import re
 import sys
-from typing import TextIO
+from typing import Any, Dict, Iterator, List, Match, TextIO, Tuple
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -11,23 +11,149 @@ handler.setLevel(logging.INFO)
 handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 logger.addHandler(handler)
 
+BOLD_PATTERN = re.compile(r"\*\*([^*]*)\*\*|__([^_]*)__")
+BOLD_MARKERS = "*_"
 
-def collect_bold_segments(text: TextIO):
-    r_bold_expression = r"\*\*([^\*]*)\*\*"
-    for seg in re.findall(r_bold_expression, text.read()):
-        yield seg
+# Number of chars read at once from the stream.
+DEFAULT_CHUNK_SIZE = 1 << 16
 
 
-def __collect_bold_segments__(text_a: Path, **kwargs):
+def __undecided__(buffer: str) -> List[int]:
     """
-    Collect all segments in between double asteristics.
+    Return the positions where a bold segment could start and end after the buffer.
+
+    An opening marker is undecided if there is no marker char after it, but the
+    last char of the buffer, or if it is split by the end of the buffer.
+    """
+    end = len(buffer)
+    positions = [end]
+    for c in BOLD_MARKERS:
+        if end > 0 and buffer[end - 1] == c:
+            positions.append(end - 1)
+        r = buffer.rfind(c, 0, end - 1)
+        if r == -1:
+            continue
+        if buffer[r + 1] == c:
+            positions.append(r)
+        if r > 0 and buffer[r - 1] == c:
+            positions.append(r - 1)
+    return sorted(positions)
+
+
+def __waits_for_marker__(pieces: List[str], chunk: str) -> bool:
+    """
+    Check that the buffered text starts with an opening marker that the chunk
+    cannot close, such that the chunk can be buffered without being scanned.
+    """
+    c = pieces[0][:1]
+    return (
+        len(pieces[0]) > 1
+        and pieces[0][1] == c
+        and c in BOLD_MARKERS
+        and pieces[-1][-1] != c
+        and c not in chunk
+    )
+
+
+def __segment__(m: Match[str]) -> Tuple[str, int]:
+    """
+    Return the segment of a match of BOLD_PATTERN and the offset of its first char.
+    """
+    group = 1 if m.group(1) is not None else 2
+    return m.group(group), m.start(group)
+
+
+def iter_bold_segments(
+    text: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Tuple[str, int]]:
+    """
+    Yield the segments in between double asterisks or double underscores and the
+    offsets of their first char in the stream.
+
+    The stream is read in chunks. Only the text after an unclosed marker is kept
+    in memory, such that a marker split by the end of a chunk is closed by the
+    next one. The segments are the ones found in the whole text at once.
+
+    >>> import io
+    >>> list(iter_bold_segments(io.StringIO("A **bold** and __strong__ word."), 4))
+    [('bold', 4), ('strong', 17)]
+    """
+    pieces: List[str] = []
+    base = 0
+    while True:
+        chunk = text.read(chunk_size)
+        if not chunk:
+            break
+        if pieces and __waits_for_marker__(pieces, chunk):
+            pieces.append(chunk)
+            continue
+
+        buffer = "".join(pieces) + chunk
+        undecided = __undecided__(buffer)
+        pos = 0
+        for m in BOLD_PATTERN.finditer(buffer):
+            if m.start() >= next(u for u in undecided if u >= pos):
+                break
+            segment, start = __segment__(m)
+            yield segment, base + start
+            pos = m.end()
+
+        u = next(u for u in undecided if u >= pos)
+        pieces = [buffer[u:]] if u < len(buffer) else []
+        base += u
+
+    buffer = "".join(pieces)
+    for m in BOLD_PATTERN.finditer(buffer):
+        segment, start = __segment__(m)
+        yield segment, base + start
+
+
+def collect_bold_segments(text: TextIO) -> Iterator[str]:
+    """
+    Yield the segments in between double asterisks or double underscores.
+    """
+    for segment, _ in iter_bold_segments(text):
+        yield segment
+
+
+def collect_unique_bold_segments(text: TextIO) -> Dict[str, List[int]]:
+    """
+    Return the distinct bold segments, in the order of their first occurrence,
+    and the offsets of their occurrences.
+    """
+    segments: Dict[str, List[int]] = {}
+    for segment, offset in iter_bold_segments(text):
+        segments.setdefault(segment, []).append(offset)
+    return segments
+
+
+def __collect_bold_segments__(
+    text_a: Path, unique: bool = False, with_positions: bool = False, **kwargs
+):
+    """
+    Collect all segments in between double asterisks or double underscores.
+
+    With --unique, each distinct segment is listed once, such that it is defined by
+    a single prompt. With --with-positions, the distinct segments are listed as
+    {"term": ..., "count": ..., "positions": [...]} objects, where positions are
+    the offsets of the occurrences in the file.
     """
     if not text_a.exists():
         logger.error(f"File {text_a} does not exist")
         exit(1)
 
+    output: List[Any]
     with open(text_a) as f:
-        json.dump(list(collect_bold_segments(f)), sys.stdout, ensure_ascii=False)
+        if with_positions:
+            output = [
+                {"term": term, "count": len(positions), "positions": positions}
+                for term, positions in collect_unique_bold_segments(f).items()
+            ]
+        elif unique:
+            output = list(collect_unique_bold_segments(f))
+        else:
+            output = list(collect_bold_segments(f))
+    json.dump(output, sys.stdout, ensure_ascii=False)
 
 
 def extend_parser(subparser_action):
@@ -37,5 +163,13 @@ def extend_parser(subparser_action):
 
     parser = subparser_action.add_parser(command, help=help, description=description)
     parser.add_argument("text_a", type=Path)
+    parser.add_argument(
+        "--unique", action="store_true", help="List each distinct segment once"
+    )
+    parser.add_argument(
+        "--with-positions",
+        action="store_true",
+        help="List the count and the offsets of each distinct segment",
+    )
 
     parser.set_defaults(func=__collect_bold_segments__, help=parser.print_help)
@@ -1,11 +1,19 @@
-from danoan.correct_markdown.core import api
+from danoan.correct_markdown.core import api, model
 from danoan.correct_markdown.core import utils as core_utils
+from danoan.correct_markdown.core.markdown_view import IncrementalDiffView
 from danoan.correct_markdown.cli import utils
+from danoan.correct_markdown.cli import watch as watch_files
 
+import dataclasses
+import difflib
+import functools
+import hashlib
 import io
 import logging
 from pathlib import Path
+import re
 import sys
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -13,10 +21,27 @@ handler.setLevel(logging.INFO)
 handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 logger.addHandler(handler)
 
+# Blank lines separating the blocks diffed independently in --watch mode.
+BLOCK_SEPARATOR = re.compile(r"\n[ \t]*\n\s*")
 
-def __corrected_view__(original_markdown: Path, plain_text_correction: Path, **kwargs):
+
+def __corrected_view__(
+    original_markdown: Path,
+    plain_text_correction: Path,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+    output: Optional[Path] = None,
+    watch: bool = False,
+    interval: float = watch_files.DEFAULT_INTERVAL,
+    **kwargs,
+):
     """
     Render plain text correction using the original markdown as template.
+
+    With --watch, the output is rendered again every time one of the files changes.
+    The diff items of each block and the rendered markdown blocks are kept in memory,
+    such that only the blocks whose content or corrections changed are diffed and
+    rendered again.
     """
     if not original_markdown.exists():
         print(f"Could find file {original_markdown}")
@@ -25,17 +50,155 @@ def __corrected_view__(original_markdown: Path, plain_text_correction: Path, **k
         print(f"Could find file {plain_text_correction}")
         exit(1)
 
+    if not watch:
+        if output is None:
+            write_corrected_view(
+                original_markdown, plain_text_correction, sys.stdout, engine, mode
+            )
+        else:
+            watch_files.write_atomically(
+                output,
+                lambda f: write_corrected_view(
+                    original_markdown, plain_text_correction, f, engine, mode
+                ),
+            )
+        return
+
+    if output is None:
+        logger.error("--watch requires --output")
+        exit(1)
+
+    view = api.apply_corrections_incremental_view()
+    diff_cache: Dict[str, List[model.DiffItem]] = {}
+
+    def render():
+        write = functools.partial(
+            write_corrected_view,
+            original_markdown,
+            plain_text_correction,
+            engine=engine,
+            mode=mode,
+            view=view,
+            diff_cache=diff_cache,
+        )
+        watch_files.write_atomically(output, write)
+        logger.info(f"{output} updated ({view.rendered} blocks rendered)")
+
+    watch_files.watch([original_markdown, plain_text_correction], render, interval)
+
+
+def write_corrected_view(
+    original_markdown: Path,
+    plain_text_correction: Path,
+    stream: TextIO,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+    view: Optional[IncrementalDiffView] = None,
+    diff_cache: Optional[Dict[str, List[model.DiffItem]]] = None,
+):
+    """
+    Write the corrected view in a stream.
+
+    If an IncrementalDiffView is given, the blocks it rendered before are reused.
+    If a diff cache is given, the texts are diffed block by block, see
+    __block_diff_items__, and the diff items of the blocks are kept in it.
+    """
     with open(original_markdown) as fa, open(plain_text_correction) as fb:
         ss_a = io.StringIO(fa.read())
+        no_html, source_map = core_utils.strip_html_tags(ss_a.getvalue())
+        text_b = fb.read()
+
+    if diff_cache is None:
+        diff_items = utils.get_diff_items(
+            io.StringIO(no_html), io.StringIO(text_b), engine, True, mode
+        )
+    else:
+        diff_items = __block_diff_items__(no_html, text_b, engine, mode, diff_cache)
+
+    ss_a.seek(0)
+    if view is None:
+        api.apply_corrections_view(ss_a, diff_items, source_map).write_to(stream)
+    else:
+        view.update(ss_a, diff_items).write_to(stream)
+    stream.write("\n")
+
+
+def __split_blocks__(text: str) -> List[str]:
+    """
+    Split a text after each run of blank lines.
+    """
+    ends = [m.end() for m in BLOCK_SEPARATOR.finditer(text)]
+    return [text[s:e] for s, e in zip([0, *ends], [*ends, len(text)]) if s < e]
+
+
+def __match_blocks__(
+    blocks_a: List[str], blocks_b: List[str]
+) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yield the ranges of blocks of the first and second texts to diff together.
+
+    The equal blocks are skipped. The blocks in between are paired one by one if
+    there are as many in both texts, as when the corrections keep the paragraphs,
+    and diffed together otherwise.
+    """
+    matcher = difflib.SequenceMatcher(None, blocks_a, blocks_b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if i2 - i1 == j2 - j1:
+            for k in range(i2 - i1):
+                yield i1 + k, i1 + k + 1, j1 + k, j1 + k + 1
+        else:
+            yield i1, i2, j1, j2
+
+
+def __block_diff_items__(
+    text_a: str,
+    text_b: str,
+    engine: model.DiffEngine,
+    mode: model.TextDiffMode,
+    diff_cache: Dict[str, List[model.DiffItem]],
+) -> List[model.DiffItem]:
+    """
+    Return the diff items of two texts, diffing only the blocks that changed.
+
+    The blocks of the texts are matched, see __match_blocks__, and the blocks that
+    differ are diffed on their own. Its diff items are kept in the diff cache under the hash of the
+    blocks, such that an edit only diffs the blocks it touches. The cache keeps
+    the entries of the last call only.
+    """
+    blocks_a = __split_blocks__(text_a)
+    blocks_b = __split_blocks__(text_b)
+    starts = [0]
+    for block in blocks_a:
+        starts.append(starts[-1] + len(block))
 
-        no_html = core_utils.remove_html_tags(ss_a)
+    diff_items = []
+    used: Dict[str, List[model.DiffItem]] = {}
+    for i1, i2, j1, j2 in __match_blocks__(blocks_a, blocks_b):
+        a = "".join(blocks_a[i1:i2])
+        b = "".join(blocks_b[j1:j2])
+        key = hashlib.sha256(f"{len(a)}:{a}{b}".encode("utf-8")).hexdigest()
+        items = diff_cache.get(key)
+        if items is None:
+            items = utils.get_diff_items(
+                io.StringIO(a), io.StringIO(b), engine, True, mode
+            )
+        used[key] = items
 
-        ss_b = io.StringIO(fb.read())
-        diff_items = utils.get_diff_items(io.StringIO(no_html), ss_b)
+        offset = starts[i1]
+        for item in items:
+            if item.start is not None and item.end is not None:
+                item = dataclasses.replace(
+                    item, start=item.start + offset, end=item.end + offset
+                )
+            else:
+                item = dataclasses.replace(item)
+            diff_items.append(item)
 
-        ss_a.seek(0)
-        r = api.apply_corrections(ss_a, diff_items)
-        print(r)
+    diff_cache.clear()
+    diff_cache.update(used)
+    return diff_items
 
 
 def extend_parser(subparser_action):
@@ -52,5 +215,8 @@ def extend_parser(subparser_action):
         type=Path,
         help="Path to file containing the plain text correction",
     )
+    utils.add_engine_argument(parser)
+    utils.add_mode_argument(parser)
+    watch_files.add_watch_arguments(parser)
 
     parser.set_defaults(func=__corrected_view__, help=parser.print_help)
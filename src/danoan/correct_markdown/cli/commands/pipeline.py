@@ -0,0 +1,271 @@
+from danoan.correct_markdown.cli import llm_runner, utils
+from danoan.correct_markdown.cli.commands import collect_bold, render_enhanced_md
+from danoan.correct_markdown.core import model
+from danoan.correct_markdown.core import utils as core_utils
+
+import asyncio
+from dataclasses import asdict
+import functools
+import io
+import logging
+from pathlib import Path
+import sys
+from typing import Any, Dict, List, Optional, TextIO
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+
+def __diff_message__(item: model.DiffItem) -> Dict[str, Any]:
+    """
+    The diff item as written by word-diff, i.e. without offsets.
+    """
+    return {
+        k: v
+        for k, v in asdict(item).items()
+        if v is not None and k not in ("start", "end")
+    }
+
+
+def __first__(value: Any) -> Any:
+    if isinstance(value, list):
+        return value[0] if value else ""
+    return value
+
+
+def __message__(value: Any) -> Any:
+    if isinstance(value, dict) and "message" in value:
+        return value["message"]
+    return value
+
+
+async def __run_prompts__(
+    runner: llm_runner.LLMRunner,
+    prompt: str,
+    messages: List[Any],
+    parameters: Dict[str, str],
+    semaphore: asyncio.Semaphore,
+    retries: int,
+    backoff: float,
+) -> List[Any]:
+    return await llm_runner.run_prompts(
+        runner,
+        prompt,
+        messages,
+        parameters,
+        retries=retries,
+        backoff=backoff,
+        semaphore=semaphore,
+    )
+
+
+async def run_pipeline_async(
+    markdown_file: Path,
+    title: str,
+    language: str,
+    runner: llm_runner.LLMRunner,
+    stream: TextIO,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+):
+    """
+    Correct a markdown file and write its enhanced markdown in a stream.
+
+    This is the pipeline of the makefile: the text without html tags is corrected;
+    then the corrections are explained, the bold-faced words are defined and the
+    text is summarized concurrently; finally the enhanced markdown is rendered.
+
+    The prompts are run by llm_runner.run_prompts, with at most max_in_flight of
+    them at the same time over the whole pipeline, and failed prompts are retried.
+    """
+    with open(markdown_file) as f:
+        original = core_utils.remove_html_tags(f) + "\n"
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+    (corrected,) = await __run_prompts__(
+        runner,
+        "correct-text",
+        [original],
+        {"language": language, "style": "same", "input-format": "markdown"},
+        semaphore,
+        retries,
+        backoff,
+    )
+    corrected = __message__(corrected)
+
+    parameters = {"language": language}
+    segments = list(collect_bold.collect_unique_bold_segments(io.StringIO(corrected)))
+    summary = asyncio.ensure_future(
+        __run_prompts__(
+            runner, "summarize", [corrected], parameters, semaphore, retries, backoff
+        )
+    )
+    definitions = asyncio.ensure_future(
+        __run_prompts__(
+            runner,
+            "word-definition",
+            segments,
+            parameters,
+            semaphore,
+            retries,
+            backoff,
+        )
+    )
+    try:
+        loop = asyncio.get_running_loop()
+        diff_items = await loop.run_in_executor(
+            None,
+            functools.partial(
+                utils.get_diff_items,
+                io.StringIO(original),
+                io.StringIO(corrected),
+                engine,
+                with_offsets=True,
+            ),
+        )
+        explanations = await __run_prompts__(
+            runner,
+            "explain-correction",
+            [__diff_message__(item) for item in diff_items],
+            parameters,
+            semaphore,
+            retries,
+            backoff,
+        )
+        (summary_output,), definitions_outputs = await asyncio.gather(
+            summary, definitions
+        )
+    except BaseException:
+        summary.cancel()
+        definitions.cancel()
+        raise
+
+    words_definitions: List[Dict[str, Any]] = [
+        {"Word": segment, "Definition": __first__(output)}
+        for segment, output in zip(segments, definitions_outputs)
+    ]
+    metadata_obj = model.Metadata(
+        markdown_file=str(markdown_file),
+        title=title,
+        original=original,
+        corrected=corrected,
+        corrections_explanations=explanations,
+        summary=__message__(summary_output),
+        words_definitions=words_definitions,
+    )
+
+    render_enhanced_md.write_metadata(metadata_obj, stream, diff_items)
+
+
+def run_pipeline(
+    markdown_file: Path,
+    title: str,
+    language: str,
+    runner: llm_runner.LLMRunner,
+    stream: TextIO,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+):
+    """
+    Run run_pipeline_async in a new event loop.
+    """
+    asyncio.run(
+        run_pipeline_async(
+            markdown_file,
+            title,
+            language,
+            runner,
+            stream,
+            max_in_flight,
+            retries,
+            backoff,
+            engine,
+        )
+    )
+
+
+def __pipeline__(
+    markdown_file: Path,
+    title: str,
+    language: str,
+    output: Optional[Path] = None,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    llm_command: Optional[List[str]] = None,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    **kwargs,
+):
+    """
+    Correct a markdown file and render its enhanced markdown in a single process.
+
+    The prompts are run with the llm-assistant command line. The explanations,
+    definitions and summary are requested concurrently, with at most
+    --max-in-flight prompts at the same time, and failed prompts are retried.
+    """
+    if not markdown_file.exists():
+        logger.error(f"File {markdown_file} does not exist")
+        exit(1)
+
+    if llm_command:
+        runner = llm_runner.SubprocessRunner(llm_command)
+    else:
+        runner = llm_runner.SubprocessRunner()
+
+    options = dict(
+        max_in_flight=max_in_flight,
+        retries=retries,
+        backoff=backoff,
+        engine=engine,
+    )
+    try:
+        if output is None:
+            run_pipeline(markdown_file, title, language, runner, sys.stdout, **options)
+            return
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as f:
+            run_pipeline(markdown_file, title, language, runner, f, **options)
+    except (RuntimeError, OSError) as ex:
+        logger.error(str(ex))
+        exit(1)
+
+
+def extend_parser(subparser_action):
+    command = "pipeline"
+    description = __pipeline__.__doc__
+    help = description.split(".")[0] if description else ""
+
+    parser = subparser_action.add_parser(command, help=help, description=description)
+    parser.add_argument("markdown_file", type=Path)
+    parser.add_argument("--title", required=True)
+    parser.add_argument("--language", required=True)
+    parser.add_argument(
+        "--output", type=Path, help="Output file (default: standard output)"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=8,
+        help="Number of prompts running at the same time",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=2, help="Number of retries of a failed prompt"
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        help="Seconds before the first retry, doubled at each retry",
+    )
+    llm_runner.add_llm_command_argument(parser)
+    utils.add_engine_argument(parser)
+
+    parser.set_defaults(func=__pipeline__, help=parser.print_help)
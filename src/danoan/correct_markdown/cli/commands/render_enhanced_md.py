@@ -1,14 +1,21 @@
 from danoan.correct_markdown.core import api, model
+from danoan.correct_markdown.core.markdown_view import (
+    IncrementalDiffView,
+    MarkdownView,
+)
 from danoan.correct_markdown.cli import utils
+from danoan.correct_markdown.cli import watch as watch_files
 
+import copy
 from dataclasses import asdict
+import functools
 import io
 import jinja2
 import json
 import logging
 from pathlib import Path
 import sys
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, TextIO, Tuple, Union
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -16,26 +23,107 @@ handler.setLevel(logging.INFO)
 handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 logger.addHandler(handler)
 
-env = jinja2.Environment(
-    loader=jinja2.PackageLoader("danoan.correct_markdown.cli"),
-    autoescape=jinja2.select_autoescape(),
-)
+
+@functools.lru_cache(maxsize=None)
+def get_env() -> jinja2.Environment:
+    """
+    Return the jinja environment of the templates, created on first use.
+    """
+    return jinja2.Environment(
+        loader=jinja2.PackageLoader("danoan.correct_markdown.cli"),
+        autoescape=jinja2.select_autoescape(),
+    )
+
+
+# Stand-in for the text while the template is rendered by write_enhanced_md.
+TEXT_PLACEHOLDER = "\x00text\x00"
 
 
 def render_enhanced_md(render_data: Dict[str, Any]) -> str:
-    template = env.get_template("enhanced_md.md.tpl")
+    template = get_env().get_template("enhanced_md.md.tpl")
     return template.render(**render_data)
 
 
-def __render_enhanced_md__(metadata: Path, **kwargs):
+def write_enhanced_md(
+    render_data: Dict[str, Any],
+    text_view: Union[MarkdownView, IncrementalDiffView],
+    stream: TextIO,
+):
+    """
+    Render the enhanced markdown in a stream.
+
+    The template is rendered chunk by chunk and the text is written directly from
+    the MarkdownView, such that the whole document is never held in a single string.
+    """
+    template = get_env().get_template("enhanced_md.md.tpl")
+    for chunk in template.generate(**{**render_data, "text": TEXT_PLACEHOLDER}):
+        parts = chunk.split(TEXT_PLACEHOLDER)
+        stream.write(parts[0])
+        for part in parts[1:]:
+            text_view.write_to(stream)
+            stream.write(part)
+
+
+def __render_enhanced_md__(
+    metadata: Path,
+    output: Optional[Path] = None,
+    watch: bool = False,
+    interval: float = watch_files.DEFAULT_INTERVAL,
+    **kwargs,
+):
     """
     Add strikethrough marks to identify modifications made among two files.
+
+    With --watch, the output is rendered again every time the metadata or the
+    markdown file changes. The diff items and the rendered markdown blocks are kept
+    in memory, such that only the blocks whose content or corrections changed are
+    rendered again.
     """
     if not metadata.exists():
         logger.error(f"File {metadata} does not exist")
         exit(1)
 
-    metadata_obj = None
+    if not watch:
+        try:
+            metadata_obj = read_metadata(metadata)
+            if output is None:
+                write_metadata(metadata_obj, sys.stdout)
+            else:
+                watch_files.write_atomically(
+                    output, lambda f: write_metadata(metadata_obj, f)
+                )
+        except ValueError as ex:
+            logger.error(str(ex))
+            exit(1)
+        return
+
+    if output is None:
+        logger.error("--watch requires --output")
+        exit(1)
+
+    view = api.strikethrough_errors_incremental_view()
+    diff_cache: Dict[Tuple[str, str], List[model.DiffItem]] = {}
+
+    def render():
+        metadata_obj = read_metadata(metadata)
+        key = (metadata_obj.original, metadata_obj.corrected)
+        if key not in diff_cache:
+            diff_cache.clear()
+            diff_cache[key] = __diff_items__(metadata_obj)
+
+        watch_files.write_atomically(
+            output,
+            lambda f: write_metadata(
+                metadata_obj, f, copy.deepcopy(diff_cache[key]), view
+            ),
+        )
+        logger.info(f"{output} updated ({view.rendered} blocks rendered)")
+
+    markdown_file = Path(read_metadata(metadata).markdown_file)
+    watch_files.watch([metadata, markdown_file], render, interval)
+
+
+def read_metadata(metadata: Path) -> model.Metadata:
     with open(metadata) as f:
         _m = json.load(f)
         m = {}
@@ -46,8 +134,10 @@ def __render_enhanced_md__(metadata: Path, **kwargs):
         m["corrections_explanations"] = _m["CorrectionsExplanations"]
         m["summary"] = _m["Summary"]
         m["words_definitions"] = _m["WordsDefinitions"]
-        metadata_obj = model.Metadata(**m)
+        return model.Metadata(**m)
 
+
+def __diff_items__(metadata_obj: model.Metadata) -> List[model.DiffItem]:
     ss_a = io.StringIO()
     ss_a.write(metadata_obj.original)
     ss_a.seek(0)
@@ -56,17 +146,40 @@ def __render_enhanced_md__(metadata: Path, **kwargs):
     ss_b.write(metadata_obj.corrected)
     ss_b.seek(0)
 
-    diff_items = utils.get_diff_items(ss_a, ss_b)
+    return utils.get_diff_items(ss_a, ss_b, with_offsets=True)
+
+
+def write_metadata(
+    metadata_obj: model.Metadata,
+    stream: TextIO,
+    diff_items: Optional[List[model.DiffItem]] = None,
+    view: Optional[IncrementalDiffView] = None,
+):
+    """
+    Render the enhanced markdown of a metadata object in a stream.
+
+    The diff items of the original and corrected texts are computed if they are
+    not given. They must have offsets. If an IncrementalDiffView is given, the
+    blocks it rendered before are reused.
+
+    Raise ValueError if the number of diff items and explanations differ.
+    """
+    if diff_items is None:
+        diff_items = __diff_items__(metadata_obj)
+
     if len(diff_items) != len(metadata_obj.corrections_explanations):
-        logger.error(
+        raise ValueError(
             f"Length of list of corrections  does not match the length of the list of explanations. {len(diff_items)} != {len(metadata_obj.corrections_explanations)}"
         )
-        exit(1)
 
     with open(metadata_obj.markdown_file) as f:
         render_data = asdict(metadata_obj).copy()
-        render_data["text"] = api.strikethrough_errors(f, diff_items)
-        print(render_enhanced_md(render_data))
+        if view is None:
+            text_view = api.strikethrough_errors_view(f, diff_items)
+        else:
+            text_view = view.update(f, diff_items)
+        write_enhanced_md(render_data, text_view, stream)
+        stream.write("\n")
 
 
 def extend_parser(subparser_action):
@@ -76,5 +189,6 @@ def extend_parser(subparser_action):
 
     parser = subparser_action.add_parser(command, help=help, description=description)
     parser.add_argument("metadata", type=Path)
+    watch_files.add_watch_arguments(parser)
 
     parser.set_defaults(func=__render_enhanced_md__, help=parser.print_help)
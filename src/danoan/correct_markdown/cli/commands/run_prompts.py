@@ -0,0 +1,109 @@
+from danoan.correct_markdown.cli import llm_runner
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Any, Iterator, List, Optional, TextIO
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+
+def __read_messages__(messages: TextIO, jsonl: bool) -> Iterator[Any]:
+    if not jsonl:
+        yield from json.load(messages)
+        return
+
+    for line in messages:
+        if line.strip():
+            yield json.loads(line)
+
+
+def __run_prompts__(
+    prompt: str,
+    messages: TextIO,
+    jsonl: bool = False,
+    p: Optional[List[List[str]]] = None,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    llm_command: Optional[List[str]] = None,
+    **kwargs,
+):
+    """
+    Run a prompt over each element of a json list and print the list of outputs.
+
+    The prompts run concurrently, with at most --max-in-flight of them at the same
+    time, and failed prompts are retried. The outputs are in the order of the input.
+    With --jsonl, the input has one message per line and the prompts start as soon
+    as the lines are read.
+    """
+    if llm_command:
+        runner = llm_runner.SubprocessRunner(llm_command)
+    else:
+        runner = llm_runner.SubprocessRunner()
+
+    parameters = dict(p or [])
+    try:
+        outputs = asyncio.run(
+            llm_runner.run_prompts(
+                runner,
+                prompt,
+                __read_messages__(messages, jsonl),
+                parameters,
+                max_in_flight,
+                retries,
+                backoff,
+            )
+        )
+    except (RuntimeError, OSError) as ex:
+        logger.error(str(ex))
+        exit(1)
+
+    json.dump(outputs, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+
+
+def extend_parser(subparser_action):
+    command = "run-prompts"
+    description = __run_prompts__.__doc__
+    help = description.split(".")[0] if description else ""
+
+    parser = subparser_action.add_parser(command, help=help, description=description)
+    parser.add_argument("prompt")
+    parser.add_argument(
+        "messages", nargs="?", default=sys.stdin, type=argparse.FileType("r")
+    )
+    parser.add_argument(
+        "--jsonl", action="store_true", help="Read one message per line"
+    )
+    parser.add_argument(
+        "--p",
+        nargs=2,
+        action="append",
+        metavar=("NAME", "VALUE"),
+        help="Parameter of the prompt",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=8,
+        help="Number of prompts running at the same time",
+    )
+    parser.add_argument(
+        "--retries", type=int, default=2, help="Number of retries of a failed prompt"
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        help="Seconds before the first retry, doubled at each retry",
+    )
+    llm_runner.add_llm_command_argument(parser)
+
+    parser.set_defaults(func=__run_prompts__, help=parser.print_help)
@@ -0,0 +1,325 @@
+from danoan.correct_markdown.cli.commands import render_enhanced_md
+
+import argparse
+from concurrent.futures import CancelledError, Executor, Future, ProcessPoolExecutor
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import logging
+import os
+from pathlib import Path
+import socketserver
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import uuid
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+# Commands that can be run by the server and their allowed flags. The flags that
+# write files, as --output, or run other programs are not allowed.
+ALLOWED_FLAGS: Dict[str, List[str]] = {
+    "collect-bold-segments": ["--unique", "--with-positions"],
+    "corrected-view": ["--engine", "--mode"],
+    "markdown-view": [],
+    "render-enhanced-md": [],
+    "word-diff": ["--engine", "--mode", "--with-offsets", "--jsonl"],
+}
+COMMANDS = list(ALLOWED_FLAGS)
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_QUEUE = 64
+
+# Hosts of the web pages allowed to send requests.
+LOCAL_HOSTS = ["127.0.0.1", "localhost", "::1"]
+
+# Parser of the command line in each worker, see __init_worker__.
+_parser: Optional[argparse.ArgumentParser] = None
+
+
+def __init_worker__():
+    global _parser
+    # The cli module imports this one.
+    from danoan.correct_markdown.cli import cli
+
+    _parser = cli.build_parser(COMMANDS)
+    render_enhanced_md.get_env().get_template("enhanced_md.md.tpl")
+
+
+def __check_flags__(command: str, args: List[str]) -> Optional[str]:
+    """
+    Return an error if an argument is a flag not allowed for the command.
+    """
+    allowed = ALLOWED_FLAGS[command]
+    for arg in args:
+        if arg != "-" and arg.startswith("-") and arg.split("=")[0] not in allowed:
+            return f"Flag {arg} is not allowed. Use one of {allowed}"
+    return None
+
+
+def run_command(args: List[str], stdin: str = "") -> Dict[str, Any]:
+    """
+    Run a command line in a worker and return its status and standard output.
+
+    The arguments that default to the standard input, as the markdown of
+    markdown-view, read the stdin string instead.
+    """
+    if _parser is None:
+        __init_worker__()
+    assert _parser is not None
+
+    if not args or args[0] not in COMMANDS:
+        return {"status": "error", "error": f"Unknown command. Use one of {COMMANDS}"}
+    error = __check_flags__(args[0], args[1:])
+    if error is not None:
+        return {"status": "error", "error": error}
+
+    output = io.StringIO()
+    errors = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+            parsed = _parser.parse_args(args)
+            kwargs = {
+                k: io.StringIO(stdin) if v is sys.stdin else v
+                for k, v in vars(parsed).items()
+            }
+            parsed.func(**kwargs)
+    except SystemExit as ex:
+        error = errors.getvalue().strip() or output.getvalue().strip()
+        return {"status": "error", "error": f"Exited with code {ex.code}. {error}"}
+    except Exception as ex:
+        return {"status": "error", "error": f"{type(ex).__name__}: {ex}"}
+
+    return {"status": "ok", "output": output.getvalue()}
+
+
+class Service:
+    """
+    Queue the requests in a bounded executor and keep track of them by id.
+
+    At most max_queue requests are queued or running. A queued request can be
+    cancelled; a running request runs to completion.
+    """
+
+    def __init__(self, executor: Executor, max_queue: int = DEFAULT_MAX_QUEUE):
+        self.executor = executor
+        self.slots = threading.BoundedSemaphore(max_queue)
+        self.jobs: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    def run(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Run a request {"command": ..., "args": [...], "stdin": ..., "id": ...} and
+        return the http status and the response.
+        """
+        command = request.get("command")
+        args = request.get("args", [])
+        stdin = request.get("stdin", "")
+        if (
+            not isinstance(command, str)
+            or not isinstance(args, list)
+            or not isinstance(stdin, str)
+        ):
+            return 400, {"status": "error", "error": "Invalid request"}
+
+        job_id = str(request.get("id") or uuid.uuid4())
+        response: Dict[str, Any] = {"id": job_id}
+        if not self.slots.acquire(blocking=False):
+            return 503, {**response, "status": "error", "error": "Queue is full"}
+
+        with self.lock:
+            if job_id in self.jobs:
+                self.slots.release()
+                return 409, {**response, "status": "error", "error": "Duplicated id"}
+            future = self.executor.submit(
+                run_command, [command, *map(str, args)], stdin
+            )
+            self.jobs[job_id] = future
+
+        try:
+            response.update(future.result())
+        except CancelledError:
+            response["status"] = "cancelled"
+        except Exception as ex:
+            response.update(status="error", error=f"{type(ex).__name__}: {ex}")
+        finally:
+            with self.lock:
+                del self.jobs[job_id]
+            self.slots.release()
+        return 200, response
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        with self.lock:
+            future = self.jobs.get(job_id)
+            cancelled = future is not None and future.cancel()
+        return {"id": job_id, "cancelled": cancelled}
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"status": "ok", "jobs": len(self.jobs)}
+
+
+class ServiceServer(socketserver.BaseServer):
+    """
+    Server of the requests of a service, see RequestHandler.
+    """
+
+    service: Service
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /run runs a command, POST /cancel cancels a queued request given its id and
+    GET /status returns the number of queued and running requests.
+    """
+
+    server: ServiceServer
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.__respond__(200, self.server.service.status())
+        else:
+            self.__respond__(404, {"status": "error", "error": "Not found"})
+
+    def do_POST(self):
+        error = self.__check_origin__()
+        if error is not None:
+            self.__respond__(403, {"status": "error", "error": error})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("The request is not a json object")
+        except ValueError as ex:
+            self.__respond__(400, {"status": "error", "error": str(ex)})
+            return
+
+        if self.path == "/run":
+            self.__respond__(*self.server.service.run(request))
+        elif self.path == "/cancel":
+            self.__respond__(200, self.server.service.cancel(str(request.get("id"))))
+        else:
+            self.__respond__(404, {"status": "error", "error": "Not found"})
+
+    def __check_origin__(self) -> Optional[str]:
+        """
+        Return an error if the request could come from a web page of another origin.
+
+        The requests must be json, which a web page cannot send to another origin
+        without the consent of the server, and the Origin header, if any, must be
+        localhost.
+        """
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.split(";")[0].strip().lower() != "application/json":
+            return "The Content-Type must be application/json"
+
+        origin = self.headers.get("Origin")
+        if origin is not None and urlparse(origin).hostname not in LOCAL_HOSTS:
+            return f"Origin {origin} is not allowed"
+        return None
+
+    def __respond__(self, code: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # The client address of a unix socket is empty.
+        logger.debug(format % args)
+
+
+class ThreadingServiceHTTPServer(ServiceServer, ThreadingHTTPServer):
+    pass
+
+
+class ThreadingUnixHTTPServer(
+    ServiceServer, socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def make_server(
+    service: Service, port: int = DEFAULT_PORT, socket_path: Optional[Path] = None
+) -> ServiceServer:
+    """
+    Create an http server of the service on a unix socket, if given, or on a port
+    of localhost.
+    """
+    server: ServiceServer
+    if socket_path is not None:
+        if socket_path.exists():
+            socket_path.unlink()
+        server = ThreadingUnixHTTPServer(str(socket_path), RequestHandler)
+    else:
+        server = ThreadingServiceHTTPServer(("127.0.0.1", port), RequestHandler)
+    server.service = service
+    return server
+
+
+def __serve__(
+    port: int = DEFAULT_PORT,
+    socket: Optional[Path] = None,
+    workers: Optional[int] = None,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+    **kwargs,
+):
+    """
+    Serve the commands over http, on localhost or on a unix socket.
+
+    The commands collect-bold-segments, corrected-view, markdown-view,
+    render-enhanced-md and word-diff are run in a pool of warm worker processes.
+    POST /run with {"command": "word-diff", "args": ["a.json", "b.json"]} returns
+    {"id": ..., "status": "ok", "output": ...}, where output is the standard output
+    of the command; "stdin" gives the standard input and "id" names the request.
+    POST /cancel with {"id": ...} cancels a queued request.
+
+    Relative paths are resolved against the working directory of the server. The
+    flags that write files, as --output, are not allowed. The requests must have
+    the application/json Content-Type and come from localhost pages, if any.
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=__init_worker__
+    ) as executor:
+        server = make_server(Service(executor, max_queue), port, socket)
+        where = socket if socket is not None else f"http://127.0.0.1:{port}"
+        logger.warning(f"Serving on {where}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if socket is not None and os.path.exists(socket):
+                os.unlink(socket)
+
+
+def extend_parser(subparser_action):
+    command = "serve"
+    description = __serve__.__doc__
+    help = description.split(".")[0] if description else ""
+
+    parser = subparser_action.add_parser(command, help=help, description=description)
+    parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port of localhost"
+    )
+    parser.add_argument("--socket", type=Path, help="Path of a unix socket")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=DEFAULT_MAX_QUEUE,
+        help="Number of requests queued or running at the same time",
+    )
+
+    parser.set_defaults(func=__serve__, help=parser.print_help)
@@ -1,10 +1,13 @@
 from danoan.correct_markdown.cli import utils
 
+from danoan.correct_markdown.core import model
+
 from dataclasses import asdict
 import json
 import logging
 from pathlib import Path
 import sys
+from typing import Any, Dict
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -13,9 +16,21 @@ handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 logger.addHandler(handler)
 
 
-def __word_diff__(text_a: Path, text_b: Path, **kwargs):
+def __word_diff__(
+    text_a: Path,
+    text_b: Path,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    with_offsets: bool = False,
+    jsonl: bool = False,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+    **kwargs,
+):
     """
     Compare two files and return a list of diff items.
+
+    With --with-offsets, each item carries the start and end offsets of its original
+    value in the text of the first file. With --jsonl, each item is written in its
+    own line as soon as it is found, instead of a single json list at the end.
     """
     if not text_a.exists():
         logger.error(f"File {text_a} does not exist")
@@ -24,12 +39,30 @@ def __word_diff__(text_a: Path, text_b: Path, **kwargs):
         logger.error(f"File {text_b} does not exist")
         exit(1)
 
-    diff_items = utils.get_diff_items_from_path(text_a, text_b)
+    if jsonl:
+        for item in utils.iter_diff_items_from_path(
+            text_a, text_b, engine, with_offsets, mode
+        ):
+            sys.stdout.write(json.dumps(__as_dict__(item), ensure_ascii=False))
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+        return
+
+    diff_items = utils.get_diff_items_from_path(
+        text_a, text_b, engine, with_offsets, mode
+    )
     json.dump(
-        [asdict(el) for el in diff_items], sys.stdout, indent=2, ensure_ascii=False
+        [__as_dict__(el) for el in diff_items],
+        sys.stdout,
+        indent=2,
+        ensure_ascii=False,
     )
 
 
+def __as_dict__(item: model.DiffItem) -> Dict[str, Any]:
+    return {k: v for k, v in asdict(item).items() if v is not None}
+
+
 def extend_parser(subparser_action):
     command = "word-diff"
     description = __word_diff__.__doc__
@@ -38,5 +71,17 @@ def extend_parser(subparser_action):
     parser = subparser_action.add_parser(command, help=help, description=description)
     parser.add_argument("text_a", type=Path)
     parser.add_argument("text_b", type=Path)
+    utils.add_engine_argument(parser)
+    utils.add_mode_argument(parser)
+    parser.add_argument(
+        "--with-offsets",
+        action="store_true",
+        help="Record the offsets of the original values in the first file",
+    )
+    parser.add_argument(
+        "--jsonl",
+        action="store_true",
+        help="Write one diff item per line as soon as it is found",
+    )
 
     parser.set_defaults(func=__word_diff__, help=parser.print_help)
@@ -0,0 +1,296 @@
+from abc import ABC, abstractmethod
+import asyncio
+import functools
+import json
+import logging
+import shlex
+import subprocess
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+DEFAULT_COMMAND = "llm-assistant run"
+
+# End of the messages in run_prompts.
+_END = object()
+
+
+class LLMRunner(ABC):
+    """
+    Run a prompt over a message and return the json output of the prompt.
+
+    Implementations must define run and be safe to call from several threads at
+    once. The default run_async calls run in a thread.
+    """
+
+    @abstractmethod
+    def run(
+        self, prompt: str, message: Any, parameters: Optional[Dict[str, str]] = None
+    ) -> Any:
+        ...
+
+    async def run_async(
+        self, prompt: str, message: Any, parameters: Optional[Dict[str, str]] = None
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.run, prompt, message, parameters)
+        )
+
+
+class SubprocessRunner(LLMRunner):
+    """
+    Run the prompts with the llm-assistant command line.
+
+    The message is written to the standard input of the command as {"message": ...}
+    and its standard output is parsed as json. An output that is not valid json is
+    returned as a string.
+
+    A command still running when run_async is cancelled is killed.
+    """
+
+    def __init__(self, command: Sequence[str] = tuple(shlex.split(DEFAULT_COMMAND))):
+        self.command = list(command)
+
+    def __args__(self, prompt: str, parameters: Optional[Dict[str, str]]) -> List[str]:
+        args = [*self.command, prompt]
+        for name, value in (parameters or {}).items():
+            args.extend(["--p", name, value])
+        return args
+
+    def __output__(self, prompt: str, returncode: int, stdout: str, stderr: str) -> Any:
+        if returncode != 0:
+            raise RuntimeError(
+                f"Prompt {prompt} exited with code {returncode}: {stderr.strip()}"
+            )
+
+        try:
+            return json.loads(stdout)
+        except json.JSONDecodeError:
+            return stdout
+
+    def run(
+        self, prompt: str, message: Any, parameters: Optional[Dict[str, str]] = None
+    ) -> Any:
+        completed = subprocess.run(
+            self.__args__(prompt, parameters),
+            input=json.dumps({"message": message}, ensure_ascii=False),
+            capture_output=True,
+            text=True,
+        )
+        return self.__output__(
+            prompt, completed.returncode, completed.stdout, completed.stderr
+        )
+
+    async def run_async(
+        self, prompt: str, message: Any, parameters: Optional[Dict[str, str]] = None
+    ) -> Any:
+        process = await asyncio.create_subprocess_exec(
+            *self.__args__(prompt, parameters),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await process.communicate(
+                json.dumps({"message": message}, ensure_ascii=False).encode("utf-8")
+            )
+        except asyncio.CancelledError:
+            # Do not leave the command running when the prompt is cancelled.
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            raise
+        returncode = await process.wait()
+        return self.__output__(
+            prompt, returncode, stdout.decode("utf-8"), stderr.decode("utf-8")
+        )
+
+
+async def __run_with_retries__(
+    runner: LLMRunner,
+    prompt: str,
+    message: Any,
+    parameters: Optional[Dict[str, str]],
+    semaphore: asyncio.Semaphore,
+    retries: int,
+    backoff: float,
+) -> Any:
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                return await runner.run_async(prompt, message, parameters)
+            except Exception as ex:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2**attempt
+                logger.warning(f"{ex}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+async def run_prompts(
+    runner: LLMRunner,
+    prompt: str,
+    messages: Iterable[Any],
+    parameters: Optional[Dict[str, str]] = None,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> List[Any]:
+    """
+    Run a prompt over each message and return the outputs in the order of messages.
+
+    At most max_in_flight prompts run at the same time, or as many as the given
+    semaphore allows, which can be shared by concurrent calls. A failed prompt is
+    retried up to retries times, waiting backoff*2^attempt seconds in between. The
+    messages are consumed in a thread, such that the first prompts start while a
+    slow iterable (e.g. a pipe) is still producing the next messages.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_in_flight)
+    loop = asyncio.get_running_loop()
+
+    iterator = iter(messages)
+    tasks = []
+    while True:
+        message = await loop.run_in_executor(None, next, iterator, _END)
+        if message is _END:
+            break
+        tasks.append(
+            asyncio.ensure_future(
+                __run_with_retries__(
+                    runner, prompt, message, parameters, semaphore, retries, backoff
+                )
+            )
+        )
+
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+def pack_messages(
+    messages: List[Any], budget: int, indices: Optional[List[int]] = None
+) -> List[List[int]]:
+    """
+    Group the messages, in order, in packs whose json size is at most budget chars.
+
+    Return the indices of the messages of each pack. A message larger than the
+    budget is alone in its pack. Only the given indices are packed, if any.
+    """
+    if indices is None:
+        indices = list(range(len(messages)))
+
+    packs: List[List[int]] = []
+    size = 0
+    for i in indices:
+        message_size = len(json.dumps(__packed__(i, messages[i]), ensure_ascii=False))
+        if packs and size + message_size <= budget:
+            packs[-1].append(i)
+            size += message_size
+        else:
+            packs.append([i])
+            size = message_size
+    return packs
+
+
+def __packed__(i: int, message: Any) -> Dict[str, Any]:
+    return {"id": str(i), "message": message}
+
+
+def __split_output__(output: Any, pack: List[int]) -> Dict[int, Any]:
+    """
+    Map the indices of a pack to their outputs in the response of a packed prompt.
+
+    The response is either an object {id: output} or a list of objects with the id
+    and output keys. The response of a pack of a single message may also be the
+    output itself.
+    """
+    if isinstance(output, dict) and "message" in output and len(output) == 1:
+        output = output["message"]
+
+    by_id: Dict[str, Any] = {}
+    if isinstance(output, dict):
+        by_id = {str(k): v for k, v in output.items()}
+    elif isinstance(output, list):
+        for entry in output:
+            if isinstance(entry, dict) and "id" in entry and "output" in entry:
+                by_id[str(entry["id"])] = entry["output"]
+
+    outputs = {i: by_id[str(i)] for i in pack if str(i) in by_id}
+    if len(pack) == 1 and not outputs:
+        outputs[pack[0]] = output
+    return outputs
+
+
+async def run_packed_prompts(
+    runner: LLMRunner,
+    prompt: str,
+    messages: List[Any],
+    parameters: Optional[Dict[str, str]] = None,
+    budget: int = 4000,
+    max_in_flight: int = 8,
+    retries: int = 2,
+    backoff: float = 1.0,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> List[Any]:
+    """
+    Run a prompt over packs of messages and return one output per message, in order.
+
+    The message of each prompt is a list of {"id": ..., "message": ...} objects
+    whose json size is at most budget chars (roughly four chars per token), see
+    pack_messages. The prompt must answer with an object mapping the ids to their
+    outputs, see __split_output__. The messages missing in a response are packed
+    again with half the budget and sent again. If no pack of several messages was
+    answered, the prompt does not understand packs and the messages are sent one
+    by one.
+    """
+    outputs: Dict[int, Any] = {}
+    pending = list(range(len(messages)))
+    while pending:
+        packs = pack_messages(messages, budget, pending)
+        responses = await run_prompts(
+            runner,
+            prompt,
+            [[__packed__(i, messages[i]) for i in pack] for pack in packs],
+            parameters,
+            max_in_flight,
+            retries,
+            backoff,
+            semaphore,
+        )
+
+        pending = []
+        answered = False
+        for pack, response in zip(packs, responses):
+            found = __split_output__(response, pack)
+            outputs.update(found)
+            pending.extend(i for i in pack if i not in found)
+            answered = answered or (len(pack) > 1 and len(found) > 0)
+
+        if pending and not answered:
+            logger.warning(f"Prompt {prompt} does not answer packs of messages")
+            budget = 0
+        elif pending:
+            logger.warning(f"{len(pending)} messages missing in the responses")
+            budget //= 2
+
+    return [outputs[i] for i in range(len(messages))]
+
+
+def add_llm_command_argument(parser):
+    parser.add_argument(
+        "--llm-command",
+        type=shlex.split,
+        default=shlex.split(DEFAULT_COMMAND),
+        help=f"Command used to run the prompts (default: {DEFAULT_COMMAND})",
+    )
@@ -1,12 +1,33 @@
-from danoan.correct_markdown.core import api, model, utils
+from danoan.correct_markdown.core import api, cache, model, utils
 
+from dataclasses import asdict
 import io
 import json
 from pathlib import Path
-from typing import List, TextIO
+from typing import Iterator, List, TextIO
 
+# Version of the diff items in the cache. Increment it when the fields of DiffItem
+# or the diff change, such that the entries of older versions are not used.
+DIFF_ITEMS_CACHE_VERSION = 1
 
-def get_diff_items(text_a: TextIO, text_b: TextIO) -> List[model.DiffItem]:
+
+def get_diff_items(
+    text_a: TextIO,
+    text_b: TextIO,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    with_offsets: bool = False,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+) -> List[model.DiffItem]:
+    return list(iter_diff_items(text_a, text_b, engine, with_offsets, mode))
+
+
+def iter_diff_items(
+    text_a: TextIO,
+    text_b: TextIO,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    with_offsets: bool = False,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+) -> Iterator[model.DiffItem]:
     ss_a = io.StringIO()
     # ss_a.write(utils.get_plain_text_from_markdown(text_a))
     ss_a.write(utils.remove_html_tags(text_a))
@@ -18,10 +39,68 @@ def get_diff_items(text_a: TextIO, text_b: TextIO) -> List[model.DiffItem]:
     ss_a.seek(0)
     ss_b.seek(0)
 
-    return list(api.text_diff(ss_a, ss_b, model.TextDiffMode.Word, 10, True))
+    disk_cache = cache.get_default_cache()
+    if disk_cache is None:
+        yield from __text_diff__(ss_a, ss_b, engine, with_offsets, mode)
+        return
+
+    key = disk_cache.make_key(
+        "diff_items",
+        DIFF_ITEMS_CACHE_VERSION,
+        ss_a.getvalue(),
+        ss_b.getvalue(),
+        engine.value,
+        with_offsets,
+        mode.value,
+    )
+    cached = disk_cache.get(key)
+    if cached is not None:
+        yield from (model.DiffItem(**d) for d in cached)
+        return
+
+    diff_items = []
+    for item in __text_diff__(ss_a, ss_b, engine, with_offsets, mode):
+        diff_items.append(asdict(item))
+        yield item
+    disk_cache.set(key, diff_items)
+
+
+def __text_diff__(
+    ss_a: TextIO,
+    ss_b: TextIO,
+    engine: model.DiffEngine,
+    with_offsets: bool,
+    mode: model.TextDiffMode,
+) -> Iterator[model.DiffItem]:
+    return api.text_diff(
+        ss_a,
+        ss_b,
+        mode,
+        10,
+        True,
+        engine=engine,
+        incremental=True,
+        with_offsets=with_offsets,
+    )
 
 
-def get_diff_items_from_path(text_a: Path, text_b: Path) -> List[model.DiffItem]:
+def get_diff_items_from_path(
+    text_a: Path,
+    text_b: Path,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    with_offsets: bool = False,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+) -> List[model.DiffItem]:
+    return list(iter_diff_items_from_path(text_a, text_b, engine, with_offsets, mode))
+
+
+def iter_diff_items_from_path(
+    text_a: Path,
+    text_b: Path,
+    engine: model.DiffEngine = model.DiffEngine.Difflib,
+    with_offsets: bool = False,
+    mode: model.TextDiffMode = model.TextDiffMode.Word,
+) -> Iterator[model.DiffItem]:
     message_a, message_b = None, None
     with open(text_a) as fa, open(text_b) as fb:
         message_a = json.load(fa)["message"]
@@ -35,4 +114,28 @@ def get_diff_items_from_path(text_a: Path, text_b: Path) -> List[model.DiffItem]
     ss_a.seek(0)
     ss_b.seek(0)
 
-    return get_diff_items(ss_a, ss_b)
+    return iter_diff_items(ss_a, ss_b, engine, with_offsets, mode)
+
+
+def add_engine_argument(parser):
+    parser.add_argument(
+        "--engine",
+        type=model.DiffEngine,
+        choices=list(model.DiffEngine),
+        default=model.DiffEngine.Difflib,
+        metavar="{" + ",".join(e.value for e in model.DiffEngine) + "}",
+        help="Diff algorithm used to compare the texts",
+    )
+
+
+def add_mode_argument(parser):
+    modes = [model.TextDiffMode.Word, model.TextDiffMode.Hierarchical]
+    parser.add_argument(
+        "--mode",
+        type=model.TextDiffMode,
+        choices=modes,
+        default=model.TextDiffMode.Word,
+        metavar="{" + ",".join(m.value for m in modes) + "}",
+        help="Compare the texts word by word or match their unchanged paragraphs "
+        "and sentences first",
+    )
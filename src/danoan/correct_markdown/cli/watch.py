@@ -0,0 +1,83 @@
+import logging
+import os
+from pathlib import Path
+import sys
+import threading
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+# Seconds between two checks of the watched files.
+DEFAULT_INTERVAL = 0.5
+
+
+def __stamp__(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def write_atomically(output: Path, write: Callable):
+    """
+    Write a file with write(stream) and move it in place once it is complete.
+    """
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(f".{output.name}.tmp")
+    with open(tmp, "w") as f:
+        write(f)
+    os.replace(tmp, output)
+
+
+def watch(
+    paths: List[Path],
+    render: Callable[[], None],
+    interval: float = DEFAULT_INTERVAL,
+    stop: Optional[threading.Event] = None,
+):
+    """
+    Call render now and every time one of the files changes, until stop is set or
+    the process is interrupted.
+
+    The files are polled every interval seconds. Any error of render, e.g. a file
+    replaced while it is read, is logged and the files are watched again.
+    """
+    if stop is None:
+        stop = threading.Event()
+
+    stamps = None
+    try:
+        while not stop.is_set():
+            new_stamps = [__stamp__(p) for p in paths]
+            if new_stamps != stamps:
+                stamps = new_stamps
+                try:
+                    render()
+                except Exception as ex:
+                    logger.error(f"{type(ex).__name__}: {ex}")
+            stop.wait(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def add_watch_arguments(parser):
+    parser.add_argument(
+        "--output", type=Path, help="Output file (default: standard output)"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Render the output again every time the input files change. Only the "
+        "changed markdown blocks are rendered again. Requires --output",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between two checks of the input files in --watch mode",
+    )
@@ -1,10 +1,23 @@
-from danoan.correct_markdown.core.markdown_view import MarkdownView
-from danoan.correct_markdown.core.model import DiffItem, TextDiffMode
-
-import difflib
+from danoan.correct_markdown.core import diff_engine
+from danoan.correct_markdown.core.markdown_view import (
+    ChunkedMarkdownView,
+    IncrementalDiffView,
+    MarkdownView,
+)
+from danoan.correct_markdown.core.model import (
+    DiffBatch,
+    DiffEngine,
+    DiffItem,
+    TextDiffMode,
+    sequence_offsets,
+)
+from danoan.correct_markdown.core.source_map import SourceMap
+
+from concurrent.futures import Executor
 import logging
+import re
 import sys
-from typing import Generator, List, TextIO, Tuple
+from typing import Generator, List, Optional, TextIO, Tuple
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -12,6 +25,9 @@ handler.setLevel(logging.INFO)
 handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
 logger.addHandler(handler)
 
+# Paragraphs are separated by blank lines.
+PARAGRAPH_SEPARATOR = re.compile(r"\n\s*\n")
+
 
 def text_diff(
     ss_a: TextIO,
@@ -19,55 +35,222 @@ def text_diff(
     mode: TextDiffMode,
     context_size: int = 10,
     update_a: bool = False,
+    engine: DiffEngine = DiffEngine.Difflib,
+    incremental: bool = False,
+    with_offsets: bool = False,
 ) -> Generator[DiffItem, None, None]:
     """
     Compare two string streams and return the differences.
 
     If mode is TextDiffMode.Letter, the streams are compared letter by letter.
     If mode is TextDiffMode.Word, some characters such as whitespaces and new lines are ignored.
+    If mode is TextDiffMode.Hierarchical, the streams are compared word by word as
+    with TextDiffMode.Word, but the paragraphs and then the sentences that did not
+    change are matched first, such that only the words of the modified sentences are
+    compared. This is much faster on long documents with few corrections. The
+    matching is only done when the whole streams are compared, i.e. unless update_a
+    and not incremental.
 
     The context_size gives the number of letter or words surrounding the diff that is returned
     as context.
 
     If update_a, then the baseline stream is updated with the found diff before the search
-    for the next diff is started.
+    for the next diff is started. The context before a diff then comes from the updated
+    baseline stream, i.e. it contains the new values of the previous differences.
+
+    The engine selects the diff algorithm. DiffEngine.Difflib is the historical
+    SequenceMatcher, which is quadratic in the worst case. DiffEngine.Myers runs in
+    O(ND) and, as DiffEngine.Patience and DiffEngine.Histogram, is much faster when
+    the streams have few differences.
+
+    If update_a and incremental, a single diff is computed and each item is rebased as
+    if the previous differences were already applied to the baseline stream. This
+    avoids the computation of a new diff for every difference found.
+
+    If with_offsets, the start and end character offsets of the original value in the
+    text of ss_a are recorded in each item. The offsets of an insertion point to the
+    letter or word before which the new value is inserted. Items whose original value
+    is not in the text of ss_a, which can happen with update_a, have no offsets.
+    """
+    if not update_a or incremental:
+        yield from text_diff_batch(
+            ss_a, ss_b, mode, context_size, update_a, engine, with_offsets
+        )
+        return
+
+    seq1, seq2, joiner, spans1, text_length, _ = _tokenize(
+        ss_a, ss_b, mode, with_offsets
+    )
+    while True:
+        for tag, i1, i2, j1, j2 in diff_engine.get_opcodes(seq1, seq2, engine):
+            if tag == "equal":
+                continue
+
+            context_before = joiner.join(seq1[max(0, i1 - context_size) : i1])
+            context_after = joiner.join(seq1[i2 : i2 + context_size])
+            action_segment = joiner.join(seq1[i1:i2])
+            context = f"{context_before} ___ {context_after}"
+
+            item = DiffItem(context, action_segment, joiner.join(seq2[j1:j2]), tag)
+            if with_offsets:
+                item.start, item.end = sequence_offsets(spans1, i1, i2, text_length)
+            yield item
+
+            window = seq2[max(j2 - context_size, 0) : j2]
+            seq1 = window + seq1[i2:]
+            if with_offsets:
+                # The window is not in the text of ss_a.
+                no_spans: List[Optional[Tuple[int, int]]] = [None] * len(window)
+                spans1 = no_spans + spans1[i2:]
+            seq2 = seq2[max(j2 - context_size, 0) :]
+            break
+        else:
+            break
+
+
+def text_diff_batch(
+    ss_a: TextIO,
+    ss_b: TextIO,
+    mode: TextDiffMode,
+    context_size: int = 10,
+    update_a: bool = False,
+    engine: DiffEngine = DiffEngine.Difflib,
+    with_offsets: bool = False,
+) -> DiffBatch:
+    """
+    Compare two string streams and return the differences in a DiffBatch.
+
+    The parameters are the ones of text_diff. The differences are computed in a single
+    diff and their strings are only built when they are accessed. If update_a, the
+    equal operations are skipped and the differences are rebased as with
+    text_diff(update_a=True, incremental=True).
+    """
+    seq1, seq2, joiner, spans1, text_length, paragraphs = _tokenize(
+        ss_a, ss_b, mode, with_offsets
+    )
+    if mode == TextDiffMode.Hierarchical:
+        opcodes = diff_engine.get_hierarchical_opcodes(
+            seq1, seq2, paragraphs[0], paragraphs[1], engine
+        )
+    else:
+        opcodes = diff_engine.get_opcodes(seq1, seq2, engine)
+
+    batch = DiffBatch(
+        seq1,
+        seq2,
+        joiner,
+        context_size,
+        rebased=update_a,
+        spans1=spans1 if with_offsets else None,
+        text_length=text_length,
+    )
+
+    # The baseline stream, once updated with the previous differences, is a window of
+    # seq2 ending at the previous difference followed by the remaining of seq1.
+    window_start = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        if not update_a:
+            batch.append(tag, i1, i2, j1, j2)
+            continue
+        if tag == "equal":
+            continue
+
+        batch.append(tag, i1, i2, j1, j2, max(0, j1 - context_size, window_start))
+        window_start = max(j2 - context_size, 0)
+
+    return batch
+
+
+def _tokenize(
+    ss_a: TextIO, ss_b: TextIO, mode: TextDiffMode, with_offsets: bool
+) -> Tuple[
+    List[str],
+    List[str],
+    str,
+    List[Optional[Tuple[int, int]]],
+    int,
+    Tuple[List[int], List[int]],
+]:
+    """
+    Split the streams in letters or words.
+
+    Return the two sequences, their joiner and, if with_offsets, the character
+    offsets of the elements of the first sequence and the length of its text. In
+    TextDiffMode.Hierarchical, also return the indexes of the first word of each
+    paragraph of the two sequences.
     """
     seq1: List[str] = []
     seq2: List[str] = []
+    spans1: List[Optional[Tuple[int, int]]] = []
+    paragraphs: Tuple[List[int], List[int]] = ([], [])
     joiner: str = ""
+    text_a = ss_a.read()
     if mode == TextDiffMode.Letter:
-        seq1 = list(ss_a.read())
+        seq1 = list(text_a)
         seq2 = list(ss_b.read())
+        if with_offsets:
+            spans1 = [(i, i + 1) for i in range(len(seq1))]
         joiner = ""
-    elif mode == TextDiffMode.Word:
-        seq1 = ss_a.read().split()
-        seq2 = ss_b.read().split()
+    elif mode in (TextDiffMode.Word, TextDiffMode.Hierarchical):
+        if with_offsets:
+            for m in re.finditer(r"\S+", text_a):
+                seq1.append(m.group(0))
+                spans1.append(m.span())
+        else:
+            seq1 = text_a.split()
+        text_b = ss_b.read()
+        seq2 = text_b.split()
+        if mode == TextDiffMode.Hierarchical:
+            paragraphs = (_paragraph_starts(text_a), _paragraph_starts(text_b))
         joiner = " "
     else:
         raise RuntimeError(f"Unexpected mode: {mode}")
 
-    while True:
-        sm = difflib.SequenceMatcher(None, seq1, seq2, autojunk=False)
-        for tag, i1, i2, j1, j2 in sm.get_opcodes():
-            if update_a and tag == "equal":
-                continue
+    return seq1, seq2, joiner, spans1, len(text_a), paragraphs
 
-            context_before = joiner.join(seq1[max(0, i1 - context_size) : i1])
-            context_after = joiner.join(seq1[i2 : i2 + context_size])
-            action_segment = joiner.join(seq1[i1:i2])
-            context = f"{context_before} ___ {context_after}"
 
-            yield DiffItem(context, action_segment, joiner.join(seq2[j1:j2]), tag)
-
-            if update_a:
-                seq1 = seq2[max(j2 - 10, 0) : j2] + seq1[i2:]
-                seq2 = seq2[max(j2 - 10, 0) :]
-                break
-        else:
-            break
+def _paragraph_starts(text: str) -> List[int]:
+    """
+    Return the index of the first word of each paragraph of the text.
+    """
+    starts = []
+    n = 0
+    for paragraph in PARAGRAPH_SEPARATOR.split(text):
+        words = len(paragraph.split())
+        if words:
+            starts.append(n)
+        n += words
+    return starts
 
 
 def strikethrough_errors(markdown_stream: TextIO, diff_items: List[DiffItem]) -> str:
+    return strikethrough_errors_view(markdown_stream, diff_items).get_full_content()
+
+
+def strikethrough_errors_view(
+    markdown_stream: TextIO,
+    diff_items: List[DiffItem],
+    source_map: Optional[SourceMap] = None,
+) -> MarkdownView:
+    insert, delete, replace = _strikethrough_errors_edits()
+    return diff_view(
+        markdown_stream,
+        diff_items,
+        insert=insert,
+        delete=delete,
+        replace=replace,
+        source_map=source_map,
+    )
+
+
+def strikethrough_errors_incremental_view() -> IncrementalDiffView:
+    """
+    IncrementalDiffView rendering the diff items as in strikethrough_errors_view.
+    """
+    return IncrementalDiffView(*_strikethrough_errors_edits())
+
+
+def _strikethrough_errors_edits():
     def insert(item: DiffItem, index: int):
         footnote_index = f"[^{index}]"
         return f"{item.new_value}{footnote_index} "
@@ -80,10 +263,37 @@ def strikethrough_errors(markdown_stream: TextIO, diff_items: List[DiffItem]) ->
         footnote_index = f"[^{index}]"
         return f"~~{item.original_value}~~ {item.new_value}{footnote_index}"
 
-    return render_diff_view(markdown_stream, diff_items, insert, delete, replace)
+    return insert, delete, replace
 
 
 def apply_corrections(markdown_stream: TextIO, diff_items: List[DiffItem]) -> str:
+    return apply_corrections_view(markdown_stream, diff_items).get_full_content()
+
+
+def apply_corrections_view(
+    markdown_stream: TextIO,
+    diff_items: List[DiffItem],
+    source_map: Optional[SourceMap] = None,
+) -> MarkdownView:
+    insert, delete, replace = _corrections_edits()
+    return diff_view(
+        markdown_stream,
+        diff_items,
+        insert=insert,
+        delete=delete,
+        replace=replace,
+        source_map=source_map,
+    )
+
+
+def apply_corrections_incremental_view() -> IncrementalDiffView:
+    """
+    IncrementalDiffView rendering the diff items as in apply_corrections_view.
+    """
+    return IncrementalDiffView(*_corrections_edits())
+
+
+def _corrections_edits():
     def insert(item: DiffItem, index: int):
         return item.new_value
 
@@ -93,7 +303,7 @@ def apply_corrections(markdown_stream: TextIO, diff_items: List[DiffItem]) -> st
     def replace(item: DiffItem, index: int):
         return item.new_value
 
-    return render_diff_view(markdown_stream, diff_items, insert, delete, replace)
+    return insert, delete, replace
 
 
 def apply_diff(mv: MarkdownView, item: DiffItem, start: int = 0) -> Tuple[int, int]:
@@ -128,18 +338,62 @@ def render_diff_view(
     insert=None,
     delete=None,
     replace=None,
+    chunk_size: Optional[int] = None,
+    executor: Optional[Executor] = None,
 ) -> str:
-    mv = MarkdownView(markdown_stream, True)
-    start = 0
+    return diff_view(
+        markdown_stream, diff_items, insert, delete, replace, chunk_size, executor
+    ).get_full_content()
+
+
+def diff_view(
+    markdown_stream: TextIO,
+    diff_items: List[DiffItem],
+    insert=None,
+    delete=None,
+    replace=None,
+    chunk_size: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    source_map: Optional[SourceMap] = None,
+) -> MarkdownView:
+    """
+    Apply the diff items in a MarkdownView of the markdown stream and return it.
+
+    The diff items are applied in a single batch with MarkdownView.apply_many. The
+    content can be written in a stream with MarkdownView.write_to without building
+    the whole string in memory.
+
+    If chunk_size is given, the view is a ChunkedMarkdownView split in chunks of
+    about chunk_size chars, whose segments are built by the executor, if any. The
+    content is the same.
+
+    The source map of the markdown without its html tags, see
+    utils.strip_html_tags, saves a scan of the markdown. It is not used by the
+    ChunkedMarkdownView, whose chunks are scanned independently.
+    """
+    if chunk_size is None:
+        mv = MarkdownView(markdown_stream, True, source_map)
+    else:
+        mv = ChunkedMarkdownView(markdown_stream, chunk_size, executor)
+
+    mv.apply_many(render_items(diff_items, insert, delete, replace))
+    return mv
+
+
+def render_items(
+    diff_items: List[DiffItem], insert=None, delete=None, replace=None
+) -> List[DiffItem]:
+    """
+    Set the new value of the diff items to the text rendered by insert, delete or
+    replace, called with the item and its index starting at 1. The items of an
+    operation without a function keep their new value.
+    """
+    diff_items = list(diff_items)
     for index, item in enumerate(diff_items, 1):
         if item.operation == "insert" and insert:
             item.new_value = insert(item, index)
-        elif item.operation == "delete":
+        elif item.operation == "delete" and delete:
             item.new_value = delete(item, index)
-        elif item.operation == "replace":
+        elif item.operation == "replace" and replace:
             item.new_value = replace(item, index)
-
-        s, e = apply_diff(mv, item, start)
-        start = e
-
-    return mv.get_full_content()
+    return diff_items
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__file__)
+handler = logging.StreamHandler(sys.stderr)
+handler.setLevel(logging.INFO)
+handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+logger.addHandler(handler)
+
+# Environment variable holding the folder of the default cache.
+CACHE_DIR_VARIABLE = "CORRECT_MARKDOWN_CACHE_DIR"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# An eviction removes entries until the cache fits in this fraction of max_size,
+# such that the next writes do not evict again.
+EVICTION_RATIO = 0.9
+
+# Number of writes after which the folder is measured again, to count the entries
+# written by other processes.
+SCAN_INTERVAL = 256
+
+# Age in seconds of the temporary files left behind by a writer that crashed.
+STALE_TMP_AGE = 3600
+
+
+class DiskCache:
+    """
+    Content-addressed cache of json values stored in a folder.
+
+    The key of a value is the sha256 of the inputs used to compute it. Values are
+    written atomically (temporary file and rename), such that several processes can
+    share the same folder. When the size of the folder exceeds max_size bytes, the
+    least recently used entries are evicted; reading an entry updates its mtime.
+
+    The size of the folder is measured at the first write, then kept up to date by
+    the writes of this instance and measured again every SCAN_INTERVAL writes or
+    when it exceeds max_size, such that a write does not list the whole folder.
+
+    >>> import tempfile
+    >>> cache = DiskCache(Path(tempfile.mkdtemp()))
+    >>> key = cache.make_key("diff", "text a", "text b", 10)
+    >>> cache.get(key) is None
+    True
+    >>> cache.set(key, [{"operation": "replace"}])
+    >>> cache.get(key)
+    [{'operation': 'replace'}]
+    """
+
+    def __init__(self, folder: Path, max_size: int = DEFAULT_MAX_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.size: Optional[int] = None
+        self.writes = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps(parts, ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()
+
+    def __path__(self, key: str) -> Path:
+        return self.folder / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self.__path__(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return value
+
+    def set(self, key: str, value: Any):
+        path = self.__path__(key)
+        path.parent.mkdir(exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.writes += 1
+        if self.size is not None:
+            self.size += size
+        if (
+            self.size is None
+            or self.size > self.max_size
+            or self.writes >= SCAN_INTERVAL
+        ):
+            self.evict()
+
+    def evict(self):
+        """
+        Measure the cache and, if it exceeds max_size, remove the least recently used
+        entries until it fits in EVICTION_RATIO * max_size.
+
+        The temporary files older than STALE_TMP_AGE are removed; the others are
+        being written and count in the size.
+        """
+        entries = []
+        total = 0
+        stale = time.time() - STALE_TMP_AGE
+        for path in self.folder.glob("*/*"):
+            try:
+                stat = path.stat()
+                if path.suffix == ".tmp" and stat.st_mtime < stale:
+                    path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if path.suffix == ".json":
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        self.size = total
+        self.writes = 0
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size * EVICTION_RATIO:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                # Evicted by another process.
+                pass
+            total -= size
+        self.size = total
+
+
+# Default caches of this process, by folder.
+_default_caches: Dict[str, DiskCache] = {}
+
+
+def get_default_cache() -> Optional[DiskCache]:
+    """
+    Return the cache in the folder given by CORRECT_MARKDOWN_CACHE_DIR, if it is set.
+
+    The same instance is returned for the same folder, such that it keeps track of
+    the size of the cache.
+    """
+    folder = os.environ.get(CACHE_DIR_VARIABLE)
+    if not folder:
+        return None
+    if folder not in _default_caches:
+        _default_caches[folder] = DiskCache(Path(folder))
+    return _default_caches[folder]
@@ -0,0 +1,616 @@
+from danoan.correct_markdown.core.model import DiffEngine
+
+from array import array
+import difflib
+import re
+from typing import Dict, Hashable, List, Sequence, Tuple, cast
+
+Opcode = Tuple[str, int, int, int, int]
+MatchingBlock = Tuple[int, int, int]
+
+# Histogram diff gives up on tokens that are repeated more than this number
+# of times in a region and falls back to Myers.
+HISTOGRAM_MAX_CHAIN = 64
+
+# Myers splits a region at the furthest point reached after this number of edits,
+# instead of the middle of an optimal edit script, such that its time is not
+# quadratic on heavily edited regions.
+MYERS_MAX_D = 256
+
+# A word ending a sentence, possibly followed by closing quotes or brackets.
+SENTENCE_END_PATTERN = re.compile(r"[.!?…][\"'”’»)\]]*$")
+
+Unit = Tuple[int, int]
+
+
+def get_opcodes(
+    seq1: Sequence[Hashable], seq2: Sequence[Hashable], engine: DiffEngine
+) -> List[Opcode]:
+    """
+    Return the list of opcodes that transform seq1 in seq2.
+
+    The opcodes follow the same format of difflib.SequenceMatcher.get_opcodes, i.e.,
+    a list of tuples (tag, i1, i2, j1, j2) where tag is one of `equal`, `replace`,
+    `insert` or `delete`.
+    """
+    if engine == DiffEngine.Difflib:
+        sm = difflib.SequenceMatcher(None, seq1, seq2, autojunk=False)
+        return cast(List[Opcode], sm.get_opcodes())
+
+    return opcodes_from_matching_blocks(
+        get_matching_blocks(seq1, seq2, engine), len(seq1), len(seq2)
+    )
+
+
+def get_matching_blocks(
+    seq1: Sequence[Hashable], seq2: Sequence[Hashable], engine: DiffEngine
+) -> List[MatchingBlock]:
+    """
+    Return the sorted list of matching blocks (i, j, n) such that seq1[i:i+n] == seq2[j:j+n].
+
+    Adjacent blocks are merged and the list does not contain the difflib sentinel.
+    """
+    if engine == DiffEngine.Difflib:
+        sm = difflib.SequenceMatcher(None, seq1, seq2, autojunk=False)
+        return [tuple(b) for b in sm.get_matching_blocks()[:-1]]  # type: ignore
+    elif engine == DiffEngine.Myers:
+        region_diff = myers_matching_blocks
+    elif engine == DiffEngine.Patience:
+        region_diff = patience_matching_blocks
+    elif engine == DiffEngine.Histogram:
+        region_diff = histogram_matching_blocks
+    else:
+        raise RuntimeError(f"Unexpected engine: {engine}")
+
+    blocks: List[MatchingBlock] = []
+    alo, ahi, blo, bhi = _trim_common_affixes(seq1, seq2, 0, len(seq1), 0, len(seq2))
+    if alo > 0:
+        blocks.append((0, 0, alo))
+    region_diff(seq1, seq2, alo, ahi, blo, bhi, blocks)
+    if ahi < len(seq1):
+        blocks.append((ahi, bhi, len(seq1) - ahi))
+
+    return _merge_blocks(blocks)
+
+
+def opcodes_from_matching_blocks(
+    blocks: List[MatchingBlock], len1: int, len2: int
+) -> List[Opcode]:
+    """
+    Convert a sorted list of matching blocks in a list of opcodes.
+    """
+    i = j = 0
+    opcodes: List[Opcode] = []
+    for ai, bj, size in blocks + [(len1, len2, 0)]:
+        tag = ""
+        if i < ai and j < bj:
+            tag = "replace"
+        elif i < ai:
+            tag = "delete"
+        elif j < bj:
+            tag = "insert"
+        if tag:
+            opcodes.append((tag, i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(("equal", ai, i, bj, j))
+    return opcodes
+
+
+def get_hierarchical_opcodes(
+    seq1: Sequence[str],
+    seq2: Sequence[str],
+    paragraphs1: List[int],
+    paragraphs2: List[int],
+    engine: DiffEngine,
+) -> List[Opcode]:
+    """
+    Return the list of opcodes that transform the words of seq1 in the words of seq2.
+
+    The paragraphs, given by the indexes of their first word, are matched first by
+    their content. The unmatched paragraphs are split in sentences that are matched
+    in the same way, and only the unmatched sentences are compared word by word.
+    Common prefixes and suffixes are trimmed at each level and adjacent opcodes of
+    the same kind are merged.
+    """
+    opcodes: List[Opcode] = []
+    _align_units(
+        seq1,
+        seq2,
+        _units(paragraphs1, len(seq1)),
+        _units(paragraphs2, len(seq2)),
+        (0, len(seq1), 0, len(seq2)),
+        engine,
+        True,
+        opcodes,
+    )
+    return _merge_opcodes(opcodes)
+
+
+def myers_matching_blocks(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+):
+    """
+    Myers O(ND) algorithm, in its linear space version, restricted to
+    seq1[alo:ahi] and seq2[blo:bhi].
+
+    The matching blocks found are appended to blocks. The region is split at the
+    middle of an optimal edit script, see _myers_split, and both sides are diffed
+    recursively. Time is O((N+M)D) and memory is O(N+M), where D is the size of the
+    edit script. This is fast whenever the sequences are similar, which is the case
+    of a text and its correction.
+
+    If a split needs more than MYERS_MAX_D edits, the region is split at the
+    furthest point reached instead, as git does. The time of a heavily edited region
+    is then O((N+M)*MYERS_MAX_D) per split, but the edit script may not be minimal.
+    """
+    found: List[MatchingBlock] = []
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = _trim_region(seq1, seq2, *stack.pop(), found)
+        if alo == ahi or blo == bhi:
+            continue
+
+        x, y = _myers_split(seq1, seq2, alo, ahi, blo, bhi)
+        stack.append((alo, x, blo, y))
+        stack.append((x, ahi, y, bhi))
+
+    found.sort()
+    blocks.extend(found)
+
+
+def patience_matching_blocks(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+):
+    """
+    Patience diff restricted to seq1[alo:ahi] and seq2[blo:bhi].
+
+    Tokens that occur exactly once in both regions are used as anchors. The longest
+    increasing sequence of anchors splits the regions and the gaps are diffed
+    recursively. Regions without unique tokens are delegated to Myers.
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = _trim_region(seq1, seq2, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = _patience_anchors(seq1, seq2, alo, ahi, blo, bhi)
+        if not anchors:
+            myers_matching_blocks(seq1, seq2, alo, ahi, blo, bhi, blocks)
+            continue
+
+        i, j = alo, blo
+        for ai, bj in anchors:
+            stack.append((i, ai, j, bj))
+            blocks.append((ai, bj, 1))
+            i, j = ai + 1, bj + 1
+        stack.append((i, ahi, j, bhi))
+
+    blocks.sort()
+
+
+def histogram_matching_blocks(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+):
+    """
+    Histogram diff restricted to seq1[alo:ahi] and seq2[blo:bhi].
+
+    The region is split at the longest common run that contains the least frequent
+    token of seq1, and both sides are diffed recursively. Regions where every common
+    token is too frequent are delegated to Myers.
+    """
+    stack = [(alo, ahi, blo, bhi)]
+    while stack:
+        alo, ahi, blo, bhi = _trim_region(seq1, seq2, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+
+        best = _histogram_split(seq1, seq2, alo, ahi, blo, bhi)
+        if best is None:
+            myers_matching_blocks(seq1, seq2, alo, ahi, blo, bhi, blocks)
+            continue
+
+        ai, bj, size = best
+        blocks.append(best)
+        stack.append((alo, ai, blo, bj))
+        stack.append((ai + size, ahi, bj + size, bhi))
+
+    blocks.sort()
+
+
+###########################
+# Helper Functions
+###########################
+
+
+def _myers_split(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+) -> Tuple[int, int]:
+    """
+    Return a point (x, y) of an optimal edit script of seq1[alo:ahi] and
+    seq2[blo:bhi], other than their start and end, which must differ.
+
+    The furthest reaching paths from the start and from the end are extended one
+    edit at a time on the diagonals k=x-y, until they overlap. After MYERS_MAX_D
+    edits, the furthest point of either direction is returned.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta % 2 == 1
+
+    # The furthest x reached on each diagonal k, at index k+offset, from the start
+    # (forward) and from the end (backward). The sentinels around the diagonals
+    # in range are never chosen.
+    offset = m + 1
+    forward = array("q", [-1]) * (n + m + 3)
+    backward = array("q", [n + 1]) * (n + m + 3)
+    forward[offset] = 0
+    backward[offset + delta] = n
+    fmin = fmax = 0
+    bmin = bmax = delta
+
+    for d in range(1, n + m + 1):
+        if fmin > -m:
+            fmin -= 1
+            forward[offset + fmin - 1] = -1
+        else:
+            fmin += 1
+        if fmax < n:
+            fmax += 1
+            forward[offset + fmax + 1] = -1
+        else:
+            fmax -= 1
+        for k in range(fmax, fmin - 1, -2):
+            if forward[offset + k - 1] >= forward[offset + k + 1]:
+                x = forward[offset + k - 1] + 1
+            else:
+                x = forward[offset + k + 1]
+            y = x - k
+            while x < n and y < m and seq1[alo + x] == seq2[blo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and bmin <= k <= bmax and backward[offset + k] <= x:
+                return alo + x, blo + y
+
+        if bmin > -m:
+            bmin -= 1
+            backward[offset + bmin - 1] = n + 1
+        else:
+            bmin += 1
+        if bmax < n:
+            bmax += 1
+            backward[offset + bmax + 1] = n + 1
+        else:
+            bmax -= 1
+        for k in range(bmax, bmin - 1, -2):
+            if backward[offset + k - 1] < backward[offset + k + 1]:
+                x = backward[offset + k - 1]
+            else:
+                x = backward[offset + k + 1] - 1
+            y = x - k
+            while x > 0 and y > 0 and seq1[alo + x - 1] == seq2[blo + y - 1]:
+                x -= 1
+                y -= 1
+            backward[offset + k] = x
+            if not odd and fmin <= k <= fmax and x <= forward[offset + k]:
+                return alo + x, blo + y
+
+        if d >= MYERS_MAX_D:
+            return _myers_furthest(
+                forward, backward, offset, fmin, fmax, bmin, bmax, alo, blo, n, m
+            )
+
+    raise RuntimeError("The forward and backward paths do not overlap")
+
+
+def _myers_furthest(
+    forward: array,
+    backward: array,
+    offset: int,
+    fmin: int,
+    fmax: int,
+    bmin: int,
+    bmax: int,
+    alo: int,
+    blo: int,
+    n: int,
+    m: int,
+) -> Tuple[int, int]:
+    """
+    Return the point reached by the forward or backward paths of _myers_split that
+    is the furthest from its origin.
+    """
+
+    def drift(x: int, y: int) -> int:
+        # Distance, up to a factor, of (x, y) to the diagonal of the region.
+        return abs((x - y) * (n + m) - (x + y) * (n - m))
+
+    # The paths may run past the region; their points are clamped in it. Among the
+    # furthest points, the closest to the diagonal of the region is preferred.
+    fbest = (-1, 0, 0, 0)
+    for k in range(fmax, fmin - 1, -2):
+        x = min(forward[offset + k], n, m + k)
+        fbest = max(fbest, (x + x - k, -drift(x, x - k), x, x - k))
+
+    bbest = (n + m + 1, 0, 0, 0)
+    for k in range(bmax, bmin - 1, -2):
+        x = max(backward[offset + k], 0, k)
+        bbest = min(bbest, (x + x - k, drift(x, x - k), x, x - k))
+
+    if n + m - bbest[0] < fbest[0]:
+        return alo + fbest[2], blo + fbest[3]
+    return alo + bbest[2], blo + bbest[3]
+
+
+def _trim_common_affixes(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+) -> Tuple[int, int, int, int]:
+    while alo < ahi and blo < bhi and seq1[alo] == seq2[blo]:
+        alo += 1
+        blo += 1
+    while alo < ahi and blo < bhi and seq1[ahi - 1] == seq2[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    return alo, ahi, blo, bhi
+
+
+def _trim_region(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+    blocks: List[MatchingBlock],
+) -> Tuple[int, int, int, int]:
+    talo, tahi, tblo, tbhi = _trim_common_affixes(seq1, seq2, alo, ahi, blo, bhi)
+    if talo > alo:
+        blocks.append((alo, blo, talo - alo))
+    if tahi < ahi:
+        blocks.append((tahi, tbhi, ahi - tahi))
+    return talo, tahi, tblo, tbhi
+
+
+def _patience_anchors(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+) -> List[Tuple[int, int]]:
+    count_a: Dict[Hashable, int] = {}
+    pos_a: Dict[Hashable, int] = {}
+    for i in range(alo, ahi):
+        token = seq1[i]
+        count_a[token] = count_a.get(token, 0) + 1
+        pos_a[token] = i
+
+    count_b: Dict[Hashable, int] = {}
+    pos_b: Dict[Hashable, int] = {}
+    for j in range(blo, bhi):
+        token = seq2[j]
+        if count_a.get(token) == 1:
+            count_b[token] = count_b.get(token, 0) + 1
+            pos_b[token] = j
+
+    candidates = [
+        (pos_a[token], j) for token, j in pos_b.items() if count_b[token] == 1
+    ]
+    candidates.sort()
+
+    # Longest increasing subsequence on the seq2 positions (patience sorting).
+    tails: List[int] = []
+    tails_index: List[int] = []
+    previous: List[int] = [-1] * len(candidates)
+    for index, (_, j) in enumerate(candidates):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            previous[index] = tails_index[lo - 1]
+        if lo == len(tails):
+            tails.append(j)
+            tails_index.append(index)
+        else:
+            tails[lo] = j
+            tails_index[lo] = index
+
+    anchors: List[Tuple[int, int]] = []
+    index = tails_index[-1] if tails_index else -1
+    while index != -1:
+        anchors.append(candidates[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _histogram_split(
+    seq1: Sequence[Hashable],
+    seq2: Sequence[Hashable],
+    alo: int,
+    ahi: int,
+    blo: int,
+    bhi: int,
+):
+    occurrences: Dict[Hashable, List[int]] = {}
+    for i in range(alo, ahi):
+        occurrences.setdefault(seq1[i], []).append(i)
+
+    best = None
+    best_count = HISTOGRAM_MAX_CHAIN + 1
+    best_size = 0
+    j = blo
+    while j < bhi:
+        positions = occurrences.get(seq2[j])
+        next_j = j + 1
+        if positions is not None and len(positions) <= best_count:
+            for i in positions:
+                si, sj = i, j
+                while si > alo and sj > blo and seq1[si - 1] == seq2[sj - 1]:
+                    si -= 1
+                    sj -= 1
+                ei, ej = i + 1, j + 1
+                while ei < ahi and ej < bhi and seq1[ei] == seq2[ej]:
+                    ei += 1
+                    ej += 1
+
+                count = min(len(occurrences[seq1[k]]) for k in range(si, ei))
+                size = ei - si
+                if count < best_count or (count == best_count and size > best_size):
+                    best = (si, sj, size)
+                    best_count = count
+                    best_size = size
+                next_j = max(next_j, ej)
+        j = next_j
+
+    return best
+
+
+def _units(starts: List[int], n: int) -> List[Unit]:
+    """
+    Split the range [0,n) in units beginning at the given indexes.
+    """
+    edges = [0] + [s for s in starts if 0 < s < n] + [n]
+    return [(a, b) for a, b in zip(edges, edges[1:]) if a < b]
+
+
+def _sentences(seq: Sequence[str], start: int, end: int) -> List[Unit]:
+    units = []
+    a = start
+    for i in range(start, end):
+        if SENTENCE_END_PATTERN.search(seq[i]):
+            units.append((a, i + 1))
+            a = i + 1
+    if a < end:
+        units.append((a, end))
+    return units
+
+
+def _align_units(
+    seq1: Sequence[str],
+    seq2: Sequence[str],
+    units1: List[Unit],
+    units2: List[Unit],
+    region: Tuple[int, int, int, int],
+    engine: DiffEngine,
+    split: bool,
+    opcodes: List[Opcode],
+):
+    """
+    Match the units covering the region of seq1 and seq2 and diff the others.
+
+    If split, the unmatched units are paragraphs and they are split in sentences,
+    otherwise their words are compared.
+    """
+    ids: Dict[Tuple[str, ...], int] = {}
+    keys1 = [ids.setdefault(tuple(seq1[a:b]), len(ids)) for a, b in units1]
+    keys2 = [ids.setdefault(tuple(seq2[a:b]), len(ids)) for a, b in units2]
+
+    blocks: List[MatchingBlock] = []
+    alo, ahi, blo, bhi = _trim_region(
+        keys1, keys2, 0, len(keys1), 0, len(keys2), blocks
+    )
+    if alo < ahi and blo < bhi:
+        for i, j, size in get_matching_blocks(keys1[alo:ahi], keys2[blo:bhi], engine):
+            blocks.append((alo + i, blo + j, size))
+    blocks.sort()
+
+    def edge(units: List[Unit], u: int, end: int) -> int:
+        return units[u][0] if u < len(units) else end
+
+    u = v = 0
+    for bu, bv, size in blocks + [(len(units1), len(units2), 0)]:
+        i1, i2 = edge(units1, u, region[1]), edge(units1, bu, region[1])
+        j1, j2 = edge(units2, v, region[3]), edge(units2, bv, region[3])
+        if i1 < i2 and j1 < j2 and split:
+            _align_units(
+                seq1,
+                seq2,
+                _sentences(seq1, i1, i2),
+                _sentences(seq2, j1, j2),
+                (i1, i2, j1, j2),
+                engine,
+                False,
+                opcodes,
+            )
+        elif i1 < i2 and j1 < j2:
+            for tag, a1, a2, b1, b2 in get_opcodes(seq1[i1:i2], seq2[j1:j2], engine):
+                opcodes.append((tag, i1 + a1, i1 + a2, j1 + b1, j1 + b2))
+        elif i1 < i2 or j1 < j2:
+            opcodes.append((_tag(i1, i2, j1, j2), i1, i2, j1, j2))
+
+        if size:
+            i2 = units1[bu + size - 1][1]
+            j2 = units2[bv + size - 1][1]
+            opcodes.append(("equal", units1[bu][0], i2, units2[bv][0], j2))
+        u, v = bu + size, bv + size
+
+
+def _tag(i1: int, i2: int, j1: int, j2: int) -> str:
+    if i1 < i2 and j1 < j2:
+        return "replace"
+    return "delete" if i1 < i2 else "insert"
+
+
+def _merge_opcodes(opcodes: List[Opcode]) -> List[Opcode]:
+    """
+    Merge adjacent equal opcodes, and adjacent opcodes that are not equal.
+    """
+    merged: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if merged and (merged[-1][0] == "equal") == (tag == "equal"):
+            _, i1, _, j1, _ = merged.pop()
+            if tag != "equal":
+                tag = _tag(i1, i2, j1, j2)
+        merged.append((tag, i1, i2, j1, j2))
+    return merged
+
+
+def _merge_blocks(blocks: List[MatchingBlock]) -> List[MatchingBlock]:
+    merged: List[MatchingBlock] = []
+    for ai, bj, size in sorted(blocks):
+        if size == 0:
+            continue
+        if merged:
+            pi, pj, psize = merged[-1]
+            if pi + psize == ai and pj + psize == bj:
+                merged[-1] = (pi, pj, psize + size)
+                continue
+        merged.append((ai, bj, size))
+    return merged
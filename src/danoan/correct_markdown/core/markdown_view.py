@@ -1,12 +1,27 @@
-from danoan.correct_markdown.core import api, model, utils
-from danoan.correct_markdown.core.string_view import StringView
-
+from danoan.correct_markdown.core import api, cache, model, utils
+from danoan.correct_markdown.core.source_map import SourceMap
+from danoan.correct_markdown.core.string_view import StringView, _FenwickTree
+from danoan.correct_markdown.core.token_index import TokenIndex
+
+import bisect
+from concurrent.futures import Executor
+import dataclasses
 from enum import Enum
 import io
 import logging
 import re
 import sys
-from typing import Any, Dict, List, Optional, TextIO, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -33,45 +48,50 @@ class SegmentType(Enum):
 
 SegmentsDict = Dict[SegmentType, List[str]]
 
+# Version of the segments in the cache. Increment it when the segments built for a
+# content change, such that the entries of older versions are not used.
+SEGMENTS_CACHE_VERSION = 1
+
 ###########################
 # Helper Functions
 ###########################
 
 
-def build_segments(
-    segments: Dict[Any, Any],
-    base_string: TextIO,
-    compare_string: TextIO,
-    replace,
-    insert,
-    equal,
-    delete,
-):
+def build_source_map_segments(content: str, source_map: SourceMap) -> SegmentsDict:
     """
-    Create StringView segments from a list of diffs between a compare string and a base string.
+    Create StringView segments for a string and the source map of a view of it.
 
-    Example:
-        base_string:    <span>Today is a wonderful day!</span>
-        compare_string: Today is a wonderful day!
+    The EditableContent contains the spans of the view and the NoEditableContent
+    the spans between them.
 
-        diffs:
-            - Insert(<span>)
-            - Equal(Today is a wonderful day!)
-            - Insert(</span>
+    Example:
+        content: <span>Today is a **wonderful** day!</span>
+        view: Today is a **wonderful** day!
 
-        The diff events are used to arbitrate how the string segments are created.
-        In the example above, one could separate html tags from text content.
+        EditableContent: ["", "Today is a **wonderful** day!"]
+        NoEditableContent: ["<span>", "</span>"]
     """
-    for di in api.text_diff(compare_string, base_string, model.TextDiffMode.Letter):
-        operation = DiffOperation(di.operation)
-        if operation == DiffOperation.Replace:
-            replace(segments, di)
-        elif operation == DiffOperation.Insert:
-            insert(segments, di)
-        elif operation == DiffOperation.Equal:
-            equal(segments, di)
-        elif operation == DiffOperation.Delete:
-            delete(segments, di)
+    segments: SegmentsDict = {}
+    segments[SegmentType.EditableContent] = []
+    segments[SegmentType.NoEditableContent] = []
+
+    pos = 0
+    text_start = 0
+    for start, _, length in source_map.runs():
+        if start > pos:
+            segments[SegmentType.EditableContent].append(content[text_start:pos])
+            segments[SegmentType.NoEditableContent].append(content[pos:start])
+            text_start = start
+        pos = start + length
+
+    if pos < len(content):
+        segments[SegmentType.EditableContent].append(content[text_start:pos])
+        segments[SegmentType.NoEditableContent].append(content[pos:])
+    elif pos > text_start or len(segments[SegmentType.EditableContent]) == 0:
+        segments[SegmentType.EditableContent].append(content[text_start:])
+        segments[SegmentType.NoEditableContent].append("")
+
+    return segments
 
 
 def build_pure_markdown_segments(original_markdown: TextIO):
@@ -86,46 +106,12 @@ def build_pure_markdown_segments(original_markdown: TextIO):
 
         EditableContent: Today is a **wonderful** day!
         NoEditableContent: <span></span>
+
+    Contiguous tags are grouped in the same NoEditableContent segment.
     """
-    pure_markdown = utils.remove_html_tags(original_markdown)
+    content = original_markdown.read()
     original_markdown.seek(0)
-
-    ss_pure_markdown = io.StringIO(pure_markdown)
-
-    def replace(segments: SegmentsDict, di: model.DiffItem):
-        tags = utils.extract_html_tags(di.new_value)
-        pos = 0
-        for t in tags:
-            t_start, t_end = t[1:]
-            segments[SegmentType.EditableContent].append(di.new_value[pos:t_start])
-            segments[SegmentType.NoEditableContent].append(di.new_value[t_start:t_end])
-            pos = t_end
-
-    def insert(segments: SegmentsDict, di: model.DiffItem):
-        segments[SegmentType.EditableContent].append("")
-        segments[SegmentType.NoEditableContent].append(di.new_value)
-
-    def equal(segments: SegmentsDict, di: model.DiffItem):
-        segments[SegmentType.EditableContent].append(di.original_value)
-        segments[SegmentType.NoEditableContent].append("")
-
-    def delete(segments: SegmentsDict, di: model.DiffItem):
-        logger.error("Non expected delete operation:", di.original_value, di.new_value)
-
-    segments: SegmentsDict = {}
-    segments[SegmentType.EditableContent] = []
-    segments[SegmentType.NoEditableContent] = []
-    build_segments(
-        segments,
-        original_markdown,
-        ss_pure_markdown,
-        replace,
-        insert,
-        equal,
-        delete,
-    )
-
-    return segments
+    return build_source_map_segments(content, utils.html_source_map(content))
 
 
 def build_plain_text_segments(original_markdown: TextIO):
@@ -141,39 +127,77 @@ def build_plain_text_segments(original_markdown: TextIO):
         EditableContent: Today is a wonderful day!
         NoEditableContent: <span>****</span>
     """
-    plain_text = utils.get_plain_text_from_markdown(original_markdown)
+    content = original_markdown.read()
     original_markdown.seek(0)
+    return build_source_map_segments(content, utils.plain_text_source_map(content))
 
-    ss_plain_text = io.StringIO(plain_text)
 
-    def replace(segments: SegmentsDict, di: model.DiffItem):
-        logger.error("Non expected replace operation:", di.original_value, di.new_value)
+def build_cached_segments(
+    original_markdown: TextIO, build: Callable[[TextIO], SegmentsDict], name: str
+) -> SegmentsDict:
+    """
+    Create StringView segments with build, unless they are in the default cache.
+    """
+    disk_cache = cache.get_default_cache()
+    if disk_cache is None:
+        return build(original_markdown)
 
-    def insert(segments: SegmentsDict, di: model.DiffItem):
-        segments[SegmentType.EditableContent].append("")
-        segments[SegmentType.NoEditableContent].append(di.new_value)
+    content = original_markdown.read()
+    original_markdown.seek(0)
+    key = disk_cache.make_key("segments", SEGMENTS_CACHE_VERSION, name, content)
+    cached = disk_cache.get(key)
+    if cached is not None:
+        return {SegmentType(k): v for k, v in cached.items()}
 
-    def equal(segments: SegmentsDict, di: model.DiffItem):
-        segments[SegmentType.EditableContent].append(di.original_value)
-        segments[SegmentType.NoEditableContent].append("")
+    segments = build(original_markdown)
+    disk_cache.set(key, {k.value: v for k, v in segments.items()})
+    return segments
 
-    def delete(segments: SegmentsDict, di: model.DiffItem):
-        logger.error("Non expected delete operation:", di.original_value, di.new_value)
 
-    segments: SegmentsDict = {}
-    segments[SegmentType.EditableContent] = []
-    segments[SegmentType.NoEditableContent] = []
-    build_segments(
-        segments,
-        original_markdown,
-        ss_plain_text,
-        replace,
-        insert,
-        equal,
-        delete,
-    )
+def _span_mindexes(SV: StringView, ti_start: int, ti_end: int) -> Tuple[int, int]:
+    """
+    Return the master indexes of the segments of the first and last chars of a span.
+    """
+    m_start = SV.get_mindex(ti_start, SegmentType.EditableContent)
+    m_end = SV.get_mindex(ti_end - 1, SegmentType.EditableContent)
+    return m_start, m_end
+
+
+def _splice(
+    SV: StringView,
+    ti_start: int,
+    ti_end: int,
+    new_value: str,
+    m_start: int,
+    m_end: int,
+):
+    """
+    Replace a span of the text view. If the span is spread over several text
+    segments, the new value is put in the first one and the others are removed.
+    """
+    SV.splice(SegmentType.EditableContent, ti_start, ti_end, new_value)
 
-    return segments
+    if m_start != m_end:
+        delete = []
+        for i in SV.iter_mindex(m_start + 1, m_end + 1):
+            if SV.get_view_name(i) == SegmentType.EditableContent:
+                delete.append(i)
+        SV.remove(*delete)
+
+
+def _source_map(string_views: List[StringView]) -> SourceMap:
+    """
+    Create the source map from the EditableContent to the content of string views.
+    """
+    spans = []
+    pos = 0
+    for SV in string_views:
+        for m in SV.iter_mindex():
+            length = SV.segment_length(m)
+            if SV.get_view_name(m) == SegmentType.EditableContent:
+                spans.append((pos, pos + length))
+            pos += length
+    return SourceMap.from_spans(spans, pos)
 
 
 class MarkdownView:
@@ -185,18 +209,38 @@ class MarkdownView:
 
     The only exception is when the plain-text string being replaced is spread over two or more
     non-contiguous text segments. In this case, the new value is put in the first segment.
+
+    If the source map of the text view is given, see utils.strip_html_tags and
+    utils.strip_markdown, the segments are built from it instead of scanning the
+    markdown again.
     """
 
-    def __init__(self, original_markdown: TextIO, keep_markdown_tags: bool = False):
-        if keep_markdown_tags:
-            segments_pure_markdown = build_pure_markdown_segments(original_markdown)
-            self.SV = StringView(segments_pure_markdown)
+    def __init__(
+        self,
+        original_markdown: TextIO,
+        keep_markdown_tags: bool = False,
+        source_map: Optional[SourceMap] = None,
+    ):
+        if source_map is not None:
+            content = original_markdown.read()
+            original_markdown.seek(0)
+            segments = build_source_map_segments(content, source_map)
+        elif keep_markdown_tags:
+            segments = build_cached_segments(
+                original_markdown, build_pure_markdown_segments, "no_html"
+            )
         else:
-            segments_plain_text = build_plain_text_segments(original_markdown)
+            segments = build_cached_segments(
+                original_markdown, build_plain_text_segments, "plain_text"
+            )
 
-            self.SV = StringView(segments_plain_text)
+        self.SV = StringView(segments)
 
-        self.text_view = self.SV[SegmentType.EditableContent]
+        self.token_index = TokenIndex(self.text_view)
+
+    @property
+    def text_view(self) -> str:
+        return self.SV[SegmentType.EditableContent]
 
     def find(
         self,
@@ -210,11 +254,31 @@ class MarkdownView:
 
         The start and end parameters limit the search to a substring.
         If ignore_trailing_spaces then "searched value" will match "searched    value".
+
+        Single words are searched in the rope of the text view and sequences of
+        words are searched in the token index, so the text view is not materialized.
+        The regular expression search is only used if the token index does not
+        find the value.
         """
         if start is None:
             start = 0
 
         words = search_value.split()
+        if search_value == "":
+            if start > len(self) or (end is not None and start > end):
+                return -1, -1
+            return start, start
+
+        if ignore_trailing_spaces and len(words) == 1:
+            s = self.__find_word__(words[0], start, end)
+            if s == -1:
+                return -1, -1
+            return s, s + len(words[0])
+        elif ignore_trailing_spaces and len(words) > 1:
+            s, e = self.token_index.find(words, start, end)
+            if s != -1:
+                return s, e
+
         if len(words) == 0:
             s = self.text_view.find(re.escape(search_value), start, end)
             if s == -1:
@@ -238,6 +302,9 @@ class MarkdownView:
         m_s, m_e = m.span()
         return start + m_s, start + m_e
 
+    def __find_word__(self, word: str, start: int, end: Optional[int]) -> int:
+        return self.SV.views[SegmentType.EditableContent].find(word, start, end)
+
     def replace(self, t_start: int, old_value: str, new_value: str):
         """
         Replace old value by new value in text view and update segments.
@@ -254,37 +321,153 @@ class MarkdownView:
         5. We need to update the index.
         """
         ti_start, ti_end = self.find(old_value, t_start)
+        self.__replace_span__(ti_start, ti_end, new_value)
+
+    def __replace_span__(self, ti_start: int, ti_end: int, new_value: str):
+        m_start, m_end = self.__span_mindexes__(ti_start, ti_end)
+        if m_start == m_end and len(new_value) == 0:
+            # In case of a delete, remove the whitespace
+            ti_start = max(0, ti_start - 1)
+
+        self.__splice__(ti_start, ti_end, new_value, m_start, m_end)
+        self.token_index.update(
+            ti_start,
+            ti_end,
+            len(new_value),
+            lambda s, e: self[s:e],
+        )
+
+    def __span_mindexes__(self, ti_start: int, ti_end: int) -> Tuple[Any, Any]:
+        return _span_mindexes(self.SV, ti_start, ti_end)
+
+    def __splice__(
+        self, ti_start: int, ti_end: int, new_value: str, m_start: Any, m_end: Any
+    ):
+        _splice(self.SV, ti_start, ti_end, new_value, m_start, m_end)
+
+    def apply_many(
+        self,
+        diff_items: List[model.DiffItem],
+        source_map: Optional[SourceMap] = None,
+    ) -> List[Tuple[int, int]]:
+        """
+        Apply the diff items in order and return the span of each new value.
+
+        The anchors of the items are resolved in a single forward scan of the
+        unmodified text view. Items carrying valid start and end offsets, see
+        api.text_diff(with_offsets=True), are placed at their offsets and the others
+        are searched as in api.apply_diff. The edits are then spliced with their
+        offsets shifted by the previous edits, and the token index is rebuilt once.
 
-        m_start = self.SV.get_mindex(ti_start, SegmentType.EditableContent)
-        m_end = self.SV.get_mindex(ti_end - 1, SegmentType.EditableContent)
+        If an anchor cannot be resolved in the unmodified text view, the remaining
+        items are applied one by one with api.apply_diff, which raises ValueError if
+        the anchor is not found.
 
-        if m_start == m_end:
-            suffix = self.SV[SegmentType.EditableContent][ti_end:]
-            if len(new_value) == 0:
+        If a source map is given, the offsets of the items are offsets of its view of
+        the full content, e.g. the plain text of utils.strip_markdown, and they are
+        translated to the text view through the full content.
+        """
+        diff_items = list(diff_items)
+        if source_map is not None:
+            diff_items = self.__translate_offsets__(diff_items, source_map)
+
+        anchors = list(self.__resolve_anchors__(diff_items))
+
+        spans: List[Tuple[int, int]] = []
+        shift = 0
+        for item, (s, ti_start, ti_end, back) in zip(diff_items, anchors):
+            ti_start += shift
+            ti_end += shift
+            m_start, m_end = self.__span_mindexes__(ti_start, ti_end)
+            a = ti_start
+            if m_start == m_end and len(item.new_value) == 0:
                 # In case of a delete, remove the whitespace
-                self.SV[SegmentType.EditableContent] = (
-                    ti_start - 1,
-                    new_value + suffix,
+                a = max(0, ti_start - 1)
+
+            self.__splice__(a, ti_end, item.new_value, m_start, m_end)
+            spans.append((s + shift, s + shift + len(item.new_value)))
+            shift += len(item.new_value) - (ti_end - a)
+            if ti_start - a != back:
+                # The anchors of the next items were resolved from a wrong position.
+                break
+
+        if spans:
+            self.token_index = TokenIndex(self.text_view)
+
+        start = spans[-1][1] if spans else 0
+        for item in diff_items[len(spans) :]:
+            s, e = api.apply_diff(self, item, start)
+            spans.append((s, e))
+            start = e
+
+        return spans
+
+    def __translate_offsets__(
+        self, diff_items: List[model.DiffItem], source_map: SourceMap
+    ) -> List[model.DiffItem]:
+        text_map = self.get_source_map()
+        translated = []
+        for item in diff_items:
+            if item.start is not None and item.end is not None:
+                start, end = source_map.source_span(item.start, item.end)
+                item = dataclasses.replace(
+                    item, start=text_map.to_view(start), end=text_map.to_view(end)
                 )
+            translated.append(item)
+        return translated
+
+    def __resolve_anchors__(
+        self, diff_items: List[model.DiffItem]
+    ) -> Iterator[Tuple[int, int, int, int]]:
+        """
+        Yield the position of the diff items in the unmodified text view.
+
+        For each item, yield the start of its anchor, the span of its original value
+        and the number of whitespaces removed before it. The offsets of the item are
+        used if they are valid, otherwise the anchor is searched. Stop at the first
+        item whose anchor is not resolved.
+        """
+        start = 0
+        shift = 0
+        for item in diff_items:
+            after = item.context.split("___")[1]
+            if self.__has_valid_offsets__(item, start):
+                s, ti_start, ti_end = item.start, item.start, item.end
             else:
-                self.SV[SegmentType.EditableContent] = (
-                    ti_start,
-                    new_value + suffix,
-                )
-        else:
-            after = self.SV[SegmentType.EditableContent][ti_end:]
-            self.SV[SegmentType.EditableContent] = (
-                ti_start,
-                new_value + after,
-            )
+                s, _ = self.find(f"{item.original_value} {after}", start)
+                if s == -1:
+                    return
+
+                ti_start, ti_end = self.find(item.original_value, s)
+                if ti_start != s:
+                    return
+
+            back = 0
+            m_start, m_end = self.__span_mindexes__(ti_start, ti_end)
+            if m_start == m_end and len(item.new_value) == 0 and s + shift > 0:
+                back = 1
+
+            yield s, ti_start, ti_end, back
+            shift += len(item.new_value) - (ti_end - ti_start + back)
+            # Position, in the unmodified text view, that follows the new value.
+            start = ti_end + back
+
+    def __has_valid_offsets__(self, item: model.DiffItem, start: int) -> bool:
+        """
+        Check that the offsets of the item point to its original value followed by
+        its after context in the unmodified text view.
+        """
+        if item.start is None or item.end is None:
+            return False
+        if not start <= item.start <= item.end <= len(self):
+            return False
 
-            delete = []
-            for i in range(m_start + 1, m_end + 1):
-                if self.SV.index[i].view_name == SegmentType.EditableContent:
-                    delete.append(i)
-            self.SV.remove(*delete)
+        original = item.original_value.split()
+        if self[item.start : item.end].split() != original:
+            return False
 
-        self.text_view = self.SV[SegmentType.EditableContent]
+        after = item.context.split("___")[1].split()
+        return self.token_index.match_at(item.start, original + after)
 
     def get_full_content(self) -> str:
         """
@@ -292,6 +475,24 @@ class MarkdownView:
         """
         return self.SV.get_content()
 
+    def get_source_map(self) -> SourceMap:
+        """
+        Return the source map from the text view to the full content.
+        """
+        return _source_map([self.SV])
+
+    def iter_content(self) -> Iterator[str]:
+        """
+        Yield the pieces of the full content without building the whole string.
+        """
+        return self.SV.iter_content()
+
+    def write_to(self, stream: TextIO):
+        """
+        Write the full content in a stream.
+        """
+        self.SV.write_to(stream)
+
     def get_no_html_view(self) -> str:
         """
         Return a string joining all pure markdown and plain-text segments.
@@ -305,7 +506,474 @@ class MarkdownView:
         return self.SV[SegmentType.NoEditableContent]
 
     def __len__(self):
-        return len(self.SV[SegmentType.EditableContent])
+        return self.SV.view_length(SegmentType.EditableContent)
 
     def __getitem__(self, key):
-        return self.SV[SegmentType.EditableContent][key]
+        return self.SV[SegmentType.EditableContent, key]
+
+
+###########################
+# Chunked view
+###########################
+
+# ChunkedMarkdownView splits documents in chunks of at least this number of chars.
+DEFAULT_CHUNK_SIZE = 1 << 14
+
+FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+HEADING_PATTERN = re.compile(r"^ {0,3}#{1,6}(\s|$)")
+
+
+def split_markdown_blocks(content: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Split a markdown document at block boundaries in chunks of about chunk_size chars.
+
+    A chunk ends after a blank line or before a heading, never inside a fenced code
+    block or an html tag. Joining the chunks gives back the document.
+
+    >>> split_markdown_blocks("# Title\\n\\nFirst.\\n```\\na\\n\\nb\\n```\\n# End\\n", 1)
+    ['# Title\\n\\n', 'First.\\n```\\na\\n\\nb\\n```\\n', '# End\\n']
+    """
+    tag_starts, tag_ends = utils.scan_html_tags(content)
+
+    def inside_tag(pos: int) -> bool:
+        i = bisect.bisect_left(tag_starts, pos) - 1
+        return i >= 0 and tag_ends[i] > pos
+
+    chunks = []
+    chunk_start = 0
+    pos = 0
+    fence: Optional[str] = None
+    for line in content.splitlines(keepends=True):
+        if (
+            fence is None
+            and pos - chunk_start >= chunk_size
+            and HEADING_PATTERN.match(line)
+            and not inside_tag(pos)
+        ):
+            chunks.append(content[chunk_start:pos])
+            chunk_start = pos
+        pos += len(line)
+
+        m = FENCE_PATTERN.match(line)
+        if m and fence is None:
+            fence = m.group(1)
+        elif (
+            m
+            and fence is not None
+            and m.group(1)[0] == fence[0]
+            and len(m.group(1)) >= len(fence)
+        ):
+            fence = None
+        elif (
+            fence is None
+            and line.strip() == ""
+            and pos - chunk_start >= chunk_size
+            and pos < len(content)
+            and not inside_tag(pos)
+        ):
+            chunks.append(content[chunk_start:pos])
+            chunk_start = pos
+
+    chunks.append(content[chunk_start:])
+    return chunks
+
+
+def __build_chunk_segments__(content: str) -> SegmentsDict:
+    return build_cached_segments(
+        io.StringIO(content), build_pure_markdown_segments, "no_html"
+    )
+
+
+class ChunkedMarkdownView(MarkdownView):
+    """
+    MarkdownView of a document split at block boundaries in independent chunks.
+
+    Each chunk has its own StringView and the offsets of the chunks in the text view
+    are kept in a Fenwick tree, such that an edit only touches the chunk it lands
+    in. The chunks spanned by an edit are merged first. The segments of the chunks
+    can be built in parallel by an executor.
+
+    The markdown tags are kept, as in MarkdownView(keep_markdown_tags=True), and
+    find, replace and apply_many give the same results as in MarkdownView.
+    """
+
+    def __init__(
+        self,
+        original_markdown: TextIO,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        executor: Optional[Executor] = None,
+    ):
+        contents = split_markdown_blocks(original_markdown.read(), chunk_size)
+        original_markdown.seek(0)
+
+        segments: Iterable[SegmentsDict]
+        if executor is None:
+            segments = map(__build_chunk_segments__, contents)
+        else:
+            segments = executor.map(__build_chunk_segments__, contents)
+        self.chunks = [StringView(s) for s in segments]
+        self.__index_chunks__()
+
+        self.token_index = TokenIndex(self.text_view)
+
+    def __index_chunks__(self):
+        self.offsets = _FenwickTree(
+            [sv.view_length(SegmentType.EditableContent) for sv in self.chunks]
+        )
+
+    def __chunk_of__(self, ti: int) -> Tuple[int, int]:
+        """
+        Return the chunk containing the text view position and the offset of the chunk.
+        """
+        k = min(self.offsets.search(ti), len(self.chunks) - 1)
+        return k, self.offsets.prefix_sum(k)
+
+    def __merge__(self, k_start: int, k_end: int):
+        """
+        Replace the chunks in [k_start,k_end] by a single chunk.
+
+        The last text segment of a chunk and the first of the next one are joined,
+        unless an html tag separates them.
+        """
+        pieces: List[Tuple[SegmentType, str]] = []
+        for sv in self.chunks[k_start : k_end + 1]:
+            chunk_pieces = list(sv.iter_segments())
+            if pieces and pieces[-1] == (SegmentType.NoEditableContent, ""):
+                pieces.pop()
+            if pieces and chunk_pieces and pieces[-1][0] == chunk_pieces[0][0]:
+                view_name, content = chunk_pieces.pop(0)
+                pieces[-1] = (view_name, pieces[-1][1] + content)
+            pieces.extend(chunk_pieces)
+
+        segments: SegmentsDict = {
+            SegmentType.EditableContent: [],
+            SegmentType.NoEditableContent: [],
+        }
+        editable = segments[SegmentType.EditableContent]
+        no_editable = segments[SegmentType.NoEditableContent]
+        for view_name, content in pieces:
+            if view_name == SegmentType.NoEditableContent and len(editable) == len(
+                no_editable
+            ):
+                editable.append("")
+            segments[view_name].append(content)
+        if len(editable) > len(no_editable) or len(editable) == 0:
+            no_editable.append("")
+        if len(editable) < len(no_editable):
+            editable.append("")
+
+        self.chunks[k_start : k_end + 1] = [StringView(segments)]
+        self.__index_chunks__()
+
+    @property
+    def text_view(self) -> str:
+        return "".join(sv[SegmentType.EditableContent] for sv in self.chunks)
+
+    def __find_word__(self, word: str, start: int, end: Optional[int]) -> int:
+        if end is None:
+            end = len(self)
+
+        k, offset = self.__chunk_of__(start)
+        while k < len(self.chunks) and offset < end:
+            sv = self.chunks[k]
+            s = sv.views[SegmentType.EditableContent].find(
+                word, max(0, start - offset), end - offset
+            )
+            if s != -1:
+                return offset + s
+
+            next_offset = offset + sv.view_length(SegmentType.EditableContent)
+            if len(word) > 1 and next_offset < end:
+                # A match crossing the end of the chunk.
+                lo = max(start, next_offset - len(word) + 1)
+                s = self[lo : min(end, next_offset + len(word) - 1)].find(word)
+                if s != -1:
+                    return lo + s
+            k, offset = k + 1, next_offset
+
+        return -1
+
+    def __span_mindexes__(self, ti_start: int, ti_end: int) -> Tuple[Any, Any]:
+        k, offset = self.__chunk_of__(ti_start)
+        if ti_end > ti_start:
+            k_end, _ = self.__chunk_of__(ti_end - 1)
+            if k_end != k:
+                self.__merge__(k, k_end)
+
+        m_start, m_end = _span_mindexes(
+            self.chunks[k], ti_start - offset, ti_end - offset
+        )
+        while (
+            m_start != m_end
+            and k + 1 < len(self.chunks)
+            and self.__continued__(k, m_end)
+        ):
+            # The segments of the span are removed and the content of the last one
+            # is moved to the first, see MarkdownView.replace. The last segment must
+            # be whole.
+            self.__merge__(k, k + 1)
+            m_start, m_end = _span_mindexes(
+                self.chunks[k], ti_start - offset, ti_end - offset
+            )
+        return (k, m_start), (k, m_end)
+
+    def __continued__(self, k: int, m_index: int) -> bool:
+        """
+        Check if the segment continues in the next chunk, i.e. it is not followed by
+        any content in its chunk.
+        """
+        sv = self.chunks[k]
+        return all(sv.segment_length(m) == 0 for m in sv.iter_mindex(m_index + 1))
+
+    def __splice__(
+        self, ti_start: int, ti_end: int, new_value: str, m_start: Any, m_end: Any
+    ):
+        k, m_s = m_start
+        _, m_e = m_end
+
+        k_start, offset = self.__chunk_of__(ti_start)
+        if k_start < k:
+            # The whitespace removed before a delete is in a previous chunk. The
+            # deleted span is in a single text segment, see MarkdownView.replace.
+            self.__merge__(k_start, k)
+            k = k_start
+            m_s = m_e = self.chunks[k].get_mindex(
+                ti_end - 1 - offset, SegmentType.EditableContent
+            )
+        else:
+            offset = self.offsets.prefix_sum(k)
+
+        _splice(self.chunks[k], ti_start - offset, ti_end - offset, new_value, m_s, m_e)
+        self.offsets.add(k, len(new_value) - (ti_end - ti_start))
+
+    def get_full_content(self) -> str:
+        return "".join(self.iter_content())
+
+    def get_source_map(self) -> SourceMap:
+        return _source_map(self.chunks)
+
+    def iter_content(self) -> Iterator[str]:
+        for sv in self.chunks:
+            yield from sv.iter_content()
+
+    def write_to(self, stream: TextIO):
+        for sv in self.chunks:
+            sv.write_to(stream)
+
+    def get_no_html_view(self) -> str:
+        return self.text_view
+
+    def get_html_view(self) -> str:
+        return "".join(sv[SegmentType.NoEditableContent] for sv in self.chunks)
+
+    def __len__(self):
+        return self.offsets.prefix_sum(len(self.chunks))
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            if key < 0:
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError("ChunkedMarkdownView index out of range")
+            return self[key : key + 1]
+
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            return self.text_view[key]
+
+        pieces = []
+        k, offset = self.__chunk_of__(start)
+        while start < stop:
+            sv = self.chunks[k]
+            chunk_end = offset + sv.view_length(SegmentType.EditableContent)
+            e = min(stop, chunk_end)
+            pieces.append(sv[SegmentType.EditableContent, start - offset : e - offset])
+            start = e
+            k, offset = k + 1, chunk_end
+        return "".join(pieces)
+
+
+###########################
+# Incremental view
+###########################
+
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _match_words(text: str, start: int, words: List[str]) -> bool:
+    """
+    Check that the words, separated by whitespaces, are in the text at start.
+    """
+    if start > 0 and not text[start - 1].isspace():
+        return False
+    pos = start
+    for k, word in enumerate(words):
+        if k > 0:
+            m = WHITESPACE_PATTERN.match(text, pos)
+            if m is None:
+                return False
+            pos = m.end()
+        if not text.startswith(word, pos):
+            return False
+        pos += len(word)
+    return pos == len(text) or text[pos].isspace()
+
+
+class IncrementalDiffView:
+    """
+    Render diff items in a markdown document block by block, reusing the blocks
+    rendered by the previous update.
+
+    The document is split at every block boundary, see split_markdown_blocks, and
+    the blocks touched by the same diff item are rendered together in a
+    MarkdownView. A group of blocks is rendered again only if its content or its
+    diff items changed since the previous update; the blocks without diff items
+    are copied. The content is the same as the one of api.diff_view.
+
+    >>> from danoan.correct_markdown.core.model import DiffItem
+    >>> view = IncrementalDiffView()
+    >>> item = DiffItem("Hello ___ ", "wrld", "world", "replace", 12, 16)
+    >>> view.update(io.StringIO("# Hi\\n\\nHello wrld\\n"), [item]).get_full_content()
+    '# Hi\\n\\nHello world\\n'
+    >>> view.rendered
+    1
+    """
+
+    def __init__(self, insert=None, delete=None, replace=None, block_size: int = 1):
+        self.edits = (insert, delete, replace)
+        self.block_size = block_size
+        self.pieces: List[str] = []
+        self.rendered = 0
+        self.rendered_groups: Dict[Tuple[str, Tuple[Tuple[Any, ...], ...]], str] = {}
+
+    def update(
+        self, original_markdown: TextIO, diff_items: List[model.DiffItem]
+    ) -> "IncrementalDiffView":
+        """
+        Render the diff items, with offsets, in the markdown document.
+
+        If the offsets of an item are missing or do not point to its original value
+        and after context, the whole document is rendered in a single MarkdownView.
+        """
+        content = original_markdown.read()
+        original_markdown.seek(0)
+
+        blocks = split_markdown_blocks(content, self.block_size)
+        text, source_map = utils.strip_html_tags(content)
+
+        starts = [0]
+        block_end = 0
+        for b in blocks:
+            block_end += len(b)
+            starts.append(source_map.to_view(block_end))
+
+        diff_items = api.render_items(diff_items, *self.edits)
+        groups = self.__group__(diff_items, starts)
+        if groups is None or not self.__has_valid_offsets__(text, diff_items):
+            self.rendered = 1
+            self.rendered_groups = {}
+            mv = MarkdownView(original_markdown, True, source_map)
+            mv.apply_many(diff_items)
+            self.pieces = [mv.get_full_content()]
+            return self
+
+        rendered_groups = {}
+        self.rendered = 0
+        self.pieces = []
+        k = 0
+        for k_start, k_end, items in groups:
+            self.pieces.extend(blocks[k:k_start])
+            offset = starts[k_start]
+            group_content = "".join(blocks[k_start : k_end + 1])
+            key = (
+                group_content,
+                tuple(
+                    (i.start - offset, i.end - offset, i.original_value, i.new_value)
+                    for i in items
+                ),
+            )
+            rendered = self.rendered_groups.get(key)
+            if rendered is None:
+                rendered = self.__render_group__(group_content, key[1])
+                self.rendered += 1
+            rendered_groups[key] = rendered
+            self.pieces.append(rendered)
+            k = k_end + 1
+        self.pieces.extend(blocks[k:])
+
+        self.rendered_groups = rendered_groups
+        return self
+
+    def __group__(
+        self, diff_items: List[model.DiffItem], starts: List[int]
+    ) -> Optional[List[Tuple[int, int, List[model.DiffItem]]]]:
+        """
+        Group the diff items with the blocks they touch.
+
+        An item touches the char before its start, removed with the item if it is a
+        delete, and the chars up to its end; an insert also touches the char at its
+        start. Return None if an item has no offsets or the items overlap.
+        """
+        groups: List[Tuple[int, int, List[model.DiffItem]]] = []
+        last_block = len(starts) - 2
+        end = 0
+        for item in diff_items:
+            if item.start is None or item.end is None or item.start < end:
+                return None
+            end = item.end + (1 if item.new_value == "" else 0)
+
+            first = max(0, item.start - 1)
+            last = max(item.end - 1, item.start)
+            k_start = min(bisect.bisect_right(starts, first) - 1, last_block)
+            k_end = min(bisect.bisect_right(starts, last) - 1, last_block)
+            if groups and groups[-1][1] >= k_start:
+                k_start, _, items = groups.pop()
+                items.append(item)
+            else:
+                items = [item]
+            groups.append((k_start, k_end, items))
+        return groups
+
+    def __has_valid_offsets__(
+        self, text: str, diff_items: List[model.DiffItem]
+    ) -> bool:
+        """
+        Check that the offsets of the items point to their original value followed
+        by their after context, see MarkdownView.__has_valid_offsets__.
+        """
+        for item in diff_items:
+            if item.end > len(text):
+                return False
+            original = item.original_value.split()
+            if text[item.start : item.end].split() != original:
+                return False
+
+            words = original + item.context.split("___")[1].split()
+            if words and not _match_words(text, item.start, words):
+                return False
+        return True
+
+    def __render_group__(
+        self, group_content: str, items: Tuple[Tuple[Any, ...], ...]
+    ) -> str:
+        mv = MarkdownView(io.StringIO(group_content), True)
+        mv.apply_many(
+            [
+                # The offsets are valid: the after context, that may be in the next
+                # block, is not needed.
+                model.DiffItem(" ___ ", original_value, new_value, "", start, end)
+                for start, end, original_value, new_value in items
+            ]
+        )
+        return mv.get_full_content()
+
+    def get_full_content(self) -> str:
+        return "".join(self.pieces)
+
+    def iter_content(self) -> Iterator[str]:
+        return iter(self.pieces)
+
+    def write_to(self, stream: TextIO):
+        for piece in self.pieces:
+            stream.write(piece)
@@ -1,6 +1,7 @@
+from array import array
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 
 @dataclass
@@ -9,6 +10,146 @@ class DiffItem:
     original_value: str
     new_value: str
     operation: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+def sequence_offsets(
+    spans: Sequence[Optional[Tuple[int, int]]], i1: int, i2: int, text_length: int
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Return the character offsets covered by the elements [i1,i2) of a sequence.
+
+    The spans give the character offsets of each element. If i1==i2, the offsets of
+    the position before the element i1 are returned.
+    """
+    if i1 == i2:
+        span = spans[i1] if i1 < len(spans) else (text_length, text_length)
+        if span is None:
+            return None, None
+        return span[0], span[0]
+
+    first, last = spans[i1], spans[i2 - 1]
+    if first is None or last is None:
+        return None, None
+    return first[0], last[1]
+
+
+class DiffBatch:
+    """
+    Columnar list of differences between two token sequences.
+
+    The operation and the index ranges of each difference are stored in arrays. The
+    context, original_value and new_value strings are only built when a difference is
+    accessed. Iterating over the batch yields DiffItem.
+
+    If rebased, the context before a difference is taken from the compared sequence,
+    as if the previous differences were already applied to the baseline sequence.
+
+    >>> batch = DiffBatch("a b c".split(), "a x c".split(), " ", context_size=1)
+    >>> batch.append("replace", 1, 2, 1, 2)
+    >>> batch.context(0), batch.original_value(0), batch.new_value(0)
+    ('a ___ c', 'b', 'x')
+    >>> list(batch)
+    [DiffItem(context='a ___ c', original_value='b', new_value='x', operation='replace', start=None, end=None)]
+    """
+
+    OPERATIONS = ("equal", "replace", "insert", "delete")
+
+    def __init__(
+        self,
+        seq1: List[str],
+        seq2: List[str],
+        joiner: str,
+        context_size: int = 10,
+        rebased: bool = False,
+        spans1: Optional[List[Optional[Tuple[int, int]]]] = None,
+        text_length: int = 0,
+    ):
+        self.seq1 = seq1
+        self.seq2 = seq2
+        self.joiner = joiner
+        self.context_size = context_size
+        self.rebased = rebased
+        self.spans1 = spans1
+        self.text_length = text_length
+
+        self.operations = array("b")
+        self.i1 = array("q")
+        self.i2 = array("q")
+        self.j1 = array("q")
+        self.j2 = array("q")
+        self.before = array("q")
+
+    def append(
+        self,
+        operation: str,
+        i1: int,
+        i2: int,
+        j1: int,
+        j2: int,
+        before: Optional[int] = None,
+    ):
+        """
+        Add a difference. The context before it starts at the token before.
+        """
+        if before is None:
+            before = max(0, (j1 if self.rebased else i1) - self.context_size)
+
+        self.operations.append(self.OPERATIONS.index(operation))
+        self.i1.append(i1)
+        self.i2.append(i2)
+        self.j1.append(j1)
+        self.j2.append(j2)
+        self.before.append(before)
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __getitem__(self, k: int) -> DiffItem:
+        if k < 0:
+            k += len(self)
+        if k < 0 or k >= len(self):
+            raise IndexError("DiffBatch index out of range")
+
+        start, end = self.offsets(k)
+        return DiffItem(
+            self.context(k),
+            self.original_value(k),
+            self.new_value(k),
+            self.operation(k),
+            start,
+            end,
+        )
+
+    def __iter__(self) -> Iterator[DiffItem]:
+        for k in range(len(self)):
+            yield self[k]
+
+    def operation(self, k: int) -> str:
+        return self.OPERATIONS[self.operations[k]]
+
+    def original_value(self, k: int) -> str:
+        return self.joiner.join(self.seq1[self.i1[k] : self.i2[k]])
+
+    def new_value(self, k: int) -> str:
+        return self.joiner.join(self.seq2[self.j1[k] : self.j2[k]])
+
+    def context(self, k: int) -> str:
+        if self.rebased:
+            before = self.seq2[self.before[k] : self.j1[k]]
+        else:
+            before = self.seq1[self.before[k] : self.i1[k]]
+        after = self.seq1[self.i2[k] : self.i2[k] + self.context_size]
+        return f"{self.joiner.join(before)} ___ {self.joiner.join(after)}"
+
+    def offsets(self, k: int) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Character offsets of the original value in the baseline text, if recorded.
+        """
+        if self.spans1 is None:
+            return None, None
+        return sequence_offsets(self.spans1, self.i1[k], self.i2[k], self.text_length)
 
 
 @dataclass
@@ -25,3 +166,11 @@ class Metadata:
 class TextDiffMode(Enum):
     Letter = "letter"
     Word = "word"
+    Hierarchical = "hierarchical"
+
+
+class DiffEngine(Enum):
+    Difflib = "difflib"
+    Myers = "myers"
+    Patience = "patience"
+    Histogram = "histogram"
@@ -0,0 +1,217 @@
+import random
+from typing import Iterator, List, Optional, Tuple
+
+# Strings are stored in pieces of at most this number of characters.
+CHUNK_SIZE = 512
+
+# Rope.find searches windows of at least this number of characters.
+FIND_WINDOW_SIZE = 1 << 16
+
+
+class _Node:
+    __slots__ = ("piece", "priority", "left", "right", "size")
+
+    def __init__(self, piece: str, priority: float):
+        self.piece = piece
+        self.priority = priority
+        self.left: Optional[_Node] = None
+        self.right: Optional[_Node] = None
+        self.size = len(piece)
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node else 0
+
+
+def _update(node: _Node):
+    node.size = len(node.piece) + _size(node.left) + _size(node.right)
+
+
+def _split(node: Optional[_Node], k: int) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """
+    Split the tree in two trees holding the first k characters and the remaining ones.
+    """
+    if node is None:
+        return None, None
+
+    left_size = _size(node.left)
+    if k <= left_size:
+        left, right = _split(node.left, k)
+        node.left = right
+        _update(node)
+        return left, node
+
+    k -= left_size
+    if k < len(node.piece):
+        right_node = _Node(node.piece[k:], node.priority)
+        right_node.right = node.right
+        _update(right_node)
+
+        node.piece = node.piece[:k]
+        node.right = None
+        _update(node)
+        return node, right_node
+
+    left, right = _split(node.right, k - len(node.piece))
+    node.right = left
+    _update(node)
+    return node, right
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    if left is None:
+        return right
+    if right is None:
+        return left
+
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    else:
+        right.left = _merge(left, right.left)
+        _update(right)
+        return right
+
+
+def _build(text: str) -> Optional[_Node]:
+    """
+    Build a treap from a string in linear time (Cartesian tree construction).
+    """
+    stack: List[_Node] = []
+    for i in range(0, len(text), CHUNK_SIZE):
+        node = _Node(text[i : i + CHUNK_SIZE], random.random())
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+            _update(last)
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+
+    while len(stack) > 1:
+        _update(stack.pop())
+    if stack:
+        _update(stack[0])
+        return stack[0]
+    return None
+
+
+class Rope:
+    """
+    Mutable string with logarithmic splice.
+
+    The string is stored as a sequence of pieces in a randomized balanced tree
+    (treap). Splicing and slicing cost O(log n) plus the size of the inserted or
+    returned content.
+
+    >>> r = Rope("Today it rained.")
+    >>> r.splice(9, 15, "was sunny")
+    >>> str(r)
+    'Today it was sunny.'
+    >>> r[9:12]
+    'was'
+    """
+
+    def __init__(self, text: str = ""):
+        self.root = _build(text)
+
+    def __len__(self) -> int:
+        return _size(self.root)
+
+    def __str__(self) -> str:
+        return "".join(self.iter_chunks())
+
+    def __getitem__(self, key) -> str:
+        if isinstance(key, slice):
+            start, end, step = key.indices(len(self))
+            if step != 1:
+                return str(self)[key]
+            return "".join(self.iter_chunks(start, end))
+
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("Rope index out of range")
+        return "".join(self.iter_chunks(key, key + 1))
+
+    def splice(self, start: int, end: int, text: str):
+        """
+        Replace the characters in [start,end) by text.
+        """
+        start = max(0, min(start, len(self)))
+        end = max(start, min(end, len(self)))
+
+        left, rest = _split(self.root, start)
+        _, right = _split(rest, end - start)
+        self.root = _merge(_merge(left, _build(text)), right)
+
+    def find(self, sub: str, start: int = 0, end: Optional[int] = None) -> int:
+        """
+        Return the lowest index of sub in [start,end) or -1 if it is not found.
+        """
+        if end is None:
+            end = len(self)
+        if sub == "":
+            return start if start <= end else -1
+
+        # Pieces are buffered to search large windows at once. The tail of the
+        # previous window is kept in case sub crosses a window boundary.
+        keep = len(sub) - 1
+        window: List[str] = []
+        window_size = 0
+        window_start = start
+        for piece in self.iter_chunks(start, end):
+            window.append(piece)
+            window_size += len(piece)
+            if window_size < FIND_WINDOW_SIZE:
+                continue
+
+            text = "".join(window)
+            pos = text.find(sub)
+            if pos != -1:
+                return window_start + pos
+            tail = text[max(0, len(text) - keep) :]
+            window_start += len(text) - len(tail)
+            window, window_size = [tail], len(tail)
+
+        pos = "".join(window).find(sub)
+        return -1 if pos == -1 else window_start + pos
+
+    def iter_chunks(self, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the pieces of the string covering [start,end).
+        """
+        if end is None:
+            end = len(self)
+        if start >= end:
+            return
+
+        # Iterative in-order traversal. The stack holds (node, offset) pairs where
+        # offset is the position of the first character of the node subtree.
+        stack: List[Tuple[_Node, int]] = []
+        node, offset = self.root, 0
+        while node is not None:
+            left_end = offset + _size(node.left)
+            if start < left_end:
+                stack.append((node, offset))
+                node = node.left
+            elif start < left_end + len(node.piece):
+                stack.append((node, offset))
+                break
+            else:
+                offset = left_end + len(node.piece)
+                node = node.right
+
+        while stack:
+            node, offset = stack.pop()
+            piece_start = offset + _size(node.left)
+            if piece_start >= end:
+                return
+            yield node.piece[max(0, start - piece_start) : end - piece_start]
+
+            child, child_offset = node.right, piece_start + len(node.piece)
+            while child is not None:
+                stack.append((child, child_offset))
+                child = child.left
@@ -0,0 +1,112 @@
+from array import array
+import bisect
+from typing import Iterable, Iterator, Tuple
+
+
+class SourceMap:
+    """
+    Map the offsets of a view of a source string to the source and back.
+
+    The view is made of spans of the source, in order, e.g. the text of a markdown
+    document without its html tags. The map is stored as run-length arrays: the run
+    i copies lengths[i] chars of the source from source_starts[i] to the view at
+    view_starts[i]. An offset is translated with a bisect over the runs.
+
+    An offset of the source in a span that is not in the view is mapped to the view
+    offset of the next char of the view. An offset of the view at the border of two
+    runs is mapped to the start of the second run, see source_span to map ends.
+
+    >>> sm = SourceMap.from_spans([(3, 8), (12, 20)], 20)
+    >>> sm.to_view(5), sm.to_view(9), sm.to_source(5), sm.source_span(2, 5)
+    (2, 5, 12, (5, 8))
+    """
+
+    def __init__(
+        self,
+        source_starts: array,
+        view_starts: array,
+        lengths: array,
+        source_length: int,
+    ):
+        self.source_starts = source_starts
+        self.view_starts = view_starts
+        self.lengths = lengths
+        self.source_length = source_length
+
+    @classmethod
+    def from_spans(
+        cls, spans: Iterable[Tuple[int, int]], source_length: int
+    ) -> "SourceMap":
+        """
+        Create the map of the view joining the given spans of the source, in order.
+
+        Empty spans are skipped and contiguous spans are merged in a single run.
+        """
+        source_starts = array("q")
+        view_starts = array("q")
+        lengths = array("q")
+        source_end = -1
+        view_end = 0
+        for start, end in spans:
+            if start >= end:
+                continue
+            if start == source_end:
+                lengths[-1] += end - start
+            else:
+                source_starts.append(start)
+                view_starts.append(view_end)
+                lengths.append(end - start)
+            source_end = end
+            view_end += end - start
+        return cls(source_starts, view_starts, lengths, source_length)
+
+    def __len__(self) -> int:
+        if not self.lengths:
+            return 0
+        return self.view_starts[-1] + self.lengths[-1]
+
+    def runs(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yield the source start, the view start and the length of each run.
+        """
+        return zip(self.source_starts, self.view_starts, self.lengths)
+
+    def to_source(self, offset: int) -> int:
+        """
+        Return the source offset of a view offset.
+        """
+        i = bisect.bisect_right(self.view_starts, offset) - 1
+        if i < 0:
+            return self.source_starts[0] if self.lengths else 0
+        if i == len(self.lengths) - 1 and offset >= len(self):
+            return self.source_starts[i] + self.lengths[i]
+        return self.source_starts[i] + offset - self.view_starts[i]
+
+    def to_view(self, offset: int) -> int:
+        """
+        Return the view offset of a source offset.
+        """
+        i = bisect.bisect_right(self.source_starts, offset) - 1
+        if i < 0:
+            return 0
+        return self.view_starts[i] + min(
+            offset - self.source_starts[i], self.lengths[i]
+        )
+
+    def source_span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Return the source span of the view span [start,end).
+
+        The end is mapped to the end of the last char of the span, such that the
+        source span does not cover the chars not in the view after the span.
+        """
+        if end <= start:
+            s = self.to_source(start)
+            return s, s
+        return self.to_source(start), self.to_source(end - 1) + 1
+
+    def view_span(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Return the view span of the source span [start,end).
+        """
+        return self.to_view(start), self.to_view(end)
@@ -1,8 +1,8 @@
-from dataclasses import dataclass
+from danoan.correct_markdown.core.rope import Rope
+
 import logging
 import sys
-from functools import reduce
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
 
 logger = logging.getLogger(__file__)
 handler = logging.StreamHandler(sys.stderr)
@@ -20,25 +20,19 @@ class StringView:
     document might have the markuo view containing the tag elements and the text view
     containing the plain-text content of the document.
 
-    StringView manages a list of ViewSegmentItem (index). Each ViewSegmentItem
-    describes a segment of one of the managed views.
-
-    Below, an example of the index:
-        [
-            ViewSegmentItem(view_name='text', master_index=0, segment_index=0)
-            ViewSegmentItem(view_name='markup', master_index=1, segment_index=0)
-            ViewSegmentItem(view_name='text', master_index=2, segment_index=0)
-            ViewSegmentItem(view_name='markup', master_index=3, segment_index=3)
-            ViewSegmentItem(view_name='text', master_index=4, segment_index=29)
-            ViewSegmentItem(view_name='markup', master_index=5, segment_index=3)
-            ViewSegmentItem(view_name='text', master_index=6, segment_index=29)
-        ]
-
-    The index allows us to update both markup and text views independently. It is
-    guaranteed that when "get_content" is called, both updated views will be correctly
-    aligned.
+    Segments are kept in a fixed master order: the i-th segment of each view, in the
+    order of the views, then the (i+1)-th and so on. Removed segments are marked as
+    dead in an _AliveIndex and give their content to the previous segment of the same
+    view, so master indexes are stable and the next alive segment is found in O(log n).
 
+    Each view is stored in a Rope and the lengths of its segments in a Fenwick tree.
+    Splicing a view, finding the segment of a view position and shifting the offsets
+    after an edition cost O(log n). The string of a view is only materialized when it
+    is requested and it is cached until the next edition of that view.
 
+    The index property computes, on demand, the list of ViewSegmentItem of the alive
+    segments in master order, each one with the offset of the segment in its view.
+    Views can be edited independently and "get_content" interleaves them back.
 
     >>> segments = {
     ...  "text": ["","October journal","\n\n","October first","\n\n", "Today it rained."],
@@ -55,6 +49,9 @@ class StringView:
     >>> SV.get_content()
     '<h1>October journal</h1>\n\n<h2>October first</h2>\n\nToday it rained.'
 
+    >>> SV.index[3]
+    ViewSegmentItem(view_name='markup', master_index=3, segment_index=4)
+
 
     >>> s = SV["text"].find("October first")
     >>> SV["text"] = s, "Monday, October first\n\nToday was sunny!"
@@ -64,17 +61,38 @@ class StringView:
 
     >>> SV.get_content()
     '<h1>October journal</h1>\n\n<h2>Monday, October first</h2>\n\nToday was sunny!'
+
+    >>> SV.splice("text", 0, 7, "November")
+    >>> SV["text", 0:16]
+    'November journal'
     """
 
-    @dataclass
     class ViewSegmentItem:
-        view_name: Any
-        master_index: int
-        segment_index: int
+        __slots__ = ("view_name", "master_index", "segment_index")
+
+        def __init__(self, view_name: Any, master_index: int, segment_index: int):
+            self.view_name = view_name
+            self.master_index = master_index
+            self.segment_index = segment_index
+
+        def __repr__(self):
+            return (
+                f"ViewSegmentItem(view_name={self.view_name!r}, "
+                f"master_index={self.master_index}, "
+                f"segment_index={self.segment_index})"
+            )
+
+        def __eq__(self, other):
+            return (
+                isinstance(other, StringView.ViewSegmentItem)
+                and self.view_name == other.view_name
+                and self.master_index == other.master_index
+                and self.segment_index == other.segment_index
+            )
 
     def __init__(self, segments: Dict[str, List[str]]):
-        self.index: List[StringView.ViewSegmentItem] = []
-        self.views = {}
+        self.views: Dict[Any, Rope] = {}
+        self.materialized: Dict[Any, str] = {}
 
         previous = None
         for s in segments.values():
@@ -82,119 +100,273 @@ class StringView:
                 assert len(s) == previous
             previous = len(s)
 
-        number_views = len(segments.keys())
-        total_segments = reduce(lambda x, y: x + y, [len(v) for v in segments.values()])
-
-        # TODO: Build the temp_index in sequence instead of by segment type
-        temp_index: List[Optional[StringView.ViewSegmentItem]] = [None] * total_segments
-        for start_master_index, item in enumerate(segments.items()):
-            name, list_segments = item
-            last_seg_index = 0
-
-            for i, content in enumerate(list_segments):
-                m_index = start_master_index + i * number_views
-
-                temp_index[m_index] = self.ViewSegmentItem(
-                    name, m_index, last_seg_index
-                )
-                last_seg_index += len(content)
-
-        # Populate index
-        # TODO: Populate self.index directly instead of traversing temp_index.
-        # This is done to have a sound typecheck.
-        for el in temp_index:
-            if el is not None:
-                self.index.append(el)
-            else:
-                raise RuntimeError(
-                    "Found a None value in the index. This is not expected."
-                )
+        self.view_names: List[Any] = list(segments.keys())
+        self.view_ids: Dict[Any, int] = {
+            name: i for i, name in enumerate(self.view_names)
+        }
+        number_views = len(self.view_names)
+        number_segments = previous if previous else 0
+        total_segments = number_views * number_segments
+
+        # Segments are interleaved in master order: the i-th segment of each view, in
+        # the order of the views, then the (i+1)-th and so on.
+        self.view_of = [i % number_views for i in range(total_segments)]
+        self.ord_of = [i // number_views for i in range(total_segments)]
+        self.alive = _AliveIndex(total_segments)
+
+        self.lengths: List[List[int]] = []
+        self.fenwick: List[_FenwickTree] = []
+        self.view_alive: List[_AliveIndex] = []
+        for name in self.view_names:
+            lengths = [len(content) for content in segments[name]]
+            self.lengths.append(lengths)
+            self.fenwick.append(_FenwickTree(lengths))
+            self.view_alive.append(_AliveIndex(number_segments))
 
         # Populate views
         for key, values in segments.items():
-            self.views[key] = "".join(segments[key])
-
-    def __update_index__(
-        self, m_index: int, diff_len: int, view_name: Optional[str] = None
-    ):
-        for i in range(m_index, len(self.index)):
-            if view_name:
-                if view_name == self.index[i].view_name:
-                    self.index[i].segment_index += diff_len
-            else:
-                self.index[i].segment_index += diff_len
-
-            self.index[i].master_index = i
-
-    def __merge_consecutive_segments__(self):
-        segments_seq_to_merge: List[List[int]] = []
-
-        cur_sequence = []
-        last_seg_type: Optional[str] = None
-        for i in range(len(self.index)):
-            cur_seg_type = self.index[i].view_name
-            if cur_seg_type == last_seg_type:
-                cur_sequence.append(i)
-            else:
-                segments_seq_to_merge.append([])
-                cur_sequence = segments_seq_to_merge[-1]
-            last_seg_type = cur_seg_type
-
-        segments_seq_to_merge.reverse()
-        for g in segments_seq_to_merge:
-            g.reverse()
-            for d in g:
-                self.index.pop(d)
-        self.__update_index__(0, 0)
-
-    def __get_segs__(self, view_name: Any):
-        return filter(lambda x: x.view_name == view_name, self.index)
+            self.materialized[key] = "".join(segments[key])
+            self.views[key] = Rope(self.materialized[key])
+
+    @property
+    def index(self) -> List["StringView.ViewSegmentItem"]:
+        """
+        List of ViewSegmentItem describing the segments in master order.
+        """
+        offsets = [0] * len(self.view_names)
+        index = []
+        for m in self.iter_mindex():
+            v, o = self.view_of[m], self.ord_of[m]
+            index.append(self.ViewSegmentItem(self.view_names[v], m, offsets[v]))
+            offsets[v] += self.lengths[v][o]
+        return index
+
+    def __add_length__(self, view_id: int, ord: int, diff_len: int):
+        self.lengths[view_id][ord] += diff_len
+        self.fenwick[view_id].add(ord, diff_len)
+
+    def __kill__(self, m_index: int):
+        """
+        Remove a segment and give its content to the previous segment of the same view.
+        """
+        v, o = self.view_of[m_index], self.ord_of[m_index]
+        length = self.lengths[v][o]
+
+        self.__add_length__(v, o, -length)
+        self.alive.kill(m_index)
+        self.view_alive[v].kill(o)
+
+        receiver = self.view_alive[v].find_prev(o)
+        if receiver == -1:
+            receiver = self.view_alive[v].find_next(o)
+        if receiver != -1:
+            self.__add_length__(v, receiver, length)
+
+    def __merge_consecutive_segments__(self, m_index: int):
+        """
+        Merge the segments following m_index while they belong to its view.
+        """
+        v = self.view_of[m_index]
+        next_m = self.alive.find_next(m_index + 1)
+        while next_m != -1 and self.view_of[next_m] == v:
+            self.__kill__(next_m)
+            next_m = self.alive.find_next(next_m + 1)
 
     def __getitem__(self, key):
-        return self.views[key]
+        """
+        Return the string of a view.
+
+        If key is a pair (view_name, slice), only the requested slice is materialized.
+        """
+        if isinstance(key, tuple):
+            view_name, view_slice = key
+            if view_name in self.materialized:
+                return self.materialized[view_name][view_slice]
+            return self.views[view_name][view_slice]
+
+        if key not in self.materialized:
+            self.materialized[key] = str(self.views[key])
+        return self.materialized[key]
 
     def __setitem__(self, key, value):
         seg_index, content = value
+        self.splice(key, seg_index, self.view_length(key), content)
+
+    def splice(self, view_name: Any, start: int, end: int, content: str):
+        """
+        Replace the content of the view in [start,end) and update the index.
+        """
+        start = max(0, start)
+        diff_len = len(content) - (end - start)
+        m_index = self.get_mindex(start, view_name)
+
+        self.views[view_name].splice(start, end, content)
+        self.materialized.pop(view_name, None)
+        if self.view_of and self.view_of[m_index] == self.view_ids[view_name]:
+            self.__add_length__(
+                self.view_ids[view_name], self.ord_of[m_index], diff_len
+            )
 
-        new_content = self.views[key][:seg_index] + content
-        diff_len = len(new_content) - len(self.views[key])
-        m_index = self.get_mindex(seg_index, key)
+    def view_length(self, view_name: Any) -> int:
+        return len(self.views[view_name])
 
-        self.views[key] = self.views[key][:seg_index] + content
-        self.__update_index__(m_index + 1, diff_len, key)
+    def segment_length(self, m_index: int) -> int:
+        return self.lengths[self.view_of[m_index]][self.ord_of[m_index]]
+
+    def get_view_name(self, m_index: int) -> Any:
+        return self.view_names[self.view_of[m_index]]
 
     def get_mindex(self, seg_index: int, view_name: str) -> int:
-        last_m = 0
-        for el in self.__get_segs__(view_name):
-            if el.segment_index <= seg_index:
-                last_m = el.master_index
-            else:
-                break
-        return last_m
+        """
+        Return the master index of the segment of the view containing seg_index.
+        """
+        v = self.view_ids[view_name]
+        if seg_index < 0 or len(self.lengths[v]) == 0:
+            return self.alive.find_next(0) if self.view_of else 0
+
+        o = min(self.fenwick[v].search(seg_index), len(self.lengths[v]) - 1)
+        o = self.view_alive[v].find_prev(o)
+        if o == -1:
+            return self.alive.find_next(0)
+        return o * len(self.view_names) + v
+
+    def iter_mindex(self, start: int = 0, stop: int = -1) -> Iterator[int]:
+        """
+        Iterate over the master indexes of the segments in [start,stop).
+        """
+        if stop == -1:
+            stop = len(self.view_of)
+        m = self.alive.find_next(start)
+        while m != -1 and m < stop:
+            yield m
+            m = self.alive.find_next(m + 1)
 
     def remove(self, *m_indexes):
-        for i in sorted(m_indexes, reverse=True):
-            self.index.pop(i)
-        self.__merge_consecutive_segments__()
-
-    def get_content(self):
-        s = ""
-
-        to_zip = []
-        for name in self.views.keys():
-            segs = list(self.__get_segs__(name))
-            segs.append(None)
-            mod = []
-            for s1, s2 in zip(segs[:-1], segs[1:]):
-                if s2 is None:
-                    s1.end = len(self[name])
-                else:
-                    s1.end = s2.segment_index
-                mod.append(s1)
-            to_zip.append(mod)
-
-        for lv in zip(*to_zip):
-            for v in lv:
-                s += self[v.view_name][v.segment_index : v.end]
+        for i in m_indexes:
+            self.__kill__(i)
+
+        for i in m_indexes:
+            previous = self.alive.find_prev(i)
+            if previous != -1:
+                self.__merge_consecutive_segments__(previous)
+
+    def iter_segments(self) -> Iterator[Tuple[Any, str]]:
+        """
+        Yield the view name and the content of each segment in master order.
+        """
+        offsets = [0] * len(self.view_names)
+        for m in self.iter_mindex():
+            v, o = self.view_of[m], self.ord_of[m]
+            start = offsets[v]
+            offsets[v] += self.lengths[v][o]
+            yield self.view_names[v], self[self.view_names[v], start : offsets[v]]
+
+    def iter_content(self) -> Iterator[str]:
+        """
+        Yield the slices of the segments in master order without joining them.
+        """
+        offsets = [0] * len(self.view_names)
+        for m in self.iter_mindex():
+            v, o = self.view_of[m], self.ord_of[m]
+            start = offsets[v]
+            offsets[v] += self.lengths[v][o]
+            if offsets[v] > start:
+                yield from self.views[self.view_names[v]].iter_chunks(start, offsets[v])
+
+    def write_to(self, stream: TextIO):
+        for chunk in self.iter_content():
+            stream.write(chunk)
+
+    def get_content(self) -> str:
+        return "".join(self.iter_content())
+
+
+class _FenwickTree:
+    """
+    Binary indexed tree over a list of integers.
+    """
 
+    __slots__ = ("tree", "size")
+
+    def __init__(self, values: List[int]):
+        self.size = len(values)
+        self.tree = [0] + list(values)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index: int, delta: int):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index: int) -> int:
+        """
+        Sum of the first index values.
+        """
+        s = 0
+        i = index
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
         return s
+
+    def search(self, value: int) -> int:
+        """
+        Return the largest index such that prefix_sum(index) <= value.
+        """
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            if pos + step <= self.size and self.tree[pos + step] <= value:
+                pos += step
+                value -= self.tree[pos]
+            step >>= 1
+        return pos
+
+
+class _AliveIndex:
+    """
+    Set of positions 0..n-1 from which positions can only be removed.
+
+    find_next and find_prev return the closest alive position with amortized near
+    constant cost (union-find with path compression).
+    """
+
+    __slots__ = ("next_parent", "prev_parent")
+
+    def __init__(self, n: int):
+        # Position n (resp. 0) is a sentinel in next_parent (resp. prev_parent).
+        self.next_parent = list(range(n + 1))
+        self.prev_parent = list(range(n + 1))
+
+    def kill(self, i: int):
+        self.next_parent[i] = i + 1
+        self.prev_parent[i + 1] = i
+
+    def find_next(self, i: int) -> int:
+        """
+        Smallest alive position greater or equal than i, or -1.
+        """
+        parent = self.next_parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return -1 if root == len(parent) - 1 else root
+
+    def find_prev(self, i: int) -> int:
+        """
+        Largest alive position smaller or equal than i, or -1.
+        """
+        parent = self.prev_parent
+        root = i + 1
+        j = root
+        while parent[root] != root:
+            root = parent[root]
+        while parent[j] != root:
+            parent[j], j = root, parent[j]
+        return root - 1
@@ -0,0 +1,264 @@
+from bisect import bisect_left, insort
+import heapq
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\S+")
+
+# Distance between the keys of two consecutive tokens when the keys are numbered.
+KEY_GAP = 1 << 32
+
+
+class TokenIndex:
+    """
+    Index of the whitespace separated tokens of a text.
+
+    Tokens are interned and the index stores, for each token, its id and its start
+    offset in the text. It supports whitespace-insensitive phrase search and it is
+    updated incrementally when a span of the text is replaced.
+
+    Each token also has a key. Keys increase along the text and are not changed when
+    tokens are inserted or removed elsewhere, such that the postings list of a token
+    id, the sorted keys of its occurrences, is searched with bisect.
+
+    >>> ti = TokenIndex("Que mangerons-nous\\ncet   après-midi?")
+    >>> ti.find("mangerons-nous cet après".split())
+    (4, 30)
+    >>> text = "Que mangeons\\ncet   après-midi?"
+    >>> ti.update(4, 18, len("mangeons"), lambda s, e: text[s:e])
+    >>> ti.find(["mangeons", "cet"])
+    (4, 16)
+    """
+
+    def __init__(self, text: str):
+        self.vocabulary: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.sorted_tokens: List[str] = []
+        self.postings: List[List[int]] = []
+
+        self.ids: List[int] = []
+        self.starts: List[int] = []
+        for m in TOKEN_PATTERN.finditer(text):
+            self.ids.append(self.__intern__(m.group(0)))
+            self.starts.append(m.start())
+        self.__number_keys__()
+
+        # Offsets of the tokens from shift_from on are stored without the shift. The
+        # shift is applied lazily, such that a sequence of forward updates costs
+        # linear time overall.
+        self.shift_from = 0
+        self.shift = 0
+
+    def __intern__(self, token: str) -> int:
+        token_id = self.vocabulary.get(token)
+        if token_id is None:
+            token_id = len(self.tokens)
+            self.vocabulary[token] = token_id
+            self.tokens.append(token)
+            self.postings.append([])
+            insort(self.sorted_tokens, token)
+        return token_id
+
+    def __number_keys__(self):
+        self.keys = list(range(0, len(self.ids) * KEY_GAP, KEY_GAP))
+        self.postings = [[] for _ in self.tokens]
+        for token_id, key in zip(self.ids, self.keys):
+            self.postings[token_id].append(key)
+
+    def __new_keys__(self, i0: int, i1: int, count: int) -> Optional[List[int]]:
+        """
+        Keys for count tokens replacing the tokens in [i0,i1), or None if there is
+        no room for them in between the keys of the neighbour tokens.
+        """
+        lo = self.keys[i0 - 1] if i0 > 0 else None
+        hi = self.keys[i1] if i1 < len(self.keys) else None
+        if lo is None:
+            lo = 0 if hi is None else hi - (count + 1) * KEY_GAP
+        if hi is None:
+            hi = lo + (count + 1) * KEY_GAP
+
+        step = (hi - lo) // (count + 1)
+        if step == 0:
+            return None
+        return [lo + step * (i + 1) for i in range(count)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def start(self, i: int) -> int:
+        if i >= self.shift_from:
+            return self.starts[i] + self.shift
+        return self.starts[i]
+
+    def end(self, i: int) -> int:
+        return self.start(i) + len(self.tokens[self.ids[i]])
+
+    def __first_ending_after__(self, offset: int) -> int:
+        """
+        Index of the first token whose end is greater than offset.
+        """
+        lo, hi = 0, len(self.ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.end(mid) <= offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __first_starting_after__(self, offset: int) -> int:
+        """
+        Index of the first token whose start is greater than offset.
+        """
+        lo, hi = 0, len(self.ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.start(mid) <= offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __candidates__(
+        self, words: List[str], middle_ids: List[int], first: int
+    ) -> Iterator[int]:
+        """
+        Yield, in increasing order from first, the indexes where a match of the words
+        could start.
+
+        The candidates are read from the postings of the rarest middle word or, if
+        there is none, of the tokens starting with the last word.
+        """
+        if middle_ids:
+            j = min(
+                range(len(middle_ids)), key=lambda j: len(self.postings[middle_ids[j]])
+            )
+            anchors = [middle_ids[j]]
+            offset = j + 1
+        else:
+            anchors = []
+            i = bisect_left(self.sorted_tokens, words[-1])
+            while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(
+                words[-1]
+            ):
+                anchors.append(self.vocabulary[self.sorted_tokens[i]])
+                i += 1
+            offset = len(words) - 1
+
+        key = self.keys[first + offset]
+        streams = []
+        for token_id in anchors:
+            p = self.postings[token_id]
+            streams.append(map(p.__getitem__, range(bisect_left(p, key), len(p))))
+
+        last = len(self.ids) - len(words)
+        for key in heapq.merge(*streams):
+            k = bisect_left(self.keys, key) - offset
+            if k > last:
+                break
+            yield k
+
+    def __apply_shift__(self, stop: int):
+        for i in range(self.shift_from, stop):
+            self.starts[i] += self.shift
+
+    def find(
+        self, words: List[str], start: int = 0, end: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        Find a sequence of words and return the start and end offsets of the match.
+
+        The first word may be the suffix of a token and the last word may be the
+        prefix of a token, the others must match whole tokens. Return (-1,-1) if
+        there is no match.
+
+        Only the occurrences of the rarest middle word, or of the tokens starting with
+        the last word, are checked.
+        """
+        n = len(words)
+        if n < 2:
+            raise ValueError("The token index searches sequences of two or more words.")
+
+        first = self.__first_ending_after__(start)
+        if first + n > len(self.ids):
+            return -1, -1
+
+        middle_ids = []
+        for w in words[1:-1]:
+            token_id = self.vocabulary.get(w)
+            if token_id is None:
+                return -1, -1
+            middle_ids.append(token_id)
+
+        for k in self.__candidates__(words, middle_ids, first):
+            token = self.tokens[self.ids[k]]
+            if (
+                token.endswith(words[0])
+                and self.ids[k + 1 : k + n - 1] == middle_ids
+                and self.tokens[self.ids[k + n - 1]].startswith(words[-1])
+            ):
+                m_start = self.end(k) - len(words[0])
+                m_end = self.start(k + n - 1) + len(words[-1])
+                if end is not None and m_end > end:
+                    break
+                if m_start >= start:
+                    return m_start, m_end
+
+        return -1, -1
+
+    def match_at(self, offset: int, words: List[str]) -> bool:
+        """
+        Check that the tokens from the one starting at offset are the given words.
+        """
+        if len(words) == 0:
+            return True
+
+        i = self.__first_starting_after__(offset - 1)
+        if i + len(words) > len(self.ids) or self.start(i) != offset:
+            return False
+        return all(self.tokens[self.ids[i + k]] == w for k, w in enumerate(words))
+
+    def update(self, start: int, end: int, new_length: int, get_text: Callable):
+        """
+        Update the index after the text in [start,end) is replaced by new_length chars.
+
+        The get_text(s,e) callable returns the slice [s,e) of the updated text. Only
+        the tokens touching the replaced span are tokenized again.
+        """
+        delta = new_length - (end - start)
+        i0 = self.__first_ending_after__(start - 1)
+        i1 = self.__first_starting_after__(end)
+
+        r_start, r_end = start, end
+        if i0 < i1:
+            r_start = min(start, self.start(i0))
+            r_end = max(end, self.end(i1 - 1))
+
+        new_ids = []
+        new_starts = []
+        for m in TOKEN_PATTERN.finditer(get_text(r_start, r_end + delta)):
+            new_ids.append(self.__intern__(m.group(0)))
+            new_starts.append(r_start + m.start())
+
+        if i1 >= self.shift_from:
+            self.__apply_shift__(i1)
+            self.shift_from = i0 + len(new_ids)
+        else:
+            for i in range(i1, self.shift_from):
+                self.starts[i] += delta
+            self.shift_from += len(new_ids) - (i1 - i0)
+        self.shift += delta
+
+        for token_id, key in zip(self.ids[i0:i1], self.keys[i0:i1]):
+            p = self.postings[token_id]
+            del p[bisect_left(p, key)]
+
+        new_keys = self.__new_keys__(i0, i1, len(new_ids))
+        self.ids[i0:i1] = new_ids
+        self.starts[i0:i1] = new_starts
+        if new_keys is None:
+            self.__number_keys__()
+        else:
+            self.keys[i0:i1] = new_keys
+            for token_id, key in zip(new_ids, new_keys):
+                insort(self.postings[token_id], key)
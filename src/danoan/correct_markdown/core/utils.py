@@ -1,16 +1,451 @@
-from bs4 import BeautifulSoup
-import markdown  # type: ignore
+from danoan.correct_markdown.core.source_map import SourceMap
+
+from array import array
+import bisect
+import heapq
+import html
+import itertools
 import re
-from typing import List, Tuple, TextIO
+from typing import Any, Dict, List, Match, Optional, Tuple, TextIO
+
+
+# Block markups, matched at the start of a line (without its new line).
+_FENCE_PATTERN = re.compile(r" {0,3}(`{3,}|~{3,})")
+_INDENTED_CODE_PATTERN = re.compile(r" {4}|\t")
+_BLOCKQUOTE_PATTERN = re.compile(r"(?: {0,3}>[ \t]?)+")
+_SETEXT_UNDERLINE_PATTERN = re.compile(r" {0,3}(?:=+|-+)[ \t]*$")
+_THEMATIC_BREAK_PATTERN = re.compile(r" {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_ATX_HEADING_PATTERN = re.compile(r" {0,3}#{1,6}(?:[ \t]+|$)")
+_ATX_CLOSING_PATTERN = re.compile(r"(?:[ \t]+#+)?[ \t]*$")
+_LIST_MARKER_PATTERN = re.compile(r" {0,3}(?:[-+*]|\d{1,9}[.)])(?:[ \t]+|$)")
+_HARD_BREAK_PATTERN = re.compile(r" {2,}$")
+
+# Inline markups, matched in the paragraphs.
+_CODE_SPAN_PATTERN = re.compile(r"(?<!`)(`+)(?!`)(.+?)(?<!`)\1(?!`)", re.DOTALL)
+_AUTOLINK_PATTERN = re.compile(
+    r"<(?:[a-zA-Z][a-zA-Z0-9+.-]{1,31}:[^<>\s]*|[^<>\s@]+@[^<>\s@]+)>"
+)
+_ESCAPE_PATTERN = re.compile(r"\\[!-/:-@\[-`{-~]")
+_IMAGE_PATTERN = re.compile(r"!\[[^\[\]]*\]\([^()]*\)")
+_LINK_PATTERN = re.compile(r"\[[^\[\]]*(\]\([^()]*\))")
+_DELIMITER_PATTERN = re.compile(r"\*+|_+")
+_ENTITY_PATTERN = re.compile(
+    r"&(?:#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[A-Za-z][A-Za-z0-9]{1,31});"
+)
+
+# Values of the mask of plain_text_spans.
+_SPAN_TYPES = {0: "text", 1: "markup", 2: "entity"}
+
+# Html tags, see scan_html_tags.
+_TAG_PATTERN = re.compile(
+    r"""</?[A-Za-z][A-Za-z0-9-]*(?=[\s/>])[^<>"']*(?:(?:"[^"]*"|'[^']*')[^<>"']*)*>"""
+    r"""|<![A-Za-z][^>]*>"""
+)
+# Starts of code spans, fences and comments. The regex engine finds a literal
+# first char much faster than the first char of an alternation.
+_NO_TAG_PATTERNS = [
+    re.compile(r"``*"),
+    re.compile(r"~~~~*"),
+    re.compile(r"<(?:!--|\?)"),
+]
+_TAG_CLOSINGS = {"<!--": "-->", "<?": "?>"}
+
+
+def __mark__(mask: bytearray, start: int, end: int, value: bytes = b"\x01"):
+    mask[start:end] = value * (end - start)
+
+
+def __mark_inline__(
+    content: str, markup: bytearray, protected: bytearray, start: int, end: int
+):
+    """
+    Mark the inline markups of the paragraph content[start:end].
+
+    The content of code spans and the escaped chars are protected: they are text
+    even if they look like a markup.
+    """
+
+    def free(*spans: Tuple[int, int]) -> bool:
+        return not any(protected[i] or markup[i] for s, e in spans for i in range(s, e))
+
+    for m in _CODE_SPAN_PATTERN.finditer(content, start, end):
+        if free(m.span(1)):
+            __mark__(markup, *m.span(1))
+            __mark__(markup, m.end(2), m.end())
+            __mark__(protected, *m.span(2))
+
+    for m in _ESCAPE_PATTERN.finditer(content, start, end):
+        if free((m.start(), m.start() + 1)):
+            __mark__(markup, m.start(), m.start() + 1)
+            __mark__(protected, m.start() + 1, m.end())
+
+    for m in _AUTOLINK_PATTERN.finditer(content, start, end):
+        if free((m.start(), m.start() + 1)):
+            __mark__(markup, m.start(), m.start() + 1)
+            __mark__(markup, m.end() - 1, m.end())
+            __mark__(protected, m.start() + 1, m.end() - 1)
+
+    for m in _ENTITY_PATTERN.finditer(content, start, end):
+        if free(m.span()):
+            __mark__(markup, *m.span(), b"\x02")
+
+    for m in _IMAGE_PATTERN.finditer(content, start, end):
+        if free((m.start(), m.start() + 2)):
+            __mark__(markup, *m.span())
+
+    for m in _LINK_PATTERN.finditer(content, start, end):
+        if free((m.start(), m.start() + 1), (m.start(1), m.start(1) + 2)):
+            __mark__(markup, m.start(), m.start() + 1)
+            __mark__(markup, *m.span(1))
+
+    __mark_emphasis__(content, markup, protected, start, end)
+
+
+def __mark_emphasis__(
+    content: str, markup: bytearray, protected: bytearray, start: int, end: int
+):
+    """
+    Mark the * and _ delimiters of emphasis and strong emphasis.
+
+    The delimiter runs are matched with a stack, as in CommonMark, such that
+    unmatched delimiters cost no backtracking. A run opens if it is followed by a
+    non-space and closes if it is preceded by one; a _ run must also not be
+    inside a word.
+    """
+    openers: List[List[Any]] = []
+    for m in _DELIMITER_PATTERN.finditer(content, start, end):
+        d_start, d_end = m.span()
+        if any(protected[i] or markup[i] for i in range(d_start, d_end)):
+            continue
+
+        char = content[d_start]
+        before = content[d_start - 1] if d_start > start else " "
+        after = content[d_end] if d_end < end else " "
+        can_open = not after.isspace()
+        can_close = not before.isspace()
+        if char == "_":
+            can_open = can_open and not before.isalnum()
+            can_close = can_close and not after.isalnum()
+
+        while can_close and d_start < d_end:
+            i = len(openers) - 1
+            while i >= 0 and openers[i][0] != char:
+                i -= 1
+            if i < 0:
+                break
+
+            opener = openers[i]
+            n = 2 if opener[2] - opener[1] >= 2 and d_end - d_start >= 2 else 1
+            __mark__(markup, opener[2] - n, opener[2])
+            __mark__(markup, d_start, d_start + n)
+            opener[2] -= n
+            d_start += n
+            del openers[i + (opener[1] < opener[2]) :]
+
+        if can_open and d_start < d_end:
+            openers.append([char, d_start, d_end])
+
+
+def plain_text_spans(content: str) -> List[Tuple[str, int, int]]:
+    """
+    Split a markdown string in text and markup spans.
+
+    Each returned item is a triplet (type,start,end) and the spans cover the whole
+    string, in order. Joining the text spans gives the plain text of the markdown.
+
+    type:
+        text: plain-text content
+        markup: markdown markup or html tag
+        entity: html entities, e.g. &amp;, that are decoded in the plain text
+
+    The markdown is scanned once, line by line for the block markups (headings,
+    quotes, list markers, fences, blank lines) and then paragraph by paragraph for
+    the inline ones (emphasis, code spans, links, images, escapes).
+
+    >>> spans = plain_text_spans("# Hi\\n\\nA **b**.\\n")
+    >>> spans[:4]
+    [('markup', 0, 2), ('text', 2, 5), ('markup', 5, 6), ('text', 6, 8)]
+    >>> spans[4:]
+    [('markup', 8, 10), ('text', 10, 11), ('markup', 11, 13), ('text', 13, 14), ('markup', 14, 15)]
+    """
+    markup = bytearray(len(content))
+    protected = bytearray(len(content))
+
+    tag_starts, tag_ends = scan_html_tags(content)
+    for t_start, t_end in zip(tag_starts, tag_ends):
+        __mark__(markup, t_start, t_end)
+
+    paragraphs = []
+    paragraph_start = None
+
+    def end_paragraph(end: int):
+        nonlocal paragraph_start
+        if paragraph_start is not None:
+            paragraphs.append((paragraph_start, end))
+            paragraph_start = None
+
+    fence = None
+    tag_index = 0
+    pos = 0
+    for line in content.splitlines(keepends=True):
+        start, end = pos, pos + len(line.rstrip("\r\n"))
+        pos += len(line)
+
+        while tag_index < len(tag_ends) and tag_ends[tag_index] <= start:
+            tag_index += 1
+        if (
+            fence is None
+            and tag_index < len(tag_starts)
+            and tag_starts[tag_index] < start
+        ):
+            # The line continues a multi-line html tag.
+            continue
+
+        if fence is not None:
+            m = _FENCE_PATTERN.match(content, start, end)
+            if (
+                m
+                and m.group(1)[0] == fence[0]
+                and len(m.group(1)) >= len(fence)
+                and not content[m.end() : end].strip()
+            ):
+                __mark__(markup, start, pos)
+                fence = None
+            else:
+                __mark__(protected, start, pos)
+            continue
+
+        k = start
+        m = _BLOCKQUOTE_PATTERN.match(content, k, end)
+        if m:
+            __mark__(markup, *m.span())
+            k = m.end()
+
+        if not content[k:end].strip():
+            end_paragraph(start)
+            __mark__(markup, k, pos)
+            continue
+
+        m = _FENCE_PATTERN.match(content, k, end)
+        if m and not (m.group(1)[0] == "`" and "`" in content[m.end() : end]):
+            end_paragraph(start)
+            __mark__(markup, start, pos)
+            fence = m.group(1)
+            continue
+
+        if paragraph_start is not None and _SETEXT_UNDERLINE_PATTERN.match(
+            content, k, end
+        ):
+            end_paragraph(start)
+            __mark__(markup, start, pos)
+            continue
+
+        if _THEMATIC_BREAK_PATTERN.match(content, k, end):
+            end_paragraph(start)
+            __mark__(markup, start, pos)
+            continue
+
+        m = _ATX_HEADING_PATTERN.match(content, k, end)
+        if m:
+            end_paragraph(start)
+            __mark__(markup, *m.span())
+            # The closing pattern matches at the end of the line, if not before.
+            closing = _ATX_CLOSING_PATTERN.search(content, m.end(), end)
+            heading_end = closing.start() if closing is not None else end
+            __mark__(markup, heading_end, end)
+            paragraphs.append((m.end(), heading_end))
+            continue
+
+        m = _INDENTED_CODE_PATTERN.match(content, k, end)
+        if m and paragraph_start is None:
+            __mark__(markup, start, m.end())
+            __mark__(protected, m.end(), pos)
+            continue
+
+        m = _LIST_MARKER_PATTERN.match(content, k, end)
+        if m:
+            end_paragraph(start)
+            __mark__(markup, *m.span())
+            paragraph_start = m.end()
+        elif paragraph_start is None:
+            paragraph_start = k
+
+        m = _HARD_BREAK_PATTERN.search(content, k, end)
+        if m:
+            __mark__(markup, *m.span())
+
+    end_paragraph(len(content))
+
+    for p_start, p_end in paragraphs:
+        __mark_inline__(content, markup, protected, p_start, p_end)
+
+    # The new lines at the end of the document.
+    m = re.search(r"\n\s*\Z", content)
+    if m:
+        __mark__(markup, *m.span())
+
+    return [
+        (_SPAN_TYPES[m.group()[0]], m.start(), m.end())
+        for m in re.finditer(rb"\x00+|\x01+|\x02+", markup)
+    ]
+
+
+def plain_text_source_map(content: str) -> SourceMap:
+    """
+    Return the source map from the plain text of a markdown string to the string.
+
+    The html entities are kept as they are in the string, such that the plain text
+    is made of copies of the string.
+    """
+    return SourceMap.from_spans(
+        (
+            (start, end)
+            for name, start, end in plain_text_spans(content)
+            if name != "markup"
+        ),
+        len(content),
+    )
+
+
+def strip_markdown(content: str) -> Tuple[str, SourceMap]:
+    """
+    Remove all markdown markup from a string and return the plain text and its
+    source map.
+
+    The html entities are not decoded, see plain_text_source_map.
+    """
+    source_map = plain_text_source_map(content)
+    return __join_runs__(content, source_map), source_map
 
 
 def get_plain_text_from_markdown(markdown_stream: TextIO) -> str:
     """
-    Removes all markdown markup from a string.
+    Removes all markdown markup from a string and decodes the html entities.
+    """
+    content = markdown_stream.read()
+    return "".join(
+        html.unescape(content[start:end]) if name == "entity" else content[start:end]
+        for name, start, end in plain_text_spans(content)
+        if name != "markup"
+    )
+
+
+def __join_runs__(content: str, source_map: SourceMap) -> str:
+    return "".join(
+        content[start : start + length] for start, _, length in source_map.runs()
+    )
+
+
+def __find_tags__(content: str, pos: int) -> Tuple[array, array]:
+    spans = array(
+        "q",
+        itertools.chain.from_iterable(
+            map(re.Match.span, _TAG_PATTERN.finditer(content, pos))
+        ),
+    )
+    return spans[::2], spans[1::2]
+
+
+def __at_line_start__(content: str, pos: int) -> bool:
+    i = pos
+    while i > 0 and content[i - 1] == " " and pos - i < 4:
+        i -= 1
+    return pos - i <= 3 and (i == 0 or content[i - 1] == "\n")
+
+
+def scan_html_tags(content: str) -> Tuple[array, array]:
+    """
+    Scan a markdown string and return the starts and ends of its html tags.
+
+    Comments are tags and a > inside a quoted attribute value does not end a tag.
+    Code spans and fenced code blocks have no tags.
+
+    The tags and the starts of code and comments are found by two regex scans. The
+    tags inside code or comments are dropped, and so are the code and comments
+    starting inside a tag.
+
+    >>> starts, ends = scan_html_tags('<b title="a>b">x</b> `<i>`<!-- <c> -->')
+    >>> list(starts), list(ends)
+    ([0, 16, 26], [15, 20, 38])
     """
-    html = markdown.markdown(markdown_stream.read())
-    soup = BeautifulSoup(html, "html.parser")
-    return soup.get_text()
+    starts = array("q")
+    ends = array("q")
+
+    # The next match of a pattern after some position, or None if there is no match
+    # after it. Searching again from a later position only rescans the content if
+    # the pattern was not searched yet or if the match was before it.
+    next_matches: Dict[str, Optional[Match[str]]] = {}
+
+    def search(pattern: str, pos: int) -> Optional[Match[str]]:
+        if pattern in next_matches:
+            m = next_matches[pattern]
+            if m is None or m.start() >= pos:
+                return m
+        m = re.compile(pattern, re.MULTILINE).search(content, pos)
+        next_matches[pattern] = m
+        return m
+
+    def skip(m: Match) -> Optional[int]:
+        """
+        Return the end of the code or comment starting at m, if any.
+        """
+        token = m.group()
+        if token in _TAG_CLOSINGS:
+            closing = search(re.escape(_TAG_CLOSINGS[token]), m.end())
+            return closing.end() if closing else None
+
+        if len(token) >= 3 and __at_line_start__(content, m.start()):
+            line_end = content.find("\n", m.end())
+            info = content[m.end() : line_end if line_end >= 0 else len(content)]
+            is_fence = token[0] == "~" or "`" not in info
+        else:
+            is_fence = False
+
+        if is_fence:
+            closing = search(
+                rf"^ {{0,3}}{re.escape(token[0])}{{{len(token)},}}[ \t]*$", m.end()
+            )
+            return closing.end() if closing else len(content)
+
+        if token[0] == "~":
+            return None
+        closing = search(rf"(?<!`){token}(?!`)", m.end())
+        blank_line = search(r"\n[ \t]*$", m.end())
+        if closing and (blank_line is None or closing.start() < blank_line.start()):
+            return closing.end()
+        return None
+
+    tag_starts, tag_ends = __find_tags__(content, 0)
+    # The tags before k are in starts and ends or are inside code.
+    k = 0
+    pos = 0
+    no_tags = [pattern.finditer(content) for pattern in _NO_TAG_PATTERNS]
+    for m in heapq.merge(*no_tags, key=re.Match.start):
+        if m.start() < pos:
+            continue
+        i = bisect.bisect_left(tag_starts, m.start(), k)
+        if i > k and tag_ends[i - 1] > m.start():
+            continue
+        end = skip(m)
+        if end is None:
+            continue
+
+        starts.extend(tag_starts[k:i])
+        ends.extend(tag_ends[k:i])
+        if m.group() in _TAG_CLOSINGS:
+            starts.append(m.start())
+            ends.append(end)
+        pos = end
+
+        k = bisect.bisect_left(tag_starts, end, i)
+        if k > i and tag_ends[k - 1] > end:
+            # A tag starting inside the code overlaps the tags after it.
+            tag_starts, tag_ends = __find_tags__(content, end)
+            k = 0
+
+    starts.extend(tag_starts[k:])
+    ends.extend(tag_ends[k:])
+    return starts, ends
 
 
 def extract_html_tags(html: str) -> List[Tuple[str, int, int]]:
@@ -24,37 +459,38 @@ def extract_html_tags(html: str) -> List[Tuple[str, int, int]]:
         opening: opening html tag
         no_html: text content
     """
-    tag_pattern = r"</?[^>]+>"
-    tag_indexes = []
-    if re.search(tag_pattern, html):
-        for m in re.finditer(tag_pattern, html):
-            if m.group(0).find("</") != -1:
-                tag_indexes.append(("closing", m.span()[0], m.span()[1]))
-            else:
-                tag_indexes.append(("opening", m.span()[0], m.span()[1]))
-    else:
-        tag_indexes.append(("no_html", 0, len(html)))
+    starts, ends = scan_html_tags(html)
+    if not starts:
+        return [("no_html", 0, len(html))]
 
-    return sorted(tag_indexes, key=lambda x: x[2])
+    return [
+        ("closing" if html.startswith("</", start) else "opening", start, end)
+        for start, end in zip(starts, ends)
+    ]
 
 
-def remove_html_tags(string_stream: TextIO) -> str:
+def html_source_map(content: str) -> SourceMap:
     """
-    Removes all html tags from a string.
+    Return the source map from the text of a string without its html tags to the
+    string.
     """
-    content = string_stream.read()
+    starts, ends = scan_html_tags(content)
+    return SourceMap.from_spans(
+        zip(itertools.chain([0], ends), itertools.chain(starts, [len(content)])),
+        len(content),
+    )
 
-    last = 0
-    no_html = ""
-    tags = extract_html_tags(content)
-    for tag in tags:
-        name, i, j = tag
-        if name == "no_html":
-            no_html += content[i:j]
-        else:
-            no_html += content[last:i]
-        last = j
 
-    no_html += content[last:]
+def strip_html_tags(content: str) -> Tuple[str, SourceMap]:
+    """
+    Remove all html tags from a string and return the text and its source map.
+    """
+    source_map = html_source_map(content)
+    return __join_runs__(content, source_map), source_map
+
 
-    return no_html
+def remove_html_tags(string_stream: TextIO) -> str:
+    """
+    Removes all html tags from a string.
+    """
+    return strip_html_tags(string_stream.read())[0]
@@ -0,0 +1,49 @@
+from danoan.correct_markdown.cli.commands.batch import __batch__
+
+import json
+import pytest
+
+
+def write_message(path, message):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"message": message}, f)
+
+
+def test_batch_input_dir(tmp_path, capsys):
+    input_dir = tmp_path / "input"
+    write_message(input_dir / "b" / "pin_original.json", "Today it rain.")
+    write_message(input_dir / "b" / "pin_correct.json", "Today it rained.")
+    write_message(input_dir / "a" / "pin_original.json", "Tomorow too.")
+    write_message(input_dir / "a" / "pin_correct.json", "Tomorrow too.")
+    write_message(input_dir / "c" / "pin_original.json", "Missing correction.")
+
+    with pytest.raises(SystemExit):
+        __batch__("word-diff", input_dir=input_dir, workers=2)
+
+    statuses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [s["name"] for s in statuses] == ["a", "b", "c"]
+    assert [s["status"] for s in statuses] == ["ok", "ok", "error"]
+
+    with open(statuses[1]["output"]) as f:
+        diff_items = json.load(f)
+    assert diff_items[0]["original_value"] == "rain."
+    assert diff_items[0]["new_value"] == "rained."
+    assert not (input_dir / "c" / "diff-items.json").exists()
+
+
+def test_batch_manifest(tmp_path, capsys):
+    write_message(tmp_path / "a.json", "Today it rain.")
+    write_message(tmp_path / "b.json", "Today it rained.")
+    manifest = tmp_path / "manifest.jsonl"
+    with open(manifest, "w") as f:
+        entry = {"text_a": str(tmp_path / "a.json"), "text_b": str(tmp_path / "b.json")}
+        f.write(json.dumps({"name": "first", **entry}) + "\n")
+        f.write(json.dumps(entry) + "\n")
+
+    __batch__("word-diff", manifest=manifest, output_dir=tmp_path / "out", workers=1)
+
+    statuses = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [s["name"] for s in statuses] == ["first", "1-a"]
+    assert (tmp_path / "out" / "first" / "diff-items.json").exists()
+    assert (tmp_path / "out" / "1-a" / "diff-items.json").exists()
@@ -0,0 +1,59 @@
+from danoan.correct_markdown.cli.commands.collect_bold import (
+    BOLD_PATTERN,
+    __collect_bold_segments__,
+    collect_unique_bold_segments,
+    iter_bold_segments,
+)
+
+import io
+import json
+import random
+import pytest
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_iter_bold_segments_chunks(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice("**__ab \n") for _ in range(rng.randrange(0, 200)))
+    expected = [
+        (m.group(m.lastindex), m.start(m.lastindex))
+        for m in BOLD_PATTERN.finditer(text)
+    ]
+
+    for chunk_size in [1, 2, 3, 7, 64]:
+        assert list(iter_bold_segments(io.StringIO(text), chunk_size)) == expected
+
+
+def test_iter_bold_segments_unclosed():
+    text = "An **unclosed " + "word " * 100 + "__marker__ and a **bold** one."
+    segments = list(iter_bold_segments(io.StringIO(text), 8))
+
+    assert [s for s, _ in segments] == [
+        "unclosed " + "word " * 100 + "__marker__ and a "
+    ]
+    assert segments[0][1] == 5
+
+
+def test_collect_unique_bold_segments():
+    text = "A **term**, a __term__ and **another** one. **term**"
+    segments = collect_unique_bold_segments(io.StringIO(text))
+
+    assert list(segments) == ["term", "another"]
+    assert segments["term"] == [4, 16, 46]
+
+
+def test_collect_bold_segments_command(tmp_path, capsys):
+    text_a = tmp_path / "a.md"
+    text_a.write_text("A **term**, a __term__ and **another** one.")
+
+    __collect_bold_segments__(text_a)
+    assert json.loads(capsys.readouterr().out) == ["term", "term", "another"]
+
+    __collect_bold_segments__(text_a, unique=True)
+    assert json.loads(capsys.readouterr().out) == ["term", "another"]
+
+    __collect_bold_segments__(text_a, with_positions=True)
+    assert json.loads(capsys.readouterr().out) == [
+        {"term": "term", "count": 2, "positions": [4, 16]},
+        {"term": "another", "count": 1, "positions": [29]},
+    ]
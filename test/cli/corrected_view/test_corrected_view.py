@@ -0,0 +1,119 @@
+from danoan.correct_markdown.cli import utils, watch
+from danoan.correct_markdown.cli.commands.corrected_view import (
+    __block_diff_items__,
+    __corrected_view__,
+)
+from danoan.correct_markdown.core import api, model
+
+import io
+import os
+import threading
+import time
+from typing import Dict, List
+
+
+def wait_for(predicate, timeout=5):
+    start = time.time()
+    while not predicate():
+        assert time.time() - start < timeout
+        time.sleep(0.01)
+
+
+def test_corrected_view_output(tmp_path):
+    markdown = tmp_path / "original.md"
+    correction = tmp_path / "correction.md"
+    output = tmp_path / "out" / "corrected-view.md"
+    markdown.write_text("It <b>rain</b> today.\n")
+    correction.write_text("It rained today.\n")
+
+    __corrected_view__(markdown, correction, output=output)
+    assert output.read_text() == "It <b>rained</b> today.\n\n"
+
+
+def test_corrected_view_watch(tmp_path, monkeypatch):
+    markdown = tmp_path / "original.md"
+    correction = tmp_path / "correction.md"
+    output = tmp_path / "corrected-view.md"
+    markdown.write_text("It <b>rain</b> today.\n\nTomorow too.\n")
+    correction.write_text("It rained today.\n\nTomorrow too.\n")
+
+    stop = threading.Event()
+    watch_files = watch.watch
+    monkeypatch.setattr(watch, "watch", lambda *args: watch_files(*args, stop=stop))
+    thread = threading.Thread(
+        target=__corrected_view__,
+        args=(markdown, correction),
+        kwargs={"output": output, "watch": True, "interval": 0.01},
+    )
+    thread.start()
+    try:
+        wait_for(output.exists)
+        assert "Tomorrow too." in output.read_text()
+
+        markdown.write_text("It <b>rain</b> today.\n\nTomorow also.\n")
+        correction.write_text("It rained today.\n\nTomorrow also.\n")
+        # The modification time may have a coarse resolution.
+        os.utime(correction, ns=(0, 0))
+        wait_for(lambda: "also" in output.read_text())
+        assert output.read_text() == ("It <b>rained</b> today.\n\nTomorrow also.\n\n")
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_block_diff_items(monkeypatch):
+    text_a = "".join(f"Paragraph {i} has a eror.\n\n" for i in range(20))
+    text_b = text_a.replace("a eror", "an error")
+    engine, mode = model.DiffEngine.Difflib, model.TextDiffMode.Word
+
+    def apply_corrections(diff_items):
+        return api.apply_corrections(io.StringIO(text_a), diff_items)
+
+    def expected():
+        return apply_corrections(
+            utils.get_diff_items(
+                io.StringIO(text_a), io.StringIO(text_b), engine, True, mode
+            )
+        )
+
+    diffed = []
+    get_diff_items = utils.get_diff_items
+
+    def counted_get_diff_items(a, b, *args):
+        diffed.append(a.getvalue())
+        return get_diff_items(a, b, *args)
+
+    monkeypatch.setattr(utils, "get_diff_items", counted_get_diff_items)
+
+    diff_cache: Dict[str, List[model.DiffItem]] = {}
+    diff_items = __block_diff_items__(text_a, text_b, engine, mode, diff_cache)
+    assert len(diffed) == 20
+    assert apply_corrections(diff_items) == expected()
+
+    diffed.clear()
+    text_b = text_b.replace("Paragraph 7 has", "Paragraph 7 had")
+    diff_items = __block_diff_items__(text_a, text_b, engine, mode, diff_cache)
+    assert diffed == ["Paragraph 7 has a eror.\n\n"]
+    assert apply_corrections(diff_items) == expected()
+
+
+def test_watch_keeps_watching(tmp_path):
+    markdown = tmp_path / "original.md"
+    markdown.write_text("Today")
+
+    calls = []
+    stop = threading.Event()
+
+    def render():
+        calls.append(markdown.read_text())
+        if len(calls) == 1:
+            raise UnicodeDecodeError("utf-8", b"", 0, 1, "invalid start byte")
+        stop.set()
+
+    thread = threading.Thread(target=watch.watch, args=([markdown], render, 0.01, stop))
+    thread.start()
+    wait_for(lambda: len(calls) == 1)
+    markdown.write_text("Tomorrow")
+    os.utime(markdown, ns=(0, 0))
+    thread.join(5)
+    assert calls == ["Today", "Tomorrow"]
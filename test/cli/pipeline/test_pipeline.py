@@ -0,0 +1,135 @@
+from danoan.correct_markdown.cli.commands.pipeline import run_pipeline
+from danoan.correct_markdown.cli.llm_runner import LLMRunner, SubprocessRunner
+
+import asyncio
+import io
+import os
+import pytest
+import sys
+import threading
+import time
+
+
+class FakeRunner(LLMRunner):
+    def __init__(self, failures=0):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.failures = failures
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def run(self, prompt, message, parameters=None):
+        with self.lock:
+            self.calls.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fails = self.calls.count(prompt) <= self.failures
+        try:
+            time.sleep(0.01)
+            if fails:
+                raise RuntimeError(f"Prompt {prompt} failed")
+            return self.__output__(prompt, message)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def __output__(self, prompt, message):
+        if prompt == "correct-text":
+            return message.replace("rain", "rained").replace("Tomorow", "Tomorrow")
+        if prompt == "explain-correction":
+            # Late answers for the first items must not change the order.
+            time.sleep(0.05 if message["original_value"] == "rain" else 0)
+            return f"{message['original_value']} -> {message['new_value']}"
+        if prompt == "word-definition":
+            return [f"definition of {message}"]
+        if prompt == "summarize":
+            return {"message": "A rainy day."}
+        raise RuntimeError(f"Unexpected prompt: {prompt}")
+
+
+def __markdown_file__(tmp_path):
+    markdown_file = tmp_path / "input.md"
+    with open(markdown_file, "w") as f:
+        f.write("Today it <b>rain</b> a **lot**.\n\nTomorow too, a **lot**.\n")
+    return markdown_file
+
+
+def test_pipeline(tmp_path):
+    markdown_file = __markdown_file__(tmp_path)
+
+    runner = FakeRunner()
+    stream = io.StringIO()
+    run_pipeline(markdown_file, "Weather", "english", runner, stream, max_in_flight=4)
+    enhanced_md = stream.getvalue()
+
+    assert enhanced_md.startswith("# Weather\n")
+    assert "~~rain~~" in enhanced_md
+    assert "A rainy day." in enhanced_md
+    assert "1. **lot**: definition of lot" in enhanced_md
+    assert "[^1]: rain -> rained" in enhanced_md
+    assert "[^2]: Tomorow -> Tomorrow" in enhanced_md
+
+    assert runner.calls[0] == "correct-text"
+    assert sorted(runner.calls[1:]) == [
+        "explain-correction",
+        "explain-correction",
+        "summarize",
+        "word-definition",
+    ]
+
+
+def test_pipeline_retries(tmp_path):
+    markdown_file = __markdown_file__(tmp_path)
+
+    runner = FakeRunner(failures=1)
+    stream = io.StringIO()
+    run_pipeline(
+        markdown_file, "Weather", "english", runner, stream, max_in_flight=1, backoff=0
+    )
+
+    assert "[^2]: Tomorow -> Tomorrow" in stream.getvalue()
+    assert runner.calls.count("correct-text") == 2
+    assert runner.calls.count("summarize") == 2
+    assert runner.max_in_flight == 1
+
+    runner = FakeRunner(failures=3)
+    with pytest.raises(RuntimeError):
+        run_pipeline(
+            markdown_file, "Weather", "english", runner, io.StringIO(), backoff=0
+        )
+
+
+def test_subprocess_runner():
+    script = (
+        "import json,sys;"
+        "m=json.load(sys.stdin)['message'];"
+        "print(json.dumps({'message':m.upper(),'args':sys.argv[1:]}))"
+    )
+    runner = SubprocessRunner([sys.executable, "-c", script])
+    output = runner.run("summarize", "hello", {"language": "english"})
+    assert output == {
+        "message": "HELLO",
+        "args": ["summarize", "--p", "language", "english"],
+    }
+
+
+def test_subprocess_runner_cancel(tmp_path):
+    pid_file = tmp_path / "pid"
+    script = (
+        "import os,time;"
+        f"open({str(pid_file)!r},'w').write(str(os.getpid()));"
+        "time.sleep(60)"
+    )
+    runner = SubprocessRunner([sys.executable, "-c", script])
+
+    async def cancel():
+        task = asyncio.ensure_future(runner.run_async("summarize", "hello"))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
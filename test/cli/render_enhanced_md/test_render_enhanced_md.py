@@ -1,4 +1,10 @@
-from danoan.correct_markdown.cli.commands.render_enhanced_md import render_enhanced_md
+from danoan.correct_markdown.cli.commands.render_enhanced_md import (
+    render_enhanced_md,
+    write_enhanced_md,
+)
+from danoan.correct_markdown.core.markdown_view import MarkdownView
+
+import io
 
 
 def test_render_enhanced_md():
@@ -41,3 +47,17 @@ Gatsby was a old sport
 
 """
     )
+
+
+def test_write_enhanced_md():
+    text = "From the other side of the <b>bay</b> we could see this greenish light."
+    render_data = {
+        "title": "The great Gatsby",
+        "summary": "Gatsby was a old sport",
+        "words_definitions": [],
+        "corrections_explanations": [],
+    }
+
+    ss = io.StringIO()
+    write_enhanced_md(render_data, MarkdownView(io.StringIO(text), True), ss)
+    assert ss.getvalue() == render_enhanced_md({**render_data, "text": text})
@@ -0,0 +1,152 @@
+from danoan.correct_markdown.cli.commands.run_prompts import __run_prompts__
+from danoan.correct_markdown.cli.llm_runner import (
+    LLMRunner,
+    pack_messages,
+    run_packed_prompts,
+    run_prompts,
+)
+
+import asyncio
+import io
+import json
+import pytest
+import sys
+
+
+class FakeRunner(LLMRunner):
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def run_async(self, prompt, message, parameters=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # Later messages answer first.
+            await asyncio.sleep(0.01 * (10 - message) / 10)
+            self.attempts[message] = self.attempts.get(message, 0) + 1
+            if self.attempts[message] <= self.failures:
+                raise RuntimeError(f"Prompt {prompt} failed")
+            return f"{prompt}-{message}-{parameters['language']}"
+        finally:
+            self.in_flight -= 1
+
+    def run(self, prompt, message, parameters=None):
+        return asyncio.run(self.run_async(prompt, message, parameters))
+
+
+def test_llm_runner_is_abstract():
+    class Runner(LLMRunner):
+        pass
+
+    with pytest.raises(TypeError):
+        Runner()
+
+
+def test_run_prompts_order():
+    runner = FakeRunner()
+    outputs = asyncio.run(
+        run_prompts(runner, "explain", range(10), {"language": "en"}, max_in_flight=3)
+    )
+    assert outputs == [f"explain-{i}-en" for i in range(10)]
+    assert runner.max_in_flight == 3
+
+
+def test_run_prompts_retries():
+    runner = FakeRunner(failures=2)
+    outputs = asyncio.run(
+        run_prompts(runner, "explain", range(4), {"language": "en"}, backoff=0)
+    )
+    assert outputs == [f"explain-{i}-en" for i in range(4)]
+    assert all(attempts == 3 for attempts in runner.attempts.values())
+
+    runner = FakeRunner(failures=3)
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            run_prompts(runner, "explain", range(4), {"language": "en"}, backoff=0)
+        )
+
+
+class FakePackedRunner(LLMRunner):
+    def __init__(self, drop):
+        self.drop = drop
+        self.packs = []
+
+    def run(self, prompt, message, parameters=None):
+        self.packs.append([entry["id"] for entry in message])
+        if len(message) == 1:
+            return f"explanation of {message[0]['message']['original_value']}"
+        return {
+            entry["id"]: f"explanation of {entry['message']['original_value']}"
+            for entry in message
+            if entry["id"] != self.drop
+        }
+
+
+def test_pack_messages():
+    # The json size of the packed messages is 56 or 106 chars.
+    messages = [{"original_value": "a" * n} for n in [10, 10, 60, 10, 10, 10]]
+    assert pack_messages(messages, 120) == [[0, 1], [2], [3, 4], [5]]
+    assert pack_messages(messages, 120, [1, 3, 5]) == [[1, 3], [5]]
+    assert pack_messages(messages, 0) == [[i] for i in range(6)]
+
+
+def test_run_packed_prompts():
+    messages = [{"original_value": f"word{i}", "context": "x" * 20} for i in range(12)]
+    runner = FakePackedRunner(drop="5")
+    outputs = asyncio.run(
+        run_packed_prompts(runner, "explain-corrections", messages, budget=300)
+    )
+    assert outputs == [f"explanation of word{i}" for i in range(12)]
+
+    first_round = [pack for pack in runner.packs if len(pack) > 1]
+    assert len(first_round) < len(messages)
+    assert runner.packs[-1] == ["5"]
+
+
+class FakeUnpackedRunner(LLMRunner):
+    def __init__(self):
+        self.packs = []
+
+    def run(self, prompt, message, parameters=None):
+        # The prompt does not understand packs and answers a single output.
+        self.packs.append(len(message))
+        return f"explanation of {message[0]['message']['original_value']}"
+
+
+def test_run_packed_prompts_unanswered():
+    messages = [{"original_value": f"word{i}", "context": "x" * 20} for i in range(12)]
+    runner = FakeUnpackedRunner()
+    outputs = asyncio.run(
+        run_packed_prompts(runner, "explain-correction", messages, budget=300)
+    )
+    assert outputs == [f"explanation of word{i}" for i in range(12)]
+
+    # The messages are sent one by one after the first round of packs.
+    first_round = len(runner.packs) - len(messages)
+    assert all(size > 1 for size in runner.packs[:first_round])
+    assert runner.packs[first_round:] == [1] * len(messages)
+
+
+def test_run_prompts_command(capsys):
+    script = (
+        "import json,sys;"
+        "m=json.load(sys.stdin)['message'];"
+        "print(json.dumps([sys.argv[1],m['original_value'],sys.argv[3]]))"
+    )
+    messages = io.StringIO(
+        '{"original_value": "rain"}\n\n{"original_value": "Tomorow"}\n'
+    )
+    __run_prompts__(
+        "explain-correction",
+        messages,
+        jsonl=True,
+        p=[["language", "english"]],
+        llm_command=[sys.executable, "-c", script],
+    )
+    assert json.loads(capsys.readouterr().out) == [
+        ["explain-correction", "rain", "language"],
+        ["explain-correction", "Tomorow", "language"],
+    ]
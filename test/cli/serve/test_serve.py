@@ -0,0 +1,144 @@
+from danoan.correct_markdown.cli.commands.serve import Service, make_server
+
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import pytest
+import threading
+import time
+
+
+@pytest.fixture
+def server():
+    executor = ThreadPoolExecutor(max_workers=1)
+    server = make_server(Service(executor, max_queue=2), port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    executor.shutdown()
+
+
+def request(server, method, path, body=None, headers=None):
+    if headers is None:
+        headers = {"Content-Type": "application/json"}
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    connection.request(
+        method, path, json.dumps(body) if body is not None else None, headers
+    )
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_serve_commands(server, tmp_path):
+    text_a = tmp_path / "a.json"
+    text_b = tmp_path / "b.json"
+    text_a.write_text('{"message": "Today it rain."}')
+    text_b.write_text('{"message": "Today it rained."}')
+
+    status, response = request(
+        server,
+        "POST",
+        "/run",
+        {"id": "diff", "command": "word-diff", "args": [str(text_a), str(text_b)]},
+    )
+    assert status == 200
+    assert response["id"] == "diff"
+    assert response["status"] == "ok"
+    assert json.loads(response["output"]) == [
+        {
+            "context": "Today it ___ ",
+            "original_value": "rain.",
+            "new_value": "rained.",
+            "operation": "replace",
+        }
+    ]
+
+    status, response = request(
+        server,
+        "POST",
+        "/run",
+        {"command": "markdown-view", "stdin": "Today <b>it</b> rained."},
+    )
+    assert response["output"] == "Today it rained.\n"
+
+    status, response = request(
+        server, "POST", "/run", {"command": "word-diff", "args": ["missing.json"]}
+    )
+    assert response["status"] == "error"
+    assert "Exited with code 2" in response["error"]
+
+    status, response = request(server, "POST", "/run", {"command": "batch"})
+    assert response["status"] == "error"
+
+    assert request(server, "GET", "/status") == (200, {"status": "ok", "jobs": 0})
+
+
+def test_serve_rejected_flags(server, tmp_path):
+    text_a = tmp_path / "a.md"
+    text_a.write_text("Today it rain.")
+    output = tmp_path / "output.md"
+
+    for flag in ["--output", f"--output={output}", "--out", "--watch", "-h"]:
+        status, response = request(
+            server,
+            "POST",
+            "/run",
+            {
+                "command": "corrected-view",
+                "args": [str(text_a), str(text_a), flag, str(output)],
+            },
+        )
+        assert response["status"] == "error"
+        assert "is not allowed" in response["error"]
+    assert not output.exists()
+
+
+def test_serve_rejected_origin(server):
+    body = {"command": "markdown-view", "stdin": "Today"}
+    for headers in [
+        {},
+        {"Content-Type": "text/plain"},
+        {"Content-Type": "application/json", "Origin": "https://example.com"},
+    ]:
+        status, response = request(server, "POST", "/run", body, headers)
+        assert (status, response["status"]) == (403, "error")
+
+    headers = {"Content-Type": "application/json", "Origin": "http://localhost:3000"}
+    status, response = request(server, "POST", "/run", body, headers)
+    assert (status, response["output"]) == (200, "Today\n")
+
+
+def test_serve_queue_and_cancel(server):
+    # Keep the only worker busy.
+    release = threading.Event()
+    server.service.executor.submit(release.wait)
+
+    responses = {}
+
+    def run(job_id):
+        responses[job_id] = request(
+            server, "POST", "/run", {"id": job_id, "command": "markdown-view"}
+        )
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in ["a", "b"]]
+    for thread in threads:
+        thread.start()
+    while request(server, "GET", "/status")[1]["jobs"] < 2:
+        time.sleep(0.01)
+
+    status, response = request(server, "POST", "/run", {"command": "markdown-view"})
+    assert (status, response["error"]) == (503, "Queue is full")
+
+    assert request(server, "POST", "/cancel", {"id": "a"}) == (
+        200,
+        {"id": "a", "cancelled": True},
+    )
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert responses["a"] == (200, {"id": "a", "status": "cancelled"})
+    assert responses["b"] == (200, {"id": "b", "status": "ok", "output": "\n"})
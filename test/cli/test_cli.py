@@ -0,0 +1,56 @@
+from danoan.correct_markdown.cli import cli
+
+import importlib
+import json
+import subprocess
+import sys
+
+# Print the heavy modules imported by a command line.
+SCRIPT = """
+import contextlib, io, json, sys
+from danoan.correct_markdown.cli import cli
+sys.argv = ["correct-markdown", *sys.argv[1:]]
+with contextlib.redirect_stdout(io.StringIO()):
+    cli.main()
+heavy = ["bs4", "jinja2", "markdown", "asyncio", "danoan.correct_markdown.core.api"]
+print(json.dumps([m for m in heavy if m in sys.modules]))
+"""
+
+
+def imported_modules(*args):
+    completed = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout)
+
+
+def test_commands_help():
+    # The help of the registry is the first sentence of the command docstring.
+    for name, command in cli.COMMANDS.items():
+        module = importlib.import_module(
+            f"danoan.correct_markdown.cli.commands.{command.module}"
+        )
+        func = getattr(module, f"__{name.replace('-', '_')}__")
+        assert command.help == func.__doc__.split(".")[0].strip()
+
+
+def test_command_name():
+    assert cli.__command_name__(["word-diff", "a", "b"]) == "word-diff"
+    assert cli.__command_name__(["--cache-dir", "serve", "markdown-view"]) == (
+        "markdown-view"
+    )
+    assert cli.__command_name__(["--help"]) is None
+
+
+def test_lazy_imports(tmp_path):
+    text = tmp_path / "text.md"
+    text.write_text("Some **bold** words.")
+
+    assert imported_modules("collect-bold-segments", str(text)) == []
+    assert imported_modules("markdown-view", str(text)) == []
+    message = tmp_path / "message.json"
+    message.write_text('{"message": "Some words."}')
+    assert "jinja2" not in imported_modules("word-diff", str(message), str(message))
@@ -0,0 +1,28 @@
+from danoan.correct_markdown.cli.commands.word_diff import __word_diff__
+
+import json
+
+
+def write_message(path, message):
+    with open(path, "w") as f:
+        json.dump({"message": message}, f)
+    return path
+
+
+def test_word_diff_jsonl(tmp_path, capsys):
+    text_a = write_message(tmp_path / "a.json", "Today it <b>rain</b>. Tomorow too.")
+    text_b = write_message(tmp_path / "b.json", "Today it rained. Tomorrow too.")
+
+    __word_diff__(text_a, text_b)
+    expected = json.loads(capsys.readouterr().out)
+
+    __word_diff__(text_a, text_b, jsonl=True)
+    lines = capsys.readouterr().out.splitlines()
+
+    assert len(lines) == 1
+    assert [json.loads(line) for line in lines] == expected
+    assert "start" not in expected[0]
+
+    __word_diff__(text_a, text_b, with_offsets=True, jsonl=True)
+    items = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert (items[0]["start"], items[0]["end"]) == (9, 22)
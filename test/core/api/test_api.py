@@ -74,6 +74,138 @@ def test_text_diff_letter_and_update():
     assert diff_items[2].operation == "insert"
 
 
+@pytest.mark.parametrize("mode", list(model.TextDiffMode))
+@pytest.mark.parametrize(
+    "text_a,text_b",
+    [
+        (
+            INPUT_FOLDER / "strikethrough" / "test_a" / "original.md",
+            INPUT_FOLDER / "strikethrough" / "test_a" / "corrected.md",
+        ),
+        (
+            INPUT_FOLDER / "strikethrough" / "test_b" / "text_a.md",
+            INPUT_FOLDER / "strikethrough" / "test_b" / "text_b.md",
+        ),
+    ],
+)
+@pytest.mark.parametrize("context_size", [3, 10])
+def test_text_diff_incremental(text_a, text_b, mode, context_size):
+    with open(text_a) as fa, open(text_b) as fb:
+        pa = utils.remove_html_tags(fa)
+        pb = utils.remove_html_tags(fb)
+
+    expected = list(
+        api.text_diff(io.StringIO(pa), io.StringIO(pb), mode, context_size, True)
+    )
+    diff_items = list(
+        api.text_diff(
+            io.StringIO(pa),
+            io.StringIO(pb),
+            mode,
+            context_size,
+            True,
+            incremental=True,
+        )
+    )
+    assert diff_items == expected
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_text_diff_context_size(incremental):
+    words = [f"w{i}" for i in range(40)]
+    corrected = [{"w15": "x15", "w20": "x20"}.get(w, w) for w in words]
+
+    diff_items = api.text_diff(
+        io.StringIO(" ".join(words)),
+        io.StringIO(" ".join(corrected)),
+        model.TextDiffMode.Word,
+        20,
+        True,
+        incremental=incremental,
+    )
+    assert [item.context.split(" ___ ")[0].split() for item in diff_items] == [
+        words[:15],
+        corrected[:20],
+    ]
+
+
+@pytest.mark.parametrize("update_a", [True, False])
+@pytest.mark.parametrize("mode", [model.TextDiffMode.Word, model.TextDiffMode.Letter])
+def test_text_diff_batch(update_a, mode):
+    with open(INPUT_FOLDER / "strikethrough" / "test_b" / "text_a.md") as fa, open(
+        INPUT_FOLDER / "strikethrough" / "test_b" / "text_b.md"
+    ) as fb:
+        pa = utils.remove_html_tags(fa)
+        pb = utils.remove_html_tags(fb)
+
+    expected = list(
+        api.text_diff(
+            io.StringIO(pa),
+            io.StringIO(pb),
+            mode,
+            10,
+            update_a,
+            incremental=True,
+            with_offsets=True,
+        )
+    )
+    batch = api.text_diff_batch(
+        io.StringIO(pa), io.StringIO(pb), mode, 10, update_a, with_offsets=True
+    )
+
+    assert len(batch) == len(expected)
+    assert list(batch) == expected
+    assert batch[-1] == expected[-1]
+    assert [batch.operation(k) for k in range(len(batch))] == [
+        item.operation for item in expected
+    ]
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_text_diff_with_offsets(incremental):
+    text_a = "x y\nx  y"
+    diff_items = list(
+        api.text_diff(
+            io.StringIO(text_a),
+            io.StringIO("x y z y w"),
+            model.TextDiffMode.Word,
+            10,
+            True,
+            incremental=incremental,
+            with_offsets=True,
+        )
+    )
+
+    assert diff_items == [
+        model.DiffItem("x y ___ y", "x", "z", "replace", 4, 5),
+        model.DiffItem("x y z y ___ ", "", "w", "insert", 8, 8),
+    ]
+    assert text_a[4:5] == "x"
+
+
+def test_apply_corrections_with_offsets():
+    text_a = "x y\n<b>x</b>  y"
+    ss_a = io.StringIO(utils.remove_html_tags(io.StringIO(text_a)))
+    diff_items = list(
+        api.text_diff(
+            ss_a,
+            io.StringIO("x y z y"),
+            model.TextDiffMode.Word,
+            10,
+            True,
+            incremental=True,
+            with_offsets=True,
+        )
+    )
+
+    # Searching "x y" would find the first x.
+    assert api.apply_corrections(io.StringIO(text_a), diff_items) == "x y\n<b>z</b>  y"
+
+    diff_items[0].start = 0
+    diff_items[0].end = 3
+    assert api.apply_corrections(io.StringIO(text_a), diff_items) == "z y\n<b>x</b>  y"
+
+
 def test_strikethrough_errors_a():
     original = INPUT_FOLDER / "strikethrough" / "test_a" / "original.md"
     corrected = INPUT_FOLDER / "strikethrough" / "test_a" / "corrected.md"
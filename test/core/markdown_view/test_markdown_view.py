@@ -1,9 +1,21 @@
-from danoan.correct_markdown.core import api, model
-from danoan.correct_markdown.core.markdown_view import MarkdownView
+from danoan.correct_markdown.core import api, model, utils
+from danoan.correct_markdown.core.markdown_view import (
+    ChunkedMarkdownView,
+    IncrementalDiffView,
+    MarkdownView,
+    SegmentType,
+    build_pure_markdown_segments,
+    split_markdown_blocks,
+)
 
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import io
 from pathlib import Path
+import pytest
+import random
+from typing import List
 
 SCRIPT_FOLDER = Path(__file__).parent
 INPUT_FOLDER = SCRIPT_FOLDER / "input"
@@ -19,6 +31,17 @@ def are_html_documents_equivalent(doc1: str, doc2: str):
     return normalized_soup1 == normalized_soup2
 
 
+def random_text(rng: random.Random, words: List[str], max_words: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randrange(1, max_words)))
+
+
+def random_edits(rng: random.Random, text: str) -> str:
+    return " ".join(
+        w if rng.random() < 0.8 else rng.choice(["dog", "", "the cat"])
+        for w in text.split(" ")
+    )
+
+
 ######################################################
 # Start of Plain-Text MarkdownView tests
 ######################################################
@@ -126,6 +149,24 @@ def test_pt_f():
 ######################################################
 
 
+def test_build_pure_markdown_segments():
+    ss = io.StringIO(
+        '<p><span style="color:blue">Today</span> is a **wonderful** day!</p>'
+    )
+    segments = build_pure_markdown_segments(ss)
+
+    assert segments[SegmentType.EditableContent] == [
+        "",
+        "Today",
+        " is a **wonderful** day!",
+    ]
+    assert segments[SegmentType.NoEditableContent] == [
+        '<p><span style="color:blue">',
+        "</span>",
+        "</p>",
+    ]
+
+
 def test_pm_a():
     with open(INPUT_FOLDER / "test_a" / "text_a.md") as fa:
         original = fa.read()
@@ -221,3 +262,188 @@ def test_pm_f():
 
         assert tv1.get_no_html_view() == tv2.get_no_html_view()
         assert tv1.get_full_content() == tv2.get_full_content()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_apply_many(seed):
+    rng = random.Random(seed)
+    words = ["the", "cat", "sat", "on", "mat", "<b>", "</b>", "<br/>", "\n"]
+    text_a = random_text(rng, words, 80)
+    text_b = random_edits(rng, text_a)
+
+    mv_a = MarkdownView(io.StringIO(text_a), True)
+    diff_items = list(
+        api.text_diff(
+            io.StringIO(mv_a.text_view),
+            io.StringIO(text_b),
+            model.TextDiffMode.Word,
+            10,
+            True,
+            incremental=True,
+        )
+    )
+
+    mv_b = MarkdownView(io.StringIO(text_a), True)
+    spans = []
+    start = 0
+    try:
+        for item in diff_items:
+            s, e = api.apply_diff(mv_a, item, start)
+            spans.append((s, e))
+            start = e
+    except ValueError:
+        with pytest.raises(ValueError):
+            mv_b.apply_many(diff_items)
+        return
+
+    assert mv_b.apply_many(diff_items) == spans
+    assert mv_b.get_full_content() == mv_a.get_full_content()
+    assert mv_b.find("the cat") == mv_a.find("the cat")
+
+
+def test_apply_many_value_not_found():
+    mv = MarkdownView(io.StringIO("<b>Today</b> it rained."), True)
+    item = model.DiffItem(" ___ it snowed", "rained", "poured", "replace")
+    with pytest.raises(ValueError):
+        mv.apply_many([item])
+
+
+def test_apply_many_source_map():
+    s = "<b>rain</b> and **rain** today."
+    no_html, source_map = utils.strip_html_tags(s)
+    i = no_html.rindex("rain")
+    item = model.DiffItem("and ___ today.", "rain", "snow", "replace", i, i + 4)
+
+    mv = MarkdownView(io.StringIO(s))
+    assert mv.apply_many([item], source_map) == [(9, 13)]
+    assert mv.get_full_content() == "<b>rain</b> and **snow** today."
+
+
+def test_get_source_map():
+    s = "<b>rain</b> and **rain** today.\n\n<i>More</i> rain."
+    no_html, source_map = utils.strip_html_tags(s)
+
+    mv = MarkdownView(io.StringIO(s), True, source_map)
+    assert mv.text_view == no_html
+    assert mv.get_full_content() == s
+    assert list(mv.get_source_map().runs()) == list(source_map.runs())
+
+    mv = ChunkedMarkdownView(io.StringIO(s), 2)
+    assert list(mv.get_source_map().runs()) == list(source_map.runs())
+
+
+def test_split_markdown_blocks():
+    content = (
+        "# A\n\nOne <span\n\nclass='x'>two</span>\n\n```\nthree\n\n```\n## B\nfour"
+    )
+    chunks = split_markdown_blocks(content, 1)
+    assert "".join(chunks) == content
+    assert chunks == [
+        "# A\n\n",
+        "One <span\n\nclass='x'>two</span>\n\n",
+        "```\nthree\n\n```\n",
+        "## B\nfour",
+    ]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunked_markdown_view(seed):
+    rng = random.Random(seed)
+    words = ["the", "cat", "sat", "<b>", "</b>", "<br/>", "\n", "\n\n", "# Head"]
+    text_a = random_text(rng, words, 100)
+
+    mv = MarkdownView(io.StringIO(text_a), True)
+    text_b = random_edits(rng, mv.text_view)
+    diff_items = list(
+        api.text_diff(
+            io.StringIO(mv.text_view),
+            io.StringIO(text_b),
+            model.TextDiffMode.Word,
+            10,
+            True,
+            incremental=True,
+        )
+    )
+
+    def replace(item, index):
+        return f"~~{item.original_value}~~ {item.new_value}[^{index}]"
+
+    def render(chunk_size, executor=None):
+        try:
+            return api.render_diff_view(
+                io.StringIO(text_a),
+                copy.deepcopy(diff_items),
+                replace,
+                replace,
+                replace,
+                chunk_size,
+                executor,
+            )
+        except ValueError:
+            return None
+
+    expected = render(None)
+    assert render(1) == expected
+    assert render(20) == expected
+    with ThreadPoolExecutor(2) as executor:
+        assert render(1, executor) == expected
+
+    cmv = ChunkedMarkdownView(io.StringIO(text_a), 1)
+    assert cmv.text_view == mv.text_view
+    assert cmv.get_html_view() == mv.get_html_view()
+    for search_value in ["the", "cat sat", "t", "he\n\nca"]:
+        assert cmv.find(search_value, 2) == mv.find(search_value, 2)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_incremental_diff_view(seed):
+    rng = random.Random(seed)
+    words = ["the", "cat", "sat", "<b>", "</b>", "<br/>", "\n", "\n\n", "# Head"]
+    text_a = random_text(rng, words, 100)
+    text_b = random_edits(rng, utils.remove_html_tags(io.StringIO(text_a)))
+
+    def diff_items(text):
+        return list(
+            api.text_diff(
+                io.StringIO(utils.remove_html_tags(io.StringIO(text))),
+                io.StringIO(text_b),
+                model.TextDiffMode.Word,
+                10,
+                True,
+                incremental=True,
+            )
+        )
+
+    view = api.strikethrough_errors_incremental_view()
+    for text in [text_a, text_a.replace("sat", "ran", 1), text_a + "\n\nthe end"]:
+        items = diff_items(text)
+        try:
+            expected = api.strikethrough_errors(io.StringIO(text), copy.deepcopy(items))
+        except ValueError:
+            return
+        assert view.update(io.StringIO(text), items).get_full_content() == expected
+
+
+def test_incremental_diff_view_reuse():
+    paragraphs = [f"Paragraph {i} has a typo in <b>bold</b>." for i in range(20)]
+    text_a = "\n\n".join(paragraphs)
+    text_b = utils.remove_html_tags(io.StringIO(text_a)).replace("typo", "typos")
+
+    def render(view, text):
+        items = api.text_diff(
+            io.StringIO(utils.remove_html_tags(io.StringIO(text))),
+            io.StringIO(text_b),
+            model.TextDiffMode.Word,
+            update_a=True,
+            incremental=True,
+            with_offsets=True,
+        )
+        return view.update(io.StringIO(text), list(items)).get_full_content()
+
+    view = api.apply_corrections_incremental_view()
+    assert render(view, text_a) == text_a.replace("typo", "typos")
+    assert view.rendered == 20
+
+    edited = text_a.replace("Paragraph 7 has", "Paragraph 7 had")
+    assert render(view, edited) == edited.replace("typo", "typos").replace("had", "has")
+    assert view.rendered == 1
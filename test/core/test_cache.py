@@ -0,0 +1,121 @@
+from danoan.correct_markdown.core import api, cache, markdown_view
+from danoan.correct_markdown.core.cache import DiskCache
+from danoan.correct_markdown.cli import utils
+
+import io
+import os
+import pytest
+
+
+def test_disk_cache_lru_eviction(tmp_path):
+    disk_cache = DiskCache(tmp_path, max_size=25)
+    keys = [disk_cache.make_key("value", i) for i in range(3)]
+
+    disk_cache.set(keys[0], "a" * 8)
+    disk_cache.set(keys[1], "b" * 8)
+    os.utime(disk_cache.__path__(keys[0]), (0, 0))
+    os.utime(disk_cache.__path__(keys[1]), (1, 1))
+    assert disk_cache.get(keys[0]) == "a" * 8
+
+    disk_cache.set(keys[2], "c" * 8)
+    assert disk_cache.get(keys[0]) == "a" * 8
+    assert disk_cache.get(keys[1]) is None
+    assert disk_cache.get(keys[2]) == "c" * 8
+
+
+def test_disk_cache_scans_periodically(tmp_path, monkeypatch):
+    disk_cache = DiskCache(tmp_path)
+    scans = []
+    evict = disk_cache.evict
+    monkeypatch.setattr(disk_cache, "evict", lambda: scans.append(evict()))
+
+    for i in range(cache.SCAN_INTERVAL + 10):
+        disk_cache.set(disk_cache.make_key("value", i), i)
+    assert len(scans) == 2
+
+
+def test_disk_cache_stale_tmp_files(tmp_path):
+    disk_cache = DiskCache(tmp_path)
+    key = disk_cache.make_key("value")
+    stale = tmp_path / key[:2] / "stale.tmp"
+    fresh = tmp_path / key[:2] / "fresh.tmp"
+    stale.parent.mkdir()
+    stale.write_text("x" * 100)
+    fresh.write_text("x" * 100)
+    os.utime(stale, (0, 0))
+
+    disk_cache.set(key, [1, 2])
+    assert not stale.exists()
+    assert fresh.exists()
+    assert disk_cache.size == 100 + len("[1, 2]")
+
+
+def test_disk_cache_corrupted_entry(tmp_path):
+    disk_cache = DiskCache(tmp_path)
+    key = disk_cache.make_key("value")
+    disk_cache.set(key, [1, 2])
+    with open(disk_cache.__path__(key), "w") as f:
+        f.write("[1,")
+
+    assert disk_cache.get(key) is None
+    assert list(tmp_path.glob("*/*.tmp")) == []
+
+
+def test_markdown_view_segments_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_VARIABLE, str(tmp_path))
+    text = "<span>Today is a **wonderful** day!</span>"
+
+    mv = markdown_view.MarkdownView(io.StringIO(text), True)
+
+    def fail(original_markdown):
+        raise AssertionError("Segments should come from the cache")
+
+    monkeypatch.setattr(markdown_view, "build_pure_markdown_segments", fail)
+    cached_mv = markdown_view.MarkdownView(io.StringIO(text), True)
+    assert cached_mv.text_view == mv.text_view
+    assert cached_mv.get_full_content() == text
+
+
+def test_diff_items_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_VARIABLE, str(tmp_path))
+
+    def get_diff_items():
+        return utils.get_diff_items(
+            io.StringIO("Today it <b>rain</b>."),
+            io.StringIO("Today it rained."),
+            with_offsets=True,
+        )
+
+    diff_items = get_diff_items()
+    monkeypatch.setattr(utils.api, "text_diff", None)
+    assert get_diff_items() == diff_items
+
+
+def test_cache_versions(tmp_path, monkeypatch):
+    monkeypatch.setenv(cache.CACHE_DIR_VARIABLE, str(tmp_path))
+    text = "<span>Today is a **wonderful** day!</span>"
+    markdown_view.MarkdownView(io.StringIO(text), True)
+    utils.get_diff_items(io.StringIO("Today it rain."), io.StringIO("Today it rained."))
+
+    built = []
+    build = markdown_view.build_pure_markdown_segments
+
+    def counting_build(markdown):
+        built.append(1)
+        return build(markdown)
+
+    monkeypatch.setattr(markdown_view, "build_pure_markdown_segments", counting_build)
+    monkeypatch.setattr(
+        markdown_view,
+        "SEGMENTS_CACHE_VERSION",
+        markdown_view.SEGMENTS_CACHE_VERSION + 1,
+    )
+    markdown_view.MarkdownView(io.StringIO(text), True)
+    assert built == [1]
+
+    monkeypatch.setattr(utils, "DIFF_ITEMS_CACHE_VERSION", -1)
+    monkeypatch.setattr(utils.api, "text_diff", None)
+    with pytest.raises(TypeError):
+        utils.get_diff_items(
+            io.StringIO("Today it rain."), io.StringIO("Today it rained.")
+        )
@@ -0,0 +1,185 @@
+from danoan.correct_markdown.core import api, diff_engine, model
+
+import io
+import random
+import pytest
+import time
+
+ENGINES = list(model.DiffEngine)
+
+
+def apply_opcodes(seq1, seq2, opcodes):
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            assert seq1[i1:i2] == seq2[j1:j2]
+            result.extend(seq1[i1:i2])
+        else:
+            result.extend(seq2[j1:j2])
+    return result
+
+
+def generate_pair(seed: int, size: int, changes: int):
+    rng = random.Random(seed)
+    words = ["the", "a", "cat", "dog", "sat", "on", "mat", "and", "ran", "away"]
+    seq1 = [rng.choice(words) for _ in range(size)]
+    seq2 = list(seq1)
+    for _ in range(changes):
+        pos = rng.randrange(len(seq2) + 1)
+        op = rng.choice(["insert", "delete", "replace"])
+        if op == "insert" or len(seq2) == 0:
+            seq2.insert(pos, rng.choice(words))
+        elif op == "delete" and pos < len(seq2):
+            seq2.pop(pos)
+        elif pos < len(seq2):
+            seq2[pos] = rng.choice(words)
+    return seq1, seq2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(20))
+def test_opcodes_transform_seq1_in_seq2(engine, seed):
+    seq1, seq2 = generate_pair(seed, 60, seed % 7)
+
+    opcodes = diff_engine.get_opcodes(seq1, seq2, engine)
+    assert apply_opcodes(seq1, seq2, opcodes) == seq2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_opcodes_empty_sequences(engine):
+    assert diff_engine.get_opcodes([], [], engine) == []
+    assert diff_engine.get_opcodes(["a"], [], engine) == [("delete", 0, 1, 0, 0)]
+    assert diff_engine.get_opcodes([], ["a"], engine) == [("insert", 0, 0, 0, 1)]
+
+
+def test_myers_finds_minimal_edit_script():
+    seq1 = list("ABCABBA")
+    seq2 = list("CBABAC")
+
+    blocks = diff_engine.get_matching_blocks(seq1, seq2, model.DiffEngine.Myers)
+    assert sum(size for _, _, size in blocks) == 4
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_opcodes_large_different_sequences(engine, monkeypatch):
+    # The edit script is longer than MYERS_MAX_D: the region is split at the
+    # furthest points reached.
+    monkeypatch.setattr(diff_engine, "MYERS_MAX_D", 64)
+    seq1 = [f"a{i}" for i in range(4000)]
+    seq2 = [f"b{i}" for i in range(4000)]
+    seq2[1000:1100] = seq1[1000:1100]
+
+    start = time.perf_counter()
+    opcodes = diff_engine.get_opcodes(seq1, seq2, engine)
+    # Without the cap, Myers takes seconds and hundreds of MB.
+    assert time.perf_counter() - start < 2
+    assert apply_opcodes(seq1, seq2, opcodes) == seq2
+    assert ("equal", 1000, 1100, 1000, 1100) in opcodes
+
+
+@pytest.mark.parametrize("max_d", [1, 2, 3, 512])
+@pytest.mark.parametrize("seed", range(10))
+def test_myers_split(max_d, seed, monkeypatch):
+    monkeypatch.setattr(diff_engine, "MYERS_MAX_D", max_d)
+    seq1, seq2 = generate_pair(seed, 80, 30)
+
+    opcodes = diff_engine.get_opcodes(seq1, seq2, model.DiffEngine.Myers)
+    assert apply_opcodes(seq1, seq2, opcodes) == seq2
+    if max_d == 512:
+        # The edit script is minimal, as the one of the quadratic dynamic program.
+        lcs = [[0] * (len(seq2) + 1) for _ in range(len(seq1) + 1)]
+        for i, a in enumerate(seq1):
+            for j, b in enumerate(seq2):
+                lcs[i + 1][j + 1] = (
+                    lcs[i][j] + 1 if a == b else max(lcs[i][j + 1], lcs[i + 1][j])
+                )
+        equal = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+        assert equal == lcs[-1][-1]
+
+
+def test_myers_heavily_edited_sequences():
+    # A small vocabulary makes difflib quadratic; 30% of the words are replaced.
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(10)]
+    seq1 = [rng.choice(words) for _ in range(10000)]
+    seq2 = [w if rng.random() > 0.3 else rng.choice(words) for w in seq1]
+
+    start = time.perf_counter()
+    opcodes = diff_engine.get_opcodes(seq1, seq2, model.DiffEngine.Myers)
+    assert time.perf_counter() - start < 10
+    assert apply_opcodes(seq1, seq2, opcodes) == seq2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_text_diff_engine(engine):
+    text_a = "Here is the list of items\n\n - Banana\n - Apple\n - Soda."
+    text_b = "Here is the list of items\n\n\n - Orange\n - Tomato\n - Soda."
+
+    diff_items = list(
+        api.text_diff(
+            io.StringIO(text_a),
+            io.StringIO(text_b),
+            model.TextDiffMode.Word,
+            10,
+            True,
+            engine=engine,
+        )
+    )
+    assert [(d.original_value, d.new_value, d.operation) for d in diff_items] == [
+        ("Banana", "Orange", "replace"),
+        ("Apple", "Tomato", "replace"),
+    ]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(20))
+def test_hierarchical_opcodes(engine, seed):
+    rng = random.Random(seed)
+    seq1, seq2 = generate_pair(seed, 120, seed % 11)
+    seq1 = [w + "." if rng.random() < 0.1 else w for w in seq1]
+    paragraphs1 = sorted(rng.sample(range(len(seq1)), 8))
+    paragraphs2 = sorted(rng.sample(range(len(seq2)), 8))
+
+    opcodes = diff_engine.get_hierarchical_opcodes(
+        seq1, seq2, paragraphs1, paragraphs2, engine
+    )
+    assert apply_opcodes(seq1, seq2, opcodes) == seq2
+    for previous, current in zip(opcodes, opcodes[1:]):
+        assert previous[2] == current[1] and previous[4] == current[3]
+        assert "equal" in (previous[0], current[0])
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_text_diff_hierarchical(engine):
+    paragraphs = [
+        "Here is the list of items. They are sold in the market.",
+        " - Banana\n - Apple\n - Soda.",
+        "The market opens at nine. It closes at noon.",
+        "Here is the list of items. They are sold in the market.",
+    ]
+    text_a = "\n\n".join(paragraphs)
+    paragraphs[1] = " - Orange\n - Tomato\n - Soda."
+    paragraphs[2] = "The market opens at ten. It closes at noon."
+    text_b = "\n\n\n".join(paragraphs)
+
+    def diff(mode):
+        return list(
+            api.text_diff(
+                io.StringIO(text_a),
+                io.StringIO(text_b),
+                mode,
+                10,
+                True,
+                engine=engine,
+                incremental=True,
+                with_offsets=True,
+            )
+        )
+
+    diff_items = diff(model.TextDiffMode.Hierarchical)
+    assert [(d.original_value, d.new_value) for d in diff_items] == [
+        ("Banana", "Orange"),
+        ("Apple", "Tomato"),
+        ("nine.", "ten."),
+    ]
+    assert diff_items == diff(model.TextDiffMode.Word)
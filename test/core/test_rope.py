@@ -0,0 +1,48 @@
+from danoan.correct_markdown.core import rope
+
+import random
+import pytest
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rope_splice_and_slice(seed, monkeypatch):
+    monkeypatch.setattr(rope, "CHUNK_SIZE", 3)
+    rng = random.Random(seed)
+
+    s = "".join(rng.choice("abcdef ") for _ in range(rng.randrange(0, 60)))
+    r = rope.Rope(s)
+    for _ in range(50):
+        a = rng.randrange(0, len(s) + 1)
+        b = rng.randrange(a, len(s) + 1)
+        text = "".join(rng.choice("XYZ") for _ in range(rng.randrange(0, 8)))
+
+        r.splice(a, b, text)
+        s = s[:a] + text + s[b:]
+        assert str(r) == s
+        assert len(r) == len(s)
+
+        x = rng.randrange(-5, len(s) + 5)
+        y = rng.randrange(-5, len(s) + 5)
+        assert r[x:y] == s[x:y]
+
+
+def test_rope_index():
+    r = rope.Rope("October")
+    assert r[0] == "O"
+    assert r[-1] == "r"
+    with pytest.raises(IndexError):
+        r[7]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rope_find(seed, monkeypatch):
+    monkeypatch.setattr(rope, "CHUNK_SIZE", 3)
+    monkeypatch.setattr(rope, "FIND_WINDOW_SIZE", 7)
+    rng = random.Random(seed)
+
+    for _ in range(200):
+        s = "".join(rng.choice("abc") for _ in range(rng.randrange(0, 30)))
+        sub = "".join(rng.choice("abc") for _ in range(rng.randrange(1, 5)))
+        a = rng.randrange(0, len(s) + 1)
+        b = rng.randrange(a, len(s) + 1)
+        assert rope.Rope(s).find(sub, a, b) == s.find(sub, a, b)
@@ -0,0 +1,53 @@
+from danoan.correct_markdown.core.source_map import SourceMap
+
+import random
+import pytest
+
+
+def test_source_map_from_spans():
+    sm = SourceMap.from_spans([(0, 0), (2, 4), (4, 6), (8, 9)], 10)
+
+    assert list(sm.runs()) == [(2, 0, 4), (8, 4, 1)]
+    assert len(sm) == 5
+    assert sm.to_source(0) == 2
+    assert sm.to_source(4) == 8
+    assert sm.to_source(5) == 9
+    assert sm.to_view(0) == 0
+    assert sm.to_view(7) == 4
+    assert sm.to_view(10) == 5
+    assert sm.source_span(2, 4) == (4, 6)
+    assert sm.view_span(6, 10) == (4, 5)
+
+
+def test_source_map_empty():
+    sm = SourceMap.from_spans([], 3)
+
+    assert len(sm) == 0
+    assert sm.to_source(0) == 0
+    assert sm.to_view(2) == 0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_source_map_roundtrip(seed):
+    rng = random.Random(seed)
+    source = "".join(rng.choice("ab<>") for _ in range(rng.randrange(1, 80)))
+
+    spans = []
+    pos = 0
+    while pos < len(source):
+        end = min(len(source), pos + rng.randrange(0, 6))
+        if rng.random() < 0.6:
+            spans.append((pos, end))
+        pos = end
+    view = "".join(source[start:end] for start, end in spans)
+    sm = SourceMap.from_spans(spans, len(source))
+
+    assert len(sm) == len(view)
+    for i in range(len(view)):
+        assert source[sm.to_source(i)] == view[i]
+        assert sm.to_view(sm.to_source(i)) == i
+    for _ in range(20):
+        a = rng.randrange(0, len(view) + 1)
+        b = rng.randrange(a, len(view) + 1)
+        s, e = sm.source_span(a, b)
+        assert sm.view_span(s, e) == (a, b)
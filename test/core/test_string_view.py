@@ -0,0 +1,50 @@
+from danoan.correct_markdown.core.string_view import StringView
+
+
+def build_string_view():
+    segments = {
+        "text": ["", "October journal", "\n\n", "October first", "\n\n", "Rain."],
+        "markup": ["<h1>", "</h1>", "<h2>", "</h2>", "", ""],
+    }
+    return StringView(segments)
+
+
+def test_get_mindex():
+    SV = build_string_view()
+
+    assert SV.get_mindex(0, "text") == 2
+    assert SV.get_mindex(14, "text") == 2
+    assert SV.get_mindex(15, "text") == 4
+    assert SV.get_mindex(17, "text") == 6
+    assert SV.get_mindex(4, "markup") == 3
+    assert SV.get_view_name(3) == "markup"
+
+
+def test_splice_updates_index():
+    SV = build_string_view()
+    SV.splice("text", 0, 7, "November")
+
+    assert SV["text"] == "November journal\n\nOctober first\n\nRain."
+    assert [item.segment_index for item in SV.index if item.view_name == "text"] == [
+        0,
+        0,
+        16,
+        18,
+        31,
+        33,
+    ]
+    assert SV.get_content() == (
+        "<h1>November journal</h1>\n\n<h2>October first</h2>\n\nRain."
+    )
+
+
+def test_remove_merges_consecutive_segments():
+    SV = build_string_view()
+
+    # Replace "journal\n\nOctober" spanning the segments 2, 4 and 6 of the text view.
+    SV.splice("text", 8, 24, "journal:")
+    SV.remove(4, 6)
+
+    assert SV["text"] == "October journal: first\n\nRain."
+    assert list(SV.iter_mindex()) == [0, 1, 2, 3, 8, 9, 10, 11]
+    assert SV.get_content() == "<h1>October journal: first</h1><h2></h2>\n\nRain."
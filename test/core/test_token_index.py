@@ -0,0 +1,82 @@
+from danoan.correct_markdown.core import token_index
+from danoan.correct_markdown.core.token_index import TokenIndex
+
+import random
+import re
+import time
+import pytest
+
+
+def __find__(text, words, start=0, end=None):
+    tokens = [(m.group(0), m.start()) for m in re.finditer(r"\S+", text)]
+    n = len(words)
+    for k in range(len(tokens) - n + 1):
+        window = [t for t, _ in tokens[k : k + n]]
+        if (
+            window[0].endswith(words[0])
+            and window[1:-1] == words[1:-1]
+            and window[-1].startswith(words[-1])
+        ):
+            m_start = tokens[k][1] + len(window[0]) - len(words[0])
+            m_end = tokens[k + n - 1][1] + len(words[-1])
+            if m_start >= start:
+                return (m_start, m_end) if end is None or m_end <= end else (-1, -1)
+    return -1, -1
+
+
+@pytest.mark.parametrize("seed,key_gap", [(s, 1 << 32) for s in range(10)] + [(0, 2)])
+def test_token_index_update(seed, key_gap, monkeypatch):
+    monkeypatch.setattr(token_index, "KEY_GAP", key_gap)
+    rng = random.Random(seed)
+    vocabulary = ["a", "b", "ab", "ba", " ", "  ", "\n"]
+
+    text = "".join(rng.choice(vocabulary) for _ in range(rng.randrange(0, 40)))
+    ti = TokenIndex(text)
+    for _ in range(30):
+        s = rng.randrange(0, len(text) + 1)
+        e = rng.randrange(s, len(text) + 1)
+        new_value = "".join(rng.choice(vocabulary) for _ in range(rng.randrange(0, 4)))
+
+        text = text[:s] + new_value + text[e:]
+        ti.update(s, e, len(new_value), lambda x, y: text[x:y])
+
+        expected = [(m.start(), m.end()) for m in re.finditer(r"\S+", text)]
+        assert [(ti.start(i), ti.end(i)) for i in range(len(ti))] == expected
+
+        words = [rng.choice(["a", "b", "ab", "ba"]) for _ in range(rng.randrange(2, 4))]
+        start = rng.randrange(0, len(text) + 1)
+        assert ti.find(words, start) == __find__(text, words, start)
+
+
+def test_token_index_find():
+    text = "Que mangerons-nous\ncet   après-midi? Que mangerons-nous demain?"
+    ti = TokenIndex(text)
+
+    assert ti.find(["mangerons-nous", "cet"]) == (4, 22)
+    assert ti.find(["nous", "demain"]) == (51, 62)
+    assert ti.find(["Que", "mangerons-nous"], 1) == (37, 55)
+    assert ti.find(["Que", "mangerons-nous"], 1, 50) == (-1, -1)
+    assert ti.find(["cet", "midi"]) == (-1, -1)
+
+    with pytest.raises(ValueError):
+        ti.find(["cet"])
+
+
+def test_token_index_match_at():
+    ti = TokenIndex("Que mangerons-nous\ncet   après-midi?")
+
+    assert ti.match_at(4, ["mangerons-nous", "cet"])
+    assert ti.match_at(4, [])
+    assert not ti.match_at(5, ["angerons-nous"])
+    assert not ti.match_at(19, ["cet", "après-midi?", "Que"])
+
+
+def test_token_index_find_sublinear():
+    text = "le chat et le chien " * 50000 + "une souris verte"
+    ti = TokenIndex(text)
+
+    t = time.perf_counter()
+    for _ in range(1000):
+        assert ti.find(["une", "souris"]) == (len(text) - 16, len(text) - 6)
+        assert ti.find(["une", "souris", "verte"], 10) == (len(text) - 16, len(text))
+    assert time.perf_counter() - t < 1
@@ -1,6 +1,7 @@
 from danoan.correct_markdown.core import utils
 
 import io
+import pytest
 
 
 def test_get_plain_text_from_markdown():
@@ -21,3 +22,140 @@ def test_extract_html_tags():
 
     assert tags[0] == ("opening", 66, 91)
     assert tags[1] == ("closing", 95, 102)
+
+
+@pytest.mark.parametrize(
+    "markdown,plain_text",
+    [
+        ("# Title ##\n\nText\n", "Title\nText"),
+        ("Title\n=====\n\nText\n", "Title\nText"),
+        ("- *one*\n- __two__\n\n1. three\n", "one\ntwo\nthree"),
+        ("> a quote\n> on two lines\n", "a quote\non two lines"),
+        ("A [link](http://a.b) and ![an image](a.png).", "A link and ."),
+        ("An <http://a.b> autolink.", "An http://a.b autolink."),
+        ("A `**code**` span and a \\*star\\*.", "A **code** span and a *star*."),
+        (
+            "A snake_case_name, 2*3*4 and ***both***.",
+            "A snake_case_name, 234 and both.",
+        ),
+        ("An **unclosed *star.", "An **unclosed *star."),
+        ("Text\n\n```python\na = **b**\n```\n\n***\n", "Text\na = **b**\n"),
+        ("A hard  \nbreak.", "A hard\nbreak."),
+    ],
+)
+def test_plain_text_spans(markdown, plain_text):
+    spans = utils.plain_text_spans(markdown)
+
+    assert "".join(markdown[start:end] for _, start, end in spans) == markdown
+    assert utils.get_plain_text_from_markdown(io.StringIO(markdown)) == plain_text
+
+
+def test_plain_text_spans_html():
+    s = '<div\nclass="note">A **note**</div>\n\nText'
+    spans = utils.plain_text_spans(s)
+
+    assert [s[start:end] for name, start, end in spans if name == "text"] == [
+        "A ",
+        "note",
+        "\n",
+        "Text",
+    ]
+
+
+def test_plain_text_entities():
+    s = "AT&amp;T, a &lt;tag&gt;, it&#39;s &#x41; and `&amp;` code."
+    spans = utils.plain_text_spans(s)
+
+    assert [s[start:end] for name, start, end in spans if name == "entity"] == [
+        "&amp;",
+        "&lt;",
+        "&gt;",
+        "&#39;",
+        "&#x41;",
+    ]
+    assert (
+        utils.get_plain_text_from_markdown(io.StringIO(s))
+        == "AT&T, a <tag>, it's A and &amp; code."
+    )
+    text, source_map = utils.strip_markdown(s)
+    assert [s[source_map.to_source(i)] for i in range(len(text))] == list(text)
+
+
+@pytest.mark.parametrize(
+    "markdown,plain_text",
+    [
+        ("```\na\n``` not closed\n```\n\nText", "a\n``` not closed\nText"),
+        ("~~~\na\n~~~ not closed\n~~~\n\nText", "a\n~~~ not closed\nText"),
+        ("~~~ python `b`\na\n~~~\n\nText", "a\nText"),
+    ],
+)
+def test_plain_text_fences(markdown, plain_text):
+    assert utils.get_plain_text_from_markdown(io.StringIO(markdown)) == plain_text
+
+
+# Python-Markdown has no fenced code blocks, no setext heading after a paragraph
+# line and no list interrupting a paragraph; the corpus leaves these out.
+PLAIN_TEXT_CORPUS = [
+    "# The ultimate guide\n\nThe **ultimate guide** will lead you to the path.",
+    "AT&amp;T, a &lt;tag&gt;, it&#39;s &copy; &#x41; and a & b or x < y.",
+    "A *word*, a _word_, a __strong__ word and ***both***.",
+    "A [link](http://a.b), an <http://a.b> autolink and ![an image](a.png).",
+    "A `**code**` span, a `&amp;` entity and a \\*star\\*.",
+    "## Title ##\n\nText\n\nTitle\n=====\n\nText",
+    "- *one*\n- __two__\n\n1. three\n2. four &amp; five",
+    "> a quote\n> on two lines\n\nText",
+    'The <span style="color:blue">path</span> and <b>bold</b> html.',
+    "Text\n\n    indented code\n\n***\n\nA hard  \nbreak.",
+]
+
+
+def test_plain_text_corpus():
+    markdown = pytest.importorskip("markdown")
+    bs4 = pytest.importorskip("bs4")
+
+    for s in PLAIN_TEXT_CORPUS:
+        old = bs4.BeautifulSoup(markdown.markdown(s), "html.parser").get_text()
+        new = utils.get_plain_text_from_markdown(io.StringIO(s))
+        assert new.split() == old.split(), s
+
+
+@pytest.mark.parametrize(
+    "s,tags",
+    [
+        ('<span title="a > b">text</span>', ['<span title="a > b">', "</span>"]),
+        ("<br/> and <!-- a <b> comment -->.", ["<br/>", "<!-- a <b> comment -->"]),
+        ("Code `<b>` and ``a ` <i> b`` span <u>.", ["<u>"]),
+        ("```html\n<b>\n```\n\n<i>", ["<i>"]),
+        ("~~~\n<b>\n", []),
+        ("Unclosed `<b> code\n\nand <i>.", ["<b>", "<i>"]),
+        ("<http://a.b>, a < b > c and <!-- unclosed", []),
+    ],
+)
+def test_scan_html_tags(s, tags):
+    starts, ends = utils.scan_html_tags(s)
+
+    assert [s[start:end] for start, end in zip(starts, ends)] == tags
+
+
+def test_remove_html_tags():
+    s = '<p class="x>y">A <b>bold</b> `<i>` word<!-- note --></p>'
+
+    assert utils.remove_html_tags(io.StringIO(s)) == "A bold `<i>` word"
+
+
+def test_strip_html_tags():
+    s = "<p>A <b>bold</b> word</p>"
+    text, source_map = utils.strip_html_tags(s)
+
+    assert text == "A bold word"
+    assert [s[source_map.to_source(i)] for i in range(len(text))] == list(text)
+    assert source_map.source_span(2, 6) == (8, 12)
+
+
+def test_strip_markdown():
+    s = "# Title\n\nA **bold** [link](http://a.b)."
+    text, source_map = utils.strip_markdown(s)
+
+    assert text == utils.get_plain_text_from_markdown(io.StringIO(s))
+    assert [s[source_map.to_source(i)] for i in range(len(text))] == list(text)
+    assert s[slice(*source_map.source_span(8, 12))] == "bold"
@@ -10,6 +10,13 @@ PROJECT_FOLDER="$(cd "${SCRIPT_FOLDER}" && cd .. && pwd)"
 
 pushd "${PROJECT_FOLDER}/src/danoan/correct_markdown/core" > /dev/null
 python -m doctest string_view.py
+python -m doctest rope.py
+python -m doctest token_index.py
+python -m doctest model.py
+python -m doctest cache.py
+python -m doctest source_map.py
+python -m doctest utils.py
+python -m doctest markdown_view.py
 popd > /dev/null
 
 pushd "${PROJECT_FOLDER}/docs" > /dev/null